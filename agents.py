@@ -1,13 +1,47 @@
 import os
 import re
 import json
-import requests
+import hashlib
 import numpy as np
 import pandas as pd
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
+
+# A BOQ row names a voltage grade AND a core count on the same line
+# (numbered spec lists like "1. Voltage Grade: 1.1 kV" only have one of them)
+_LINE_ITEM_PATTERN = re.compile(
+    r"\d+(?:\.\d+)?\s*k?v\b.*?\d+(?:\.\d+)?\s*-?\s*(?:core|c)\b"
+    r"|\d+(?:\.\d+)?\s*-?\s*(?:core|c)\b.*?\d+(?:\.\d+)?\s*k?v\b",
+    re.IGNORECASE,
+)
+
+
+# A catalog-style SKU code quoted in the tender, e.g. "LT-AL-XLPE-3.5C-1.1-FR"
+# (<range>-<material>-<insulation>-<cores>C-<kV>[-FR])
+_SKU_CODE_PATTERN = re.compile(
+    r"\b[a-z]{2,5}-(?:al|cu)-[a-z]{2,6}-\d+(?:\.\d+)?c-\d+(?:\.\d+)?(?:-fr)?\b",
+    re.IGNORECASE,
+)
+
+
+def _normalized(text: str) -> str:
+    return " ".join(text.lower().split())
+
 
 # Import data from your setup file
-from setup_data import SAMPLE_RFP_TEXT, DATASHEET_RECORDS, setup_vector_db, TESTS_PRICING
+from setup_data import SAMPLE_RFP_TEXT, DATASHEET_RECORDS, setup_vector_db, TESTS_PRICING, VOLUME_TIERS, DRUM_LENGTH_M
+from engine import MatchingEngine, get_engine
+from catalog import DEFAULT_STOCK, SPEC_FIELDS, SPEC_MATCH_WEIGHTS
+from cache import canonical_spec_key
+from lexical_index import FAST_PATH_ALL, best_rows, reciprocal_rank_fusion, settled_top_k, spec_query, top_rows
+from extraction import Extraction, extract_all, extract_spec, iter_extractions, spec_from_extractions
+from ingestion import parse_document
+from allocation import Allocation, allocate, demand
+from search_client import DEFAULT_SEARCH_SOCKET, SearchClient
+from pricing import price_grid, price_pairs, quantity_grid, services_price
+from telemetry import span, timed
+
+# A quoted SKU_ID changes lexical ranking, so cached results are keyed on it too
+SEARCH_FIELDS = SPEC_FIELDS + ("SKU_ID",)
 
 # ==========================================
 # 1. SALES AGENT (The Parser)
@@ -16,9 +50,95 @@ class SalesAgent:
     def __init__(self, api_key_env_var: str = "GEMINI_API_KEY"):
         self.api_key = os.environ.get(api_key_env_var)
 
+    @timed("sales.parse_rfp")
     def parse_rfp(self, text: str) -> Dict[str, Any]:
         return self._fallback_parse(text)
 
+    @timed("sales.parse_line_items")
+    def parse_line_items(self, text: str) -> List[Dict[str, Any]]:
+        """
+        Splits a tender into one spec per cable line item.
+        Accepts a JSON list / {"line_items": [...]}, or text where each BOQ row
+        sits on its own line. Falls back to a single spec for the whole text.
+        """
+        json_items = self._json_line_items(text)
+        if json_items is not None:
+            try:
+                return [self._spec_from_json(item) for item in json_items]
+            except (ValueError, TypeError, AttributeError):
+                pass # Not a line-item list, fall back below
+
+        split = self._split_rows(text)
+        if split is None:
+            return [self.parse_rfp(text)]
+
+        rows, header_text = split
+        return self._inherit([self._fallback_parse(row) for row in rows], self._fallback_parse(header_text))
+
+    @staticmethod
+    def _inherit(items: List[Dict[str, Any]], header: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Tender-wide clauses (outside the rows) still apply to every item."""
+        for spec in items:
+            if not spec["Conductor_Material"]:
+                spec["Conductor_Material"] = header["Conductor_Material"]
+            spec["Fire_Retardant"] = spec["Fire_Retardant"] or header["Fire_Retardant"]
+        return items
+
+    def line_item_fingerprints(self, text: str) -> List[str]:
+        """
+        One fingerprint per item of parse_line_items(text), same order. It changes
+        exactly when that item's parse could: its own row, or the fields it
+        inherits from the tender-wide clauses (a corrigendum that only moves the
+        delivery date keeps every row's fingerprint). Whitespace/case edits don't count.
+        """
+        digest = lambda *parts: hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()[:16]
+        json_items = self._json_line_items(text)
+        if json_items is not None and all(isinstance(item, dict) for item in json_items):
+            return [digest("json", json.dumps(item, sort_keys=True, default=str)) for item in json_items]
+
+        split = self._split_rows(text)
+        if split is None:
+            return [digest("text", _normalized(text))]
+        rows, header_text = split
+        header = self._fallback_parse(header_text)
+        inherited = json.dumps([header["Conductor_Material"], header["Fire_Retardant"]])
+        return [digest("row", inherited, _normalized(row)) for row in rows]
+
+    @staticmethod
+    def _json_line_items(text: str) -> Optional[List[Any]]:
+        cleaned = text.strip()
+        if not cleaned.startswith(("[", "{")):
+            return None
+        try:
+            data = json.loads(cleaned)
+        except ValueError:
+            return None
+        if isinstance(data, dict):
+            data = data.get("line_items")
+        return data if isinstance(data, list) and data else None
+
+    @staticmethod
+    def _split_rows(text: str) -> Optional[Tuple[List[str], str]]:
+        """(BOQ rows, tender-wide text) when the text holds at least two line items."""
+        rows = [line for line in text.splitlines() if _LINE_ITEM_PATTERN.search(line)]
+        if len(rows) < 2:
+            return None
+        row_set = set(rows)
+        return rows, "\n".join(l for l in text.splitlines() if l not in row_set)
+
+    def _spec_from_json(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        spec = {
+            "Voltage": float(data.get("Voltage", 1.1)),
+            "Cores": float(data.get("Cores", 3)),
+            "Conductor_Material": data.get("Conductor_Material", "Aluminum"),
+            "Insulation_Type": data.get("Insulation_Type", "XLPE"),
+            "Fire_Retardant": bool(data.get("Fire_Retardant", False)),
+            "Quantity_m": int(data.get("Quantity_m", 1000))
+        }
+        if data.get("SKU_ID"):
+            spec["SKU_ID"] = str(data["SKU_ID"]).strip().upper()
+        return spec
+
     def _fallback_parse(self, text: str) -> Dict[str, Any]:
         """Robust parsing that handles both JSON inputs and Regex extraction."""
         
@@ -28,112 +148,318 @@ class SalesAgent:
             cleaned = text.strip()
             if cleaned.startswith("{") and cleaned.endswith("}"):
                 data = json.loads(cleaned)
-                return {
-                    "Voltage": float(data.get("Voltage", 1.1)),
-                    "Cores": float(data.get("Cores", 3)),
-                    "Conductor_Material": data.get("Conductor_Material", "Aluminum"),
-                    "Insulation_Type": data.get("Insulation_Type", "XLPE"),
-                    "Fire_Retardant": bool(data.get("Fire_Retardant", False)),
-                    "Quantity_m": int(data.get("Quantity_m", 1000))
-                }
+                return self._spec_from_json(data)
         except Exception:
             pass # Not valid JSON, fall back to Regex logic below
 
         # --- 2. FALLBACK TO REGEX ---
-        t = text.lower()
-        
-        # Quantity
-        qty = 1000
-        m_qty = re.search(r"(\d{3,7})\s*m", t)
-        if m_qty: qty = int(m_qty.group(1))
-
-        # Voltage
-        voltage = 1.1
-        m_volt = re.search(r"(\d+(\.\d+)?)\s*k?v", t)
-        if m_volt: voltage = float(m_volt.group(1))
-
-        # Cores
-        cores = 3.0
-        m_core = re.search(r"(\d+(\.\d+)?)\s*-?\s*(?:core|c)\b", t)
-        if m_core: cores = float(m_core.group(1))
-
-        # Material
-        cond = None
-        
-        # 1. Check for specific known metals (STRICTER REGEX)
-        # \b ensures we match "Al" as a whole word, not inside "Materi-al"
-        if re.search(r"\b(copper|cu)\b", t):
-            cond = "Copper"
-        elif re.search(r"\b(aluminum|aluminium|al)\b", t):
-            cond = "Aluminum"
-        
-        # 2. Smart Regex: Catch whatever follows "Conductor:" if not found above
-        if not cond:
-            # Matches "Conductor: Stranded Nickel" -> captures "Nickel"
-            m_generic = re.search(r"conductor\s*[:\-]?\s*(?:stranded\s+)?([a-z]+)", t)
-            if m_generic:
-                cond = m_generic.group(1).capitalize()
+        # One precompiled pass over the text finds every field (see extraction.py)
+        spec = extract_spec(text)
 
-        # Insulation
-        ins = "XLPE"
-        if "pvc" in t: ins = "PVC"
+        # A quoted catalog code goes to the lexical index as one exact token
+        code = _SKU_CODE_PATTERN.search(text)
+        if code:
+            spec["SKU_ID"] = code.group(0).upper()
+        return spec
 
-        # Fire Retardant
-        fr = False
-        if any(x in t for x in ["fire retard", "frls", "fr grade"]): fr = True
+    def extract_occurrences(self, text: str) -> List[Extraction]:
+        """Every field hit in the text with its character offsets (for audits/backfills)."""
+        return extract_all(text)
 
-        return {
-            "Voltage": voltage,
-            "Cores": cores,
-            "Conductor_Material": cond,
-            "Insulation_Type": ins,
-            "Fire_Retardant": fr,
-            "Quantity_m": qty
-        }
+    @timed("sales.parse_document")
+    def parse_document(self, path: str, workers: int = None) -> Dict[str, Any]:
+        """
+        Streams a PDF/DOCX/TXT tender page by page into the extractor.
+        Returns {"spec", "provenance", "pages_read", "line_items"}: spec and
+        provenance as in ingestion.parse_pages, line_items as parse_line_items
+        would split the document text (one per BOQ row, SKU_ID codes included).
+        """
+        parsed = parse_document(path, workers=workers, line_items=LineItemStream(self))
+        items = parsed["line_items"]
+        if len(items) == 1 and items[0].get("SKU_ID"):
+            parsed["spec"]["SKU_ID"] = items[0]["SKU_ID"]
+        return parsed
+
+
+class LineItemStream:
+    """
+    SalesAgent.parse_line_items() for a document fed one page at a time. Rows
+    are parsed as they arrive; of the tender-wide text only the hits that can
+    still decide an inherited field are kept (first per field, one per metal).
+    A page's last line is held back when it isn't a row on its own, and joined
+    with the next page's first line when the two make a row. JSON line-item
+    lists are a pasted-text/API format and aren't looked for in documents.
+    """
+
+    def __init__(self, sales: SalesAgent):
+        self.sales = sales
+        self.rows: List[Dict[str, Any]] = []
+        self.sku_id: Optional[str] = None  # First catalog code anywhere (single-item tenders)
+        self._header: List[Extraction] = []
+        self._seen = set()
+        self._carry = ""
+
+    def feed(self, text: str):
+        lines = text.split("\n")
+        if self._carry:
+            joined = f"{self._carry} {lines[0]}"
+            if _LINE_ITEM_PATTERN.search(joined) and not _LINE_ITEM_PATTERN.search(lines[0]):
+                lines[0] = joined  # A row cut by the page break
+            else:
+                self._line(self._carry)
+            self._carry = ""
+        for line in lines[:-1]:
+            self._line(line)
+        if _LINE_ITEM_PATTERN.search(lines[-1]):
+            self._line(lines[-1])
+        else:
+            self._carry = lines[-1]
+
+    def _line(self, line: str):
+        if self.sku_id is None:
+            code = _SKU_CODE_PATTERN.search(line)
+            if code:
+                self.sku_id = code.group(0).upper()
+        if _LINE_ITEM_PATTERN.search(line):
+            self.rows.append(self.sales._fallback_parse(line))
+            return
+        for ex in iter_extractions(line):
+            key = (ex.field, ex.value) if ex.field == "Material" else ex.field
+            if key not in self._seen:
+                self._seen.add(key)
+                self._header.append(ex)
+
+    def finish(self, spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """The line items; spec = the whole document's spec, used when it holds fewer than two rows."""
+        if self._carry:
+            self._line(self._carry)
+            self._carry = ""
+        if len(self.rows) < 2:
+            spec = dict(spec)
+            if self.sku_id:
+                spec["SKU_ID"] = self.sku_id
+            return [spec]
+        return self.sales._inherit(self.rows, spec_from_extractions(self._header))
 
 # ==========================================
 # 2. TECHNICAL AGENT (The Matcher)
 # ==========================================
 class TechnicalAgent:
-    def __init__(self):
-        # FIX: Ensure records is a DataFrame
-        self.records = pd.DataFrame(DATASHEET_RECORDS)
-        # Initialize Vector DB
-        self.index, self.embeddings, self.model = setup_vector_db(DATASHEET_RECORDS)
-
-    # In agents.py -> TechnicalAgent class
-
-    def search(self, rfp_spec: Dict[str, Any], top_k: int = 3) -> List[Dict[str, Any]]:
-        # 1. Semantic Search (Vector DB)
-        query = self._rfp_to_query_text(rfp_spec)
-        q_emb = self.model.encode([query], convert_to_numpy=True)[0]
-        
-        # Search FAISS (Get raw candidates based on text similarity)
-        D, I = self.index.search(np.array([q_emb]), top_k)
-        
-        results = []
-        for dist, idx in zip(D[0], I[0]):
-            rec = self.records.iloc[idx].to_dict()
-            
-            # 2. Calculate Spec Match Score (The "Real" Accuracy)
-            score = self.calculate_spec_match(rfp_spec, rec)
-            results.append({
-                "record": rec, 
-                "distance": float(dist), 
-                "Spec_Match_%": score
-            })
-        
+    def __init__(self, engine: MatchingEngine = None, client: Optional[SearchClient] = None,
+                 fast_path_all: bool = FAST_PATH_ALL):
+        # Lexical fast path for every settled spec, not only those quoting a SKU_ID (see lexical_index.py)
+        self.fast_path_all = fast_path_all
+        # With a search daemon (client, or STRATABID_SEARCH_SOCKET) this is a thin client:
+        # the model, index and catalog live in the daemon and nothing heavy loads here
+        if client is None and engine is None and DEFAULT_SEARCH_SOCKET:
+            client = SearchClient(DEFAULT_SEARCH_SOCKET)
+        self.client = client
+        if client is not None:
+            self.engine, self.model = None, None
+        else:
+            # Reuse the process-wide engine: model + FAISS index are loaded once, not per agent
+            self.engine = (engine or get_engine()).ensure_loaded()
+            self.model = self.engine.model
+
+    # Catalog state always comes from the engine's current snapshot (it changes on upsert/delete).
+    # A thin client has none of it locally.
+    @property
+    def records(self):
+        return self.engine.records if self.engine is not None else None
+
+    @property
+    def index(self):
+        return self.engine.index if self.engine is not None else None
+
+    @property
+    def embeddings(self):
+        return self.engine.embeddings if self.engine is not None else None
+
+    @property
+    def columns(self):
+        return self.engine.columns if self.engine is not None else None
+
+    @property
+    def constraints(self):
+        return self.engine.constraints if self.engine is not None else None
+
+    def search(self, rfp_spec: Dict[str, Any], top_k: int = 3, prefilter: bool = True) -> List[Dict[str, Any]]:
+        return self.search_batch([rfp_spec], top_k=top_k, prefilter=prefilter)[0]
+
+    @timed("technical.search")
+    def search_batch(self, rfp_specs: List[Dict[str, Any]], top_k: int = 3, prefilter: bool = True) -> List[List[Dict[str, Any]]]:
+        """
+        Matches many line items at once: one scoring pass, one model.encode
+        batch, one FAISS matrix search per distinct constraint set.
+        Specs that quote a catalog SKU_ID and whose top_k the rule scores + BM25
+        already settle skip the encoder and FAISS (their matches carry distance None).
+        Returns one ranked match list per input spec (same order).
+        """
+        if self.client is not None:
+            return self.client.search_batch(rfp_specs, top_k=top_k, prefilter=prefilter)
+
+        out = [None] * len(rfp_specs)
+        # One snapshot for the whole batch: a catalog update mid-search can't mix versions
+        snap = self.engine.snapshot()
+        version = snap.version
+
+        # 0. Repeat specs are answered from the engine's cache (keyed on the normalized spec);
+        #    duplicates inside the batch are computed once.
+        pending = {}
+        for pos, spec in enumerate(rfp_specs):
+            spec_key = canonical_spec_key(spec, SEARCH_FIELDS)
+            cached = self.engine.result_cache.get((version, spec_key, top_k, prefilter, self.fast_path_all))
+            if cached is not None:
+                out[pos] = self._copy_results(cached)
+            else:
+                pending.setdefault(spec_key, []).append(pos)
+
+        if not pending:
+            return out
+
+        keys = list(pending)
+        specs = [rfp_specs[pending[key][0]] for key in keys]
+
+        def finish(row, results):
+            self.engine.result_cache.put((version, keys[row], top_k, prefilter, self.fast_path_all), results)
+            for pos in pending[keys[row]]:
+                out[pos] = self._copy_results(results)
+
+        # 1. Calculate Spec Match Score for the WHOLE catalog, all specs in one pass
+        with span("technical.score"):
+            scores = snap.columns.score_many(specs)
+            if snap.live is not None:
+                scores[:, ~snap.live] = -np.inf  # Deleted/replaced rows never rank
+
+        # 2. Lexical pass (BM25 over SKU_ID + description). Ranking is Spec_Match_%,
+        #    then BM25, then vector distance; when the first two settle the top_k,
+        #    nothing the vector search finds could change it. Only specs quoting a
+        #    catalog code take that shortcut, unless fast_path_all.
+        dense = []
+        with span("technical.lexical"):
+            lexical = snap.lexical.score_many([spec_query(s) for s in specs])
+            if snap.live is not None:
+                lexical[:, ~snap.live] = 0.0
+            for row, spec in enumerate(specs):
+                quoted = bool(spec.get("SKU_ID")) and str(spec["SKU_ID"]) in snap.row_of_sku
+                settled = settled_top_k(scores[row], lexical[row], top_k) if quoted or self.fast_path_all else None
+                if settled is None:
+                    dense.append(row)
+                else:
+                    finish(row, [{"record": snap.records[int(idx)], "distance": None,
+                                  "Spec_Match_%": float(scores[row, idx])} for idx in settled])
+        self.engine.count_lexical(len(specs) - len(dense), len(dense))
+        if not dense:
+            return out
+
+        # 3. Semantic Search (Vector DB) - one encode call for every uncached query.
+        #    The embedding only depends on the spec fields, not on a quoted SKU_ID.
+        with span("technical.encode"):
+            q_embs = self.engine.query_embeddings([canonical_spec_key(specs[row], SPEC_FIELDS) for row in dense],
+                                                  [self._rfp_to_query_text(specs[row]) for row in dense])
+
+        # 4. Hard-constraint prefilter: neighbours are drawn only from spec-feasible SKUs.
+        # If nothing is feasible (e.g. unknown material) fall back to the full catalog
+        # so the Decision Agent still sees the closest alternatives.
+        # Specs sharing a feasible set share one FAISS matrix search.
+        groups = {}
+        masks = []
+        with span("technical.prefilter"):
+            for i, row in enumerate(dense):
+                mask = snap.constraints.mask(specs[row]) if prefilter else None
+                if mask is not None and snap.live is not None:
+                    mask &= snap.live
+                if mask is not None and not mask.any():
+                    mask = None
+                masks.append(mask)
+                group_key = np.packbits(mask).tobytes() if mask is not None else None
+                groups.setdefault(group_key, (mask, []))[1].append(i)
+
+        D = np.full((len(dense), top_k), np.inf, dtype="float32")
+        I = np.full((len(dense), top_k), -1, dtype="int64")
+        with span("technical.faiss"):
+            for mask, rows in groups.values():
+                # Search FAISS (Get raw candidates based on text similarity)
+                D[rows], I[rows] = self.engine.vector_search(q_embs[rows], top_k, mask=mask, snapshot=snap)
+
+        # 5. Merge the fused vector + lexical shortlist with the best rule-based SKUs, per spec
+        with span("technical.rank"):
+            for i, row in enumerate(dense):
+                finish(row, self._rank_candidates(snap, D[i], I[i], scores[row], lexical[row],
+                                                  masks[i], q_embs[i], top_k))
+
+        return out
+
+    def matches_from_ids(self, saved: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Rebuilds search() output from saved {"SKU_ID", "Spec_Match_%", "distance"} rows
+        (e.g. a re-issued tender's unchanged item). None if any SKU left the catalog.
+        """
+        if self.client is not None:
+            records = self.client.records([m["SKU_ID"] for m in saved])
+            if not all(records):
+                return None
+            return [{"record": rec, "distance": m.get("distance"), "Spec_Match_%": m["Spec_Match_%"]}
+                    for rec, m in zip(records, saved)]
+
+        snap = self.engine.snapshot()
+        rebuilt = []
+        for m in saved:
+            row = snap.row_of_sku.get(m["SKU_ID"])
+            if row is None:
+                return None
+            rebuilt.append({"record": snap.records[row], "distance": m.get("distance"),
+                            "Spec_Match_%": m["Spec_Match_%"]})
+        return rebuilt
+
+    def _rank_candidates(self, snap, dists, ids, scores, lexical, mask, q_emb, top_k) -> List[Dict[str, Any]]:
+        # Candidates = the vector and BM25 shortlists fused by reciprocal rank, plus the
+        # best rule-based SKUs, so a perfect spec match is never lost just because its
+        # description embeds far away (or quotes none of the tender's words).
+        dense = {int(idx): float(dist) for dist, idx in zip(dists, ids) if idx >= 0}
+        words = top_rows(lexical if mask is None else np.where(mask, lexical, 0.0), top_k)
+        fused = reciprocal_rank_fusion([list(dense), words])
+        shortlist = sorted(fused, key=lambda idx: (-fused[idx], idx))[:top_k]
+
+        candidates = {}
+        for idx in shortlist + best_rows(scores, lexical, top_k).tolist():
+            idx = int(idx)
+            if idx in candidates or scores[idx] == -np.inf:
+                continue
+            if idx in dense:
+                candidates[idx] = dense[idx]
+            else:
+                diff = np.asarray(snap.embeddings[idx], dtype="float32") - q_emb
+                candidates[idx] = float(np.dot(diff, diff))
+
         # --- CRITICAL FIX: RE-SORT BY SCORE ---
         # Ignore vector rank; trust the rule-based score.
-        # This moves the 100% match to Rank 1.
-        results.sort(key=lambda x: x["Spec_Match_%"], reverse=True)
+        # This moves the 100% match to Rank 1 (BM25, then vector distance, only break ties).
+        ranked = sorted(candidates, key=lambda idx: (-scores[idx], -lexical[idx], candidates[idx]))
         # --------------------------------------
-            
-        return results
+
+        return [{
+            "record": snap.records[idx],  # Read-only row view, no copy
+            "distance": candidates[idx],
+            "Spec_Match_%": float(scores[idx])
+        } for idx in ranked[:top_k]]
+
+    @staticmethod
+    def _copy_results(results):
+        # Callers may annotate the dicts; keep the cached copy pristine
+        # (records are immutable catalog views, so they can be shared)
+        return [dict(r) for r in results]
+
+    def score_catalog(self, rfp_spec: Dict[str, Any]) -> np.ndarray:
+        """Spec_Match_% for every SKU (row-aligned with self.records)."""
+        return self.columns.score_all(rfp_spec)
 
     def _rfp_to_query_text(self, rfp_spec: Dict[str, Any]) -> str:
+        # Only spec fields: quantity doesn't change which cable fits, and leaving
+        # it out lets the same spec at any quantity share one cached embedding.
         parts = []
-        for k, v in rfp_spec.items():
+        for k in SPEC_FIELDS:
+            v = rfp_spec.get(k)
             if v: parts.append(f"{k}: {v}")
         return "; ".join(parts)
 
@@ -144,14 +470,8 @@ class TechnicalAgent:
         """
         
         # --- 1. DEFINE WEIGHTS (w_i) ---
-        # Adjust these to change business priority
-        weights = {
-            "Voltage": 35.0,        # Critical safety param
-            "Material": 30.0,       # Critical cost param
-            "Cores": 20.0,          # Functional param
-            "Insulation": 10.0,     # Standard param
-            "Fire_Retardant": 5.0   # Feature param
-        }
+        # Adjust these in catalog.SPEC_MATCH_WEIGHTS (shared with the vectorized scorer)
+        weights = SPEC_MATCH_WEIGHTS
         
         # --- 2. CALCULATE INDIVIDUAL SCORES (score_i) ---
         # Each score is between 0.0 and 1.0
@@ -221,22 +541,27 @@ class TechnicalAgent:
         
         return round(final_match_percent, 1)
 
+    @timed("technical.comparison_table")
     def build_comparison_table(self, rfp_spec, matches):
         rows = []
-        keys = ["Voltage", "Cores", "Conductor_Material", "Insulation_Type", "Fire_Retardant"]
+        keys = SPEC_FIELDS
+        records = [m["record"] for m in matches]
+        # Catalog views: read each parameter as one column lookup across all ranks
+        columnar = self.records is not None and all(self.records.owns(r) for r in records)
+        catalog_rows = [r.row for r in records] if columnar else None
         
         for k in keys:
             row = {"Parameter": k, "RFP Requirement": rfp_spec.get(k)}
-            for i, m in enumerate(matches):
-                # Map Key for Display
-                lookup_key = "FR_Grade" if k == "Fire_Retardant" else k
-                val = m["record"].get(lookup_key)
-                
-                # Format Booleans for readability
+            # Map Key for Display
+            lookup_key = "FR_Grade" if k == "Fire_Retardant" else k
+            values = self.records.values(lookup_key, catalog_rows) if columnar else \
+                [r.get(lookup_key) for r in records]
+            
+            # Format Booleans for readability
+            if isinstance(row["RFP Requirement"], bool): 
+                row["RFP Requirement"] = "Yes" if row["RFP Requirement"] else "No"
+            for i, val in enumerate(values):
                 if isinstance(val, bool): val = "Yes" if val else "No"
-                if isinstance(row["RFP Requirement"], bool): 
-                    row["RFP Requirement"] = "Yes" if row["RFP Requirement"] else "No"
-                
                 row[f"Rank #{i+1} SKU"] = val
             rows.append(row)
         return rows
@@ -245,27 +570,250 @@ class TechnicalAgent:
 # 3. PRICING AGENT (The Calculator)
 # ==========================================
 class PricingAgent:
+    def __init__(self, tests_pricing: Dict[str, float] = None, tiers=None, drum_length_m: float = 0.0):
+        self.tests_pricing = TESTS_PRICING if tests_pricing is None else tests_pricing
+        self.tiers = tiers                  # None/[] = flat Base_Price_per_m
+        self.drum_length_m = drum_length_m  # 0/None = bill exact metres
+
+    @classmethod
+    def from_config(cls, tests_pricing: Dict[str, float] = None) -> "PricingAgent":
+        """An agent with the deployment's opt-in VOLUME_TIERS / DRUM_LENGTH_M (setup_data; both off by default)."""
+        return cls(tests_pricing, tiers=VOLUME_TIERS, drum_length_m=DRUM_LENGTH_M)
+
+    def _columns(self, product_recs):
+        recs = [p["record"] for p in product_recs]
+        base = np.array([r.get("Base_Price_per_m", 0) for r in recs], dtype=np.float64)
+        if self.drum_length_m:
+            # Drum rounding is on: a record's own Drum_Length_m overrides the default length
+            drums = np.array([r.get("Drum_Length_m") or self.drum_length_m for r in recs], dtype=np.float64)
+        else:
+            drums = np.zeros(len(recs))  # Off: bill exact metres, whatever the records say
+        return recs, base, drums
+
+    def _grid(self, product_recs, tests_required, quantities):
+        recs, base, drums = self._columns(product_recs)
+        serv_price = services_price(tests_required, self.tests_pricing)
+        return recs, serv_price, price_grid(base, quantities, drums, self.tiers, serv_price)
+
+    @timed("pricing.consolidate")
     def price_tests_and_consolidate(self, product_recs, tests_required, quantity_m):
+        recs, serv_price, grid = self._grid(product_recs, tests_required, [quantity_m])
+
         consolidated = []
-        
-        for p in product_recs:
-            rec = p["record"]
-            
-            # 1. Material Cost
-            base_price = rec.get("Base_Price_per_m", 0)
-            mat_price = base_price * quantity_m
-            
-            # 2. Service Cost
-            serv_price = sum(TESTS_PRICING.get(t, 0) for t in tests_required)
-            
-            # 3. Total
-            total = mat_price + serv_price
-            
+        for i, rec in enumerate(recs):
             consolidated.append({
                 "SKU_ID": rec.get("SKU_ID"),
-                "Material_Price": mat_price,
+                "Billed_m": float(grid["Billed_m"][i, 0]),
+                "Unit_Price": float(grid["Unit_Price"][i, 0]),
+                "Discount_%": round(100.0 * float(grid["Discount"][i, 0]), 2),
+                "Material_Price": float(grid["Material_Price"][i, 0]),
                 "Services_Price": serv_price,
-                "Total_Price": total
+                "Total_Price": float(grid["Total_Price"][i, 0])
             })
             
-        return {"per_product": consolidated}
\ No newline at end of file
+        return {"per_product": consolidated}
+
+    @timed("pricing.sweep")
+    def price_sweep(self, product_recs, tests_required, quantities=None, quantity_m=None) -> pd.DataFrame:
+        """
+        What-if price curve: Total_Price of every candidate at every quantity,
+        in one pass. Pass quantities, or quantity_m to sweep 0.25x - 4x around it.
+        Returns a DataFrame indexed by Quantity_m with one column per SKU_ID.
+        """
+        if quantities is None:
+            quantities = quantity_grid(quantity_m or 0)
+        quantities = np.asarray(quantities, dtype=np.float64)
+        recs, _, grid = self._grid(product_recs, tests_required, quantities)
+        return pd.DataFrame(grid["Total_Price"].T, columns=[r.get("SKU_ID") for r in recs],
+                            index=pd.Index(quantities, name="Quantity_m"))
+
+    @timed("pricing.line_items")
+    def price_line_items(self, matches_per_item, tests_required, quantities):
+        """
+        Prices every candidate of every line item in one array pass.
+        matches_per_item[i] is TechnicalAgent output for item i, quantities[i] its metres.
+        Grand_Total bills the rank-1 option of each item (see bill()).
+        """
+        flat = [p for matches in matches_per_item for p in matches]
+        _, base, drums = self._columns(flat)
+        item_qty = np.repeat(np.asarray(quantities, dtype=np.float64),
+                             [len(m) for m in matches_per_item])
+
+        # Each candidate is priced at its own item's quantity (one flat array pass)
+        serv_price = services_price(tests_required, self.tests_pricing)
+        priced = price_pairs(base, item_qty, drums, self.tiers)
+        billed, unit, mat_price = priced["Billed_m"], priced["Unit_Price"], priced["Material_Price"]
+
+        line_items, offset = [], 0
+        for matches in matches_per_item:
+            consolidated = []
+            for j, p in enumerate(matches):
+                k = offset + j
+                consolidated.append({
+                    "SKU_ID": p["record"].get("SKU_ID"),
+                    "Billed_m": float(billed[k]),
+                    "Unit_Price": float(unit[k]),
+                    "Material_Price": float(mat_price[k]),
+                    "Services_Price": serv_price,
+                    "Total_Price": float(mat_price[k]) + serv_price
+                })
+            offset += len(matches)
+            line_items.append({"per_product": consolidated})
+
+        return dict(self.bill([item["per_product"][0] if item["per_product"] else None for item in line_items]),
+                    line_items=line_items)
+
+    def bill(self, chosen):
+        """
+        Tender totals for one chosen per_product row per line item (None = no
+        option). Tests are charged once per distinct SKU, since a cable design
+        isn't re-tested per line item.
+        """
+        chosen = [c for c in chosen if c]
+        material_total = sum(c["Material_Price"] for c in chosen)
+        tested = {c["SKU_ID"]: c["Services_Price"] for c in chosen}
+        services_total = sum(tested.values())
+        return {
+            "Material_Total": material_total,
+            "Services_Total": services_total,
+            "Grand_Total": material_total + services_total,
+        }
+
+# ==========================================
+# 4. DECISION AGENT (The Auditor)
+# ==========================================
+class DecisionAgent:
+    def __init__(self, spec_threshold: float = 90.0, auto_mode: bool = True, ledger=None):
+        self.spec_threshold = spec_threshold
+        self.auto_mode = auto_mode
+        # Optional inventory.InventoryLedger / SQLiteInventoryLedger; without one
+        # the static Stock_Available figure is used and nothing is held
+        self.ledger = ledger
+
+    @timed("decision.decide")
+    def decide(self, best_match: Dict[str, Any], required_qty, holder: Optional[str] = None) -> Dict[str, Any]:
+        """Policy checks for one line item's rank-1 match."""
+        # 1. Get Data
+        actual_score = best_match['Spec_Match_%']
+        sku_id = best_match['record'].get('SKU_ID')
+        available_stock = best_match['record'].get('Stock_Available', DEFAULT_STOCK) # Default to infinite if missing
+        
+        # 2. Logic Checks
+        is_spec_good = actual_score >= self.spec_threshold
+        reservation = None
+        if self.ledger is not None and sku_id in self.ledger:
+            # Check-and-hold is one atomic step, so parallel bids can't both take the same stock.
+            # A spec mismatch goes to manual review anyway; don't hold stock for it.
+            if is_spec_good:
+                reservation = self.ledger.reserve(sku_id, required_qty, holder=holder)
+            is_stock_good = reservation is not None or \
+                (not is_spec_good and self.ledger.available(sku_id) >= required_qty)
+            available_stock = self.ledger.available(sku_id) + (reservation.qty if reservation else 0)
+        else:
+            is_stock_good = available_stock >= required_qty
+
+        if is_spec_good and is_stock_good:
+            status = "AUTO-APPROVED" if self.auto_mode else "READY FOR SUBMISSION"
+        elif not is_stock_good:
+            status = "MANUAL REVIEW (Out of Stock)"
+        else:
+            status = "MANUAL REVIEW (Spec Mismatch)"
+
+        return {
+            "status": status,
+            "actual_score": actual_score,
+            "spec_threshold": self.spec_threshold,
+            "is_spec_good": is_spec_good,
+            "available_stock": available_stock,
+            "required_qty": required_qty,
+            "is_stock_good": is_stock_good,
+            "sku_id": sku_id,
+            "reservation_id": reservation.id if reservation else None,
+        }
+
+    def free_stock(self, sku_id: str, default: float = DEFAULT_STOCK) -> float:
+        """Metres of sku_id not held by another bid (the static figure when there is no ledger)."""
+        if self.ledger is not None and sku_id in self.ledger:
+            return self.ledger.available(sku_id)
+        return default
+
+    @timed("decision.allocate")
+    def allocate(self, demands: List[Dict[str, Any]], static_stock: Optional[Dict[str, float]] = None) -> Allocation:
+        """
+        Picks one candidate SKU per demand (allocation.demand) across all of them
+        at once, against current free stock. static_stock: Stock_Available of
+        SKUs the ledger doesn't track.
+        """
+        static_stock = static_stock or {}
+        skus = {c["SKU_ID"] for d in demands for c in d["candidates"]}
+        stock = {sku: self.free_stock(sku, static_stock.get(sku, DEFAULT_STOCK)) for sku in skus}
+        return allocate(demands, stock, spec_threshold=self.spec_threshold)
+
+    def decide_allocated(self, candidates: List[Dict[str, Any]], choice: Optional[int], required_qty,
+                         holder: Optional[str] = None, rank1_short: bool = False) -> Dict[str, Any]:
+        """
+        decide() on the allocated candidate (rank-1 when none was allocated); adds its
+        1-based rank and rank1_short (the plan, or a failed hold, found rank-1 short of stock).
+        The plan was made from a stock reading, so another bid may reserve first: when
+        the hold fails, the other in-spec candidates are tried before giving up.
+        """
+        if not candidates:
+            return {"status": "MANUAL REVIEW (No Match)", "sku_id": None, "rank": None, "rank1_short": False}
+        first = choice or 0
+        d = self.decide(candidates[first], required_qty, holder=holder)
+        d["rank"], d["rank1_short"] = first + 1, rank1_short
+        if self.ledger is None or d["is_stock_good"]:
+            return d  # Without a ledger nothing is held, so the plan can't have been overtaken
+        for j, candidate in enumerate(candidates):
+            if j == first or candidate["Spec_Match_%"] < self.spec_threshold:
+                continue
+            retry = self.decide(candidate, required_qty, holder=holder)
+            if retry["reservation_id"]:
+                retry["rank"], retry["rank1_short"] = j + 1, rank1_short or first == 0
+                return retry
+        return d
+
+    def decide_line_items(self, matches_per_item, quantities, priced_items,
+                          holder: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Decides every line item of one tender. Stock is allocated across the
+        items first, so a short rank-1 SKU falls back to an in-spec rank-2/3
+        match and two items never count the same metres.
+        priced_items: PricingAgent.price_line_items()["line_items"].
+        """
+        demands = [demand(q, m, p["per_product"]) for m, q, p in zip(matches_per_item, quantities, priced_items)]
+        static_stock = {m["record"]["SKU_ID"]: m["record"].get("Stock_Available", DEFAULT_STOCK)
+                        for matches in matches_per_item for m in matches}
+        plan = self.allocate(demands, static_stock)
+        return [self.decide_allocated(m, c, q, holder=holder, rank1_short=short)
+                for m, c, q, short in zip(matches_per_item, plan.choice, quantities, plan.rank1_short)]
+
+    @timed("decision.settle")
+    def settle(self, decisions: List[Dict[str, Any]]) -> str:
+        """
+        Overall status, with the tender's holds committed when it is AUTO-APPROVED.
+        Anything else keeps its holds until a human confirms them or they expire.
+        """
+        status = self.overall_status(decisions)
+        if status == "AUTO-APPROVED":
+            self.confirm(decisions)
+        return status
+
+    def confirm(self, decisions: List[Dict[str, Any]]) -> int:
+        """Commits the decisions' holds (e.g. when a human approves); returns how many were still open."""
+        if self.ledger is None:
+            return 0
+        return sum(self.ledger.confirm(d["reservation_id"]) for d in decisions if d.get("reservation_id"))
+
+    def release(self, decisions: List[Dict[str, Any]]) -> int:
+        """Gives the decisions' held stock back (bid dropped or re-run); returns how many were still open."""
+        if self.ledger is None:
+            return 0
+        return sum(self.ledger.release(d["reservation_id"]) for d in decisions if d.get("reservation_id"))
+
+    def overall_status(self, decisions: List[Dict[str, Any]]) -> str:
+        """A tender is only as good as its worst line item."""
+        for d in decisions:
+            if d["status"].startswith("MANUAL REVIEW"):
+                return d["status"]
+        return decisions[0]["status"] if decisions else "MANUAL REVIEW (No Line Items)"
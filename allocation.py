@@ -0,0 +1,173 @@
+from typing import Dict, Any, List, NamedTuple, Optional, Sequence
+
+from catalog import DEFAULT_STOCK
+
+# ==========================================
+# STOCK ALLOCATION ACROSS MANY BIDS
+# ==========================================
+# DecisionAgent.decide() judges one line item's rank-1 SKU in isolation: when
+# that SKU is short the item goes to manual review even if its rank-2 match is
+# in stock, and whichever bid happens to run first takes the stock.
+# allocate() sees every line item of a tender (or of a whole batch) at once,
+# each with its scored candidates, and assigns SKUs to maximise total spec
+# match within each SKU's free stock.
+#
+# A line item takes ONE SKU for its whole quantity (a cable run isn't split
+# across designs), which makes this a generalised assignment problem - NP-hard,
+# and a min-cost-flow relaxation would split items. So:
+#   1. regret greedy - items whose best option beats their next-best by the
+#      most pick first (an item with a single eligible SKU can't fall back);
+#      ties go to the most value per metre of stock, so one big run doesn't
+#      crowd out several small ones
+#   2. repair        - an unallocated item may take an SKU's stock from an allocated
+#      item that moves to one of its own alternatives (or gives it up), when
+#      total value strictly goes up
+#   3. upgrade       - allocated items move to an earlier option that still has room
+# 10k items x 3 candidates allocate in well under a second.
+#
+#   value(item, sku) = Spec_Match_% / 100, ties broken by search rank
+#
+# Options are ordered by (value, rank), so an item stays on rank-1 unless
+# rank-1 is short of stock for it (rank1_short). Price plays no part: the
+# catalog has list prices but no cost, and preferring the dearer of two equal
+# matches would only inflate the customer's quote. Only candidates at or above
+# the spec threshold are eligible: a mismatch goes to manual review whatever the stock.
+
+DEFAULT_SPEC_THRESHOLD = 90.0
+DEFAULT_REPAIR_ROUNDS = 3
+# Allocated items looked at per SKU when freeing room for an unallocated one
+REPAIR_SCAN = 64
+
+
+class Allocation(NamedTuple):
+    choice: List[Optional[int]]    # Per demand: index into its candidates, None = not allocated
+    value: float
+    remaining: Dict[str, float]    # Free stock per SKU after the allocation
+    stats: Dict[str, Any]
+    rank1_short: List[bool]        # Per demand: its in-spec rank-1 had no room for it
+
+
+def demand(qty, matches: Sequence[Dict[str, Any]], per_product: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """One line item as allocate() input: its metres + TechnicalAgent matches (in rank order) with their PricingAgent rows."""
+    return {"qty": float(qty or 0), "candidates": [
+        {"SKU_ID": p["SKU_ID"], "Spec_Match_%": m["Spec_Match_%"]} for m, p in zip(matches, per_product)]}
+
+
+def _first_come_rank1(demands, stock, threshold) -> int:
+    """Items the old per-bid rule approves: rank-1 only, in arrival order."""
+    free, approved = dict(stock), 0
+    for d in demands:
+        if d["candidates"]:
+            c = d["candidates"][0]
+            left = free.get(c["SKU_ID"], DEFAULT_STOCK)
+            if c["Spec_Match_%"] >= threshold and left >= d["qty"]:
+                free[c["SKU_ID"]] = left - d["qty"]
+                approved += 1
+    return approved
+
+
+def allocate(demands: Sequence[Dict[str, Any]], stock: Dict[str, float],
+             spec_threshold: float = DEFAULT_SPEC_THRESHOLD, repair_rounds: int = DEFAULT_REPAIR_ROUNDS) -> Allocation:
+    """
+    demands[i] = {"qty": metres, "candidates": [{"SKU_ID", "Spec_Match_%"}, ...] in search-rank order}
+    (see demand()); stock = free metres per SKU_ID (missing SKUs count as DEFAULT_STOCK).
+    """
+    n = len(demands)
+    qty = [d["qty"] for d in demands]
+    eligible = [[(j, c) for j, c in enumerate(d["candidates"]) if c["Spec_Match_%"] >= spec_threshold]
+                for d in demands]
+
+    # options[i]: (value, candidate index, SKU_ID), best first: spec match, then search rank
+    options = [sorted(((c["Spec_Match_%"] / 100.0, j, c["SKU_ID"]) for j, c in opts), key=lambda o: (-o[0], o[1]))
+               for opts in eligible]
+    remaining = {sku: stock.get(sku, DEFAULT_STOCK) for opts in options for _, _, sku in opts}
+    choice: List[Optional[int]] = [None] * n
+    value_of = [0.0] * n
+    sku_of: List[Optional[str]] = [None] * n
+    holders: Dict[str, set] = {sku: set() for sku in remaining}
+
+    def assign(i, v, j, sku):
+        remaining[sku] -= qty[i]
+        holders[sku].add(i)
+        choice[i], value_of[i], sku_of[i] = j, v, sku
+
+    def unassign(i):
+        remaining[sku_of[i]] += qty[i]
+        holders[sku_of[i]].discard(i)
+        choice[i], value_of[i], sku_of[i] = None, 0.0, None
+
+    # --- 1. REGRET GREEDY ---
+    order = []
+    for i, opts in enumerate(options):
+        if opts:
+            regret = opts[0][0] - opts[1][0] if len(opts) > 1 else float("inf")
+            order.append((-regret, -opts[0][0] / max(qty[i], 1.0), i))
+    for _, _, i in sorted(order):
+        for v, j, sku in options[i]:
+            if remaining[sku] >= qty[i]:
+                assign(i, v, j, sku)
+                break
+
+    # --- 2. REPAIR + 3. UPGRADE ---
+    moves = 0
+    for _ in range(repair_rounds):
+        improved = False
+        for i in range(n):
+            if choice[i] is not None or not options[i]:
+                continue
+            best = None  # (gain, v, j, sku, evicted, its new option or None)
+            for v, j, sku in options[i]:
+                short = qty[i] - remaining[sku]
+                if short <= 0:  # Room was freed by an earlier move
+                    if best is None or v > best[0]:
+                        best = (v, v, j, sku, None, None)
+                    break
+                for scanned, e in enumerate(holders[sku], 1):
+                    if scanned > REPAIR_SCAN:
+                        break
+                    if qty[e] < short:
+                        continue
+                    # e's best other SKU with room, else e gives the stock up (value 0)
+                    alt = next((o for o in options[e] if o[2] != sku and remaining[o[2]] >= qty[e]), None)
+                    gain = v + (alt[0] if alt else 0.0) - value_of[e]
+                    if gain > 1e-12 and (best is None or gain > best[0]):
+                        best = (gain, v, j, sku, e, alt)
+            if best is not None:
+                _, v, j, sku, e, alt = best
+                if e is not None:
+                    unassign(e)
+                    if alt is not None:
+                        assign(e, *alt)
+                assign(i, v, j, sku)
+                moves += 1
+                improved = True
+
+        for i in range(n):
+            if choice[i] is None:
+                continue
+            for v, j, sku in options[i]:
+                if j == choice[i]:
+                    break  # Only options ahead of the current one (more value, or same value and higher rank)
+                if remaining[sku] >= qty[i]:
+                    unassign(i)
+                    assign(i, v, j, sku)
+                    moves += 1
+                    improved = True
+                    break
+        if not improved:
+            break
+
+    allocated = sum(c is not None for c in choice)
+    total = sum(value_of)
+    rank1_short = [bool(opts) and opts[0][1] == 0 and choice[i] != 0 and remaining[opts[0][2]] < qty[i]
+                   for i, opts in enumerate(options)]
+    return Allocation(choice, total, remaining, {
+        "items": n,
+        "allocated": allocated,
+        "on_rank1": sum(c == 0 for c in choice),
+        "on_alternative": sum(c is not None and c > 0 for c in choice),
+        "unallocated": n - allocated,
+        "rank1_first_come": _first_come_rank1(demands, stock, spec_threshold),
+        "value": round(total, 4),
+        "repair_moves": moves,
+    }, rank1_short)
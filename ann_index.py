@@ -0,0 +1,203 @@
+import time
+import argparse
+import numpy as np
+import faiss
+from typing import Dict, Any, List, Optional
+
+# ==========================================
+# FAISS INDEX BACKENDS (Flat / IVF / HNSW / PQ)
+# ==========================================
+# flat     -> exact brute force, full float32 vectors (the original behaviour)
+# ivf_flat -> k-means buckets, scans only `nprobe` of them; full vectors
+# hnsw     -> graph search tuned by `efSearch`; full vectors + links (fastest, most RAM)
+# ivf_pq   -> IVF buckets + product-quantized codes (pq_m bytes per vector); smallest RAM
+
+INDEX_MODES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+DEFAULT_INDEX_MODE = "flat"
+
+# FAISS wants roughly this many training points per k-means centroid
+MIN_POINTS_PER_CENTROID = 39
+
+
+def default_nlist(n: int) -> int:
+    """~4*sqrt(n) buckets, capped so every centroid gets enough training points."""
+    return int(max(1, min(4 * np.sqrt(max(n, 1)), n // MIN_POINTS_PER_CENTROID)))
+
+
+def default_nprobe(nlist: int) -> int:
+    return int(min(nlist, max(8, nlist // 16)))
+
+
+def _pq_subquantizers(dimension: int, wanted: Optional[int]) -> int:
+    """Largest divisor of dimension <= wanted (default: 8 dims per sub-vector)."""
+    wanted = wanted or max(1, dimension // 8)
+    for m in range(min(wanted, dimension), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+
+def build_index(embeddings: np.ndarray, mode: str = DEFAULT_INDEX_MODE,
+                nlist: Optional[int] = None, nprobe: Optional[int] = None,
+                hnsw_m: int = 32, ef_construction: int = 80, ef_search: int = 64,
+                pq_m: Optional[int] = None, pq_nbits: int = 8):
+    """Builds, trains (if needed) and fills a FAISS index of the requested mode."""
+    if mode not in INDEX_MODES:
+        raise ValueError(f"Unknown index mode '{mode}'. Choose one of {INDEX_MODES}.")
+
+    x = np.ascontiguousarray(embeddings, dtype="float32")
+    n, dimension = x.shape
+
+    if mode == "flat":
+        index = faiss.IndexFlatL2(dimension)
+
+    elif mode == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, hnsw_m)
+        index.hnsw.efConstruction = ef_construction
+
+    else:
+        nlist = nlist or default_nlist(n)
+        if mode == "ivf_flat":
+            index = faiss.index_factory(dimension, f"IVF{nlist},Flat")
+        else:
+            m = _pq_subquantizers(dimension, pq_m)
+            # Small catalogs can't train 2^8 codewords per sub-quantizer
+            nbits = int(min(pq_nbits, max(1, np.log2(max(n, 2)))))
+            index = faiss.index_factory(dimension, f"IVF{nlist},PQ{m}x{nbits}")
+        index.train(x)
+
+    index.add(x)
+    tune_index(index, nprobe=nprobe, ef_search=ef_search)
+    return index
+
+
+def _as_ivf(index):
+    try:
+        return faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None
+
+
+def _as_hnsw(index):
+    index = faiss.downcast_index(index)
+    return index if hasattr(index, "hnsw") else None
+
+
+def tune_index(index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """Sets the recall/latency knob of an already built index (ignored where it doesn't apply)."""
+    ivf = _as_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = int(min(nprobe or default_nprobe(ivf.nlist), ivf.nlist))
+
+    hnsw = _as_hnsw(index)
+    if hnsw is not None and ef_search:
+        hnsw.hnsw.efSearch = int(ef_search)
+    return index
+
+
+def search_parameters(index, selector=None):
+    """
+    SearchParameters for an ID-filtered search. IVF/HNSW need their own
+    subclass, and a params object overrides the index's nprobe/efSearch,
+    so the tuned values are copied across.
+    """
+    ivf = _as_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+
+    hnsw = _as_hnsw(index)
+    if hnsw is not None:
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=hnsw.hnsw.efSearch)
+
+    return faiss.SearchParameters(sel=selector)
+
+
+def index_nbytes(index) -> int:
+    """Serialized size, a good proxy for resident memory."""
+    return int(faiss.serialize_index(index).size)
+
+
+# ==========================================
+# RECALL vs LATENCY REPORT
+# ==========================================
+# Values swept for each mode's search knob (nprobe for IVF, efSearch for HNSW)
+DEFAULT_SWEEPS = {
+    "flat": [None],
+    "ivf_flat": [1, 4, 16, 64],
+    "hnsw": [16, 32, 64, 128],
+    "ivf_pq": [1, 4, 16, 64],
+}
+
+
+def recall_report(embeddings: np.ndarray, queries: np.ndarray, k: int = 10,
+                  modes=INDEX_MODES, sweeps: Optional[Dict[str, list]] = None,
+                  **build_kwargs) -> List[Dict[str, Any]]:
+    """
+    Recall@k of each mode against the exact flat baseline, plus per-query
+    latency and index size, for every value in that mode's sweep.
+    """
+    sweeps = sweeps or DEFAULT_SWEEPS
+    queries = np.ascontiguousarray(queries, dtype="float32")
+
+    exact = faiss.IndexFlatL2(embeddings.shape[1])
+    exact.add(np.ascontiguousarray(embeddings, dtype="float32"))
+    _, truth = exact.search(queries, k)
+
+    rows = []
+    for mode in modes:
+        start = time.perf_counter()
+        index = build_index(embeddings, mode, **build_kwargs)
+        build_seconds = time.perf_counter() - start
+        nbytes = index_nbytes(index)
+
+        for value in sweeps.get(mode, [None]):
+            knob = None
+            if mode in ("ivf_flat", "ivf_pq"):
+                tune_index(index, nprobe=value)
+                knob = "nprobe"
+            elif mode == "hnsw":
+                tune_index(index, ef_search=value)
+                knob = "efSearch"
+
+            start = time.perf_counter()
+            _, found = index.search(queries, k)
+            elapsed = time.perf_counter() - start
+
+            hits = sum(len(np.intersect1d(f, t)) for f, t in zip(found, truth))
+            rows.append({
+                "mode": mode,
+                "param": knob,
+                "value": value,
+                f"recall@{k}": round(hits / float(k * len(queries)), 4),
+                "ms_per_query": round(1000.0 * elapsed / len(queries), 4),
+                "qps": round(len(queries) / elapsed, 1) if elapsed else None,
+                "index_mb": round(nbytes / 2**20, 2),
+                "build_seconds": round(build_seconds, 3),
+            })
+    return rows
+
+
+def _synthetic_vectors(n: int, dimension: int, clusters: int = 64, seed: int = 0) -> np.ndarray:
+    """Clustered unit vectors, closer to real text embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype("float32")
+    x = centers[rng.integers(0, clusters, n)] + 0.35 * rng.standard_normal((n, dimension)).astype("float32")
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    return x
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall vs latency of FAISS index modes on synthetic embeddings.")
+    parser.add_argument("--n", type=int, default=100000, help="Catalog size (vectors)")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension (all-MiniLM-L6-v2 = 384)")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    data = _synthetic_vectors(args.n + args.queries, args.dim)
+    report = recall_report(data[:args.n], data[args.n:], k=args.k)
+
+    print(f"{'mode':<9} {'knob':<14} {'recall':>8} {'ms/q':>9} {'MB':>9}")
+    for row in report:
+        knob = f"{row['param']}={row['value']}" if row["param"] else "-"
+        print(f"{row['mode']:<9} {knob:<14} {row[f'recall@{args.k}']:>8} {row['ms_per_query']:>9} {row['index_mb']:>9}")
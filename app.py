@@ -1,9 +1,14 @@
 import streamlit as st
-import time
+import os
+import tempfile
 import pandas as pd
 from datetime import datetime, timedelta
-from agents import SalesAgent, TechnicalAgent, PricingAgent
+from agents import SalesAgent, TechnicalAgent, PricingAgent, DecisionAgent
+from engine import get_engine
+from inventory import get_ledger
+from search_client import DEFAULT_SEARCH_SOCKET, SearchClient
 from setup_data import SAMPLE_RFP_TEXT
+from telemetry import get_telemetry
 
 # --- PAGE CONFIGURATION ---
 st.set_page_config(
@@ -21,9 +26,37 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
+# --- SHARED ENGINE ---
+# cache_resource keeps one engine across all sessions and reruns; warm-up runs once per process.
+@st.cache_resource(show_spinner="Loading embedding model & catalog index...")
+def load_engine():
+    return get_engine().warm_up()
+
+# With STRATABID_SEARCH_SOCKET set, every replica shares one search daemon
+# (search_daemon.py) instead of loading its own model and index
+@st.cache_resource
+def load_search_client():
+    return SearchClient(DEFAULT_SEARCH_SOCKET) if DEFAULT_SEARCH_SOCKET else None
+
+search_client = load_search_client()
+engine = None if search_client else load_engine()
+
+# One stock ledger for every session, so concurrent bids can't approve the same metres twice
+@st.cache_resource
+def load_ledger():
+    return get_ledger()
+
+ledger = load_ledger()
+
 # --- SIDEBAR ---
 st.sidebar.title("Agent Command")
-st.sidebar.info("System Ready")
+health = search_client.health()["engine"] if search_client else engine.health()
+st.sidebar.info(f"System Ready ({health['index_size']} SKUs indexed)")
+# Process-wide stage latency histograms (every session's bids)
+stage_stats = get_telemetry().summary()
+if stage_stats:
+    with st.sidebar.expander("Stage latency (ms)"):
+        st.dataframe(pd.DataFrame(stage_stats).T[["count", "p50_ms", "p95_ms", "max_ms"]])
 st.sidebar.markdown("---")
 st.sidebar.subheader("Configuration")
 auto_mode = st.sidebar.checkbox("Enable Auto-Submit", value=True)
@@ -50,28 +83,71 @@ with col1:
         help="Paste the raw text from the tender document here."
     )
     
+    uploaded_doc = st.file_uploader(
+        "...or upload the tender document:",
+        type=["pdf", "docx", "txt"],
+        help="Large PDFs are read page by page; the parser stops once every field is found."
+    )
+    
     process_btn = st.button("Process RFP", type="primary")
 
 with col2:
     st.info("**Demo Tip:** You can edit the text on the left to test different scenarios (e.g., change '1.1kV' to '3.3kV' or remove 'Fire Retardant').")
 
+# A READY FOR SUBMISSION bid holds its stock until "Human Approve & Send" commits it.
+# The button reruns the script without process_btn, so its click is handled in a callback.
+def approve_pending():
+    pending = st.session_state.pop("pending_decisions", None)
+    if pending:
+        DecisionAgent(ledger=ledger).confirm(pending)
+        st.session_state["approved_sku"] = pending[0]["sku_id"]
+
+
+if st.session_state.get("approved_sku"):
+    st.success(f"Bid approved and sent; stock of {st.session_state.pop('approved_sku')} committed.")
+
 if process_btn:
     # --- START WORKFLOW ---
+    # A new bid replaces one still waiting for approval: give its held stock back
+    if st.session_state.get("pending_decisions"):
+        DecisionAgent(ledger=ledger).release(st.session_state.pop("pending_decisions"))
     
+    # Real per-stage timings for this bid (see telemetry.py), shown under the decision
+    bid_trace = get_telemetry().trace().start()
+
     # 1. PARSING
     sales = SalesAgent()
     with st.spinner("Sales Agent is parsing requirements..."):
-        time.sleep(1.0) # Illusion of processing
-        
-        # Parse the input text
-        rfp_spec = sales.parse_rfp(rfp_input_text)
+        # Parse the uploaded document (if any), otherwise the input text
+        provenance = None
+        if uploaded_doc is not None:
+            suffix = os.path.splitext(uploaded_doc.name)[1]
+            with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+                tmp.write(uploaded_doc.getbuffer())
+            try:
+                # Long PDFs use the process-wide page pool; short ones are read serially (see ingestion.py)
+                parsed_doc = sales.parse_document(tmp.name, workers=os.cpu_count())
+            finally:
+                os.remove(tmp.name)
+            doc_items = parsed_doc["line_items"]
+            if len(doc_items) > 1:
+                # This page bids one cable; batch_runner.py bids every BOQ row
+                rfp_spec = doc_items[0]
+                st.warning(f"This tender has {len(doc_items)} BOQ line items. Only item 1 is bid below; "
+                           f"items 2-{len(doc_items)} are NOT included. Run batch_runner.py on the document to bid all of them.")
+                with st.expander(f"Ignored line items ({len(doc_items) - 1})"):
+                    st.dataframe(pd.DataFrame(doc_items[1:], index=range(2, len(doc_items) + 1)).astype(str))
+            else:
+                rfp_spec, provenance = parsed_doc["spec"], parsed_doc["provenance"]
+        else:
+            rfp_spec = sales.parse_rfp(rfp_input_text)
         
         # Create a Mock RFP Object wrapper so the rest of the app works
         selected_rfp = {
             "id": "MANUAL-INPUT-001",
             "title": "Manual Web Submission",
             "due_date": datetime.now() + timedelta(days=45), # Fake due date
-            "text": rfp_input_text,
+            "text": uploaded_doc.name if uploaded_doc is not None else rfp_input_text,
             "tests_required": ["Routine Test", "Type Test"] # Default assumption
         }
     
@@ -80,6 +156,9 @@ if process_btn:
     # Show Parsed Structure
     with st.expander("View Structured Data (JSON)", expanded=True):
         st.json(rfp_spec)
+        if provenance:
+            st.caption("Source pages:")
+            st.json({k: (f"page {v['page']}" if v else "default") for k, v in provenance.items()})
 
     # ==========================================
     # PHASE 2: TECHNICAL AGENT
@@ -87,10 +166,9 @@ if process_btn:
     st.markdown("---")
     st.header("2. Technical Agent: Semantic Matching")
     
-    tech = TechnicalAgent()
+    tech = TechnicalAgent(engine, client=search_client)
     
     with st.spinner("Querying Vector Database & Calculating Scores..."):
-        time.sleep(0.5) 
         # Note: We pass the FULL rfp_spec here now
         matches = tech.search(rfp_spec, top_k=3)
     
@@ -130,11 +208,10 @@ if process_btn:
     # ==========================================
     # PHASE 3: PRICING AGENT
     # ==========================================
-    time.sleep(0.5)
     st.markdown("---")
     st.header("3. Pricing Agent: Cost Calculation")
     
-    pricing = PricingAgent()
+    pricing = PricingAgent.from_config()
     qty = rfp_spec.get("Quantity_m", 0)
     # Logic: If user didn't mention tests, assume standard ones
     tests_required = selected_rfp["tests_required"]
@@ -143,12 +220,31 @@ if process_btn:
     top_per_product = sorted(matches, key=lambda x: x["Spec_Match_%"], reverse=True)
     
     pricing_report = pricing.price_tests_and_consolidate(top_per_product, tests_required, qty)
-    best_option_cost = pricing_report['per_product'][0]
+
+    # The quote is for the SKU the Decision Agent allocates: rank-1, or an in-spec
+    # rank-2/3 match when rank-1 is short on stock (shown in Phase 4)
+    decision_agent = DecisionAgent(spec_threshold=90.0, auto_mode=auto_mode, ledger=ledger)
+    decision = decision_agent.decide_line_items([top_per_product], [qty], [pricing_report])[0]
+    if decision["status"] == "READY FOR SUBMISSION":
+        st.session_state["pending_decisions"] = [decision]  # Held until approved (or the next bid)
+    elif decision["status"] == "AUTO-APPROVED":
+        decision_agent.settle([decision])  # Commits the hold: another session can't sell the same metres
+    else:
+        # A manual-review bid isn't going out; give its hold back to the shared ledger
+        decision_agent.release([decision])
+    best_option_cost = next((p for p in pricing_report['per_product'] if p['SKU_ID'] == decision['sku_id']),
+                            pricing_report['per_product'][0])
     
     p_col1, p_col2, p_col3 = st.columns(3)
     p_col1.metric("Material Cost", f"₹{best_option_cost['Material_Price']:,.2f}")
     p_col2.metric("Testing Services", f"₹{best_option_cost['Services_Price']:,.2f}")
     p_col3.metric("Grand Total Bid", f"₹{best_option_cost['Total_Price']:,.2f}", delta="Competitive")
+    st.caption(f"{best_option_cost['SKU_ID']}: billed {best_option_cost['Billed_m']:,.0f}m at "
+               f"₹{best_option_cost['Unit_Price']:,.2f}/m ({best_option_cost['Discount_%']}% volume discount)")
+
+    # What-if: total bid of every candidate across quantities (one vectorized pass)
+    with st.expander("Price curve by quantity"):
+        st.line_chart(pricing.price_sweep(top_per_product, tests_required, quantity_m=qty))
 
     # ==========================================
     # PHASE 4: DECISION AGENT
@@ -159,16 +255,13 @@ if process_btn:
     st.markdown("---")
     st.header("4. Decision Agent: Approval")
     
-    spec_threshold = 90.0
-    
-    # 1. Get Data
-    actual_score = best_match['Spec_Match_%']
-    required_qty = rfp_spec.get("Quantity_m", 0)
-    available_stock = best_match['record'].get('Stock_Available', 999999) # Default to infinite if missing
-    
-    # 2. Logic Checks
-    is_spec_good = actual_score >= spec_threshold
-    is_stock_good = available_stock >= required_qty
+    # Decided with the pricing above: rank-1 first, an in-spec rank-2/3 match when rank-1 is short
+    spec_threshold = decision["spec_threshold"]
+    actual_score = decision["actual_score"]
+    required_qty = decision["required_qty"]
+    available_stock = decision["available_stock"]
+    is_spec_good = decision["is_spec_good"]
+    is_stock_good = decision["is_stock_good"]
     
     d_col1, d_col2 = st.columns([2, 1])
     
@@ -181,6 +274,11 @@ if process_btn:
             st.write(f"- Inventory: {available_stock}m > {required_qty}m")
         else:
             st.write(f"- Inventory: {available_stock}m < {required_qty}m (Insufficient Stock)")
+        if decision["reservation_id"] and decision["status"] == "READY FOR SUBMISSION":
+            st.caption(f"Stock held: {required_qty}m of {decision['sku_id']} until approved "
+                       f"(reservation {decision['reservation_id'][:8]})")
+        if decision.get("rank1_short") and decision.get("rank", 1) > 1:
+            st.info(f"Rank #1 is short on stock; allocated Rank #{decision['rank']} ({decision['sku_id']}) instead.")
     
     with d_col2:
         if is_spec_good and is_stock_good:
@@ -189,8 +287,13 @@ if process_btn:
                 st.toast("Bid sent to ERP!")
             else:
                 st.warning("READY FOR SUBMISSION")
-                st.button("Human Approve & Send")
+                st.button("Human Approve & Send", on_click=approve_pending)
         elif not is_stock_good:
              st.error("MANUAL REVIEW (Out of Stock)")
         else:
-             st.error("MANUAL REVIEW (Spec Mismatch)")
\ No newline at end of file
+             st.error("MANUAL REVIEW (Spec Mismatch)")
+
+    bid_trace.stop()
+    with st.expander("Where the time went"):
+        st.bar_chart(pd.Series(bid_trace.as_ms(), name="ms"))
+        st.caption(f"Total {1000.0 * bid_trace.elapsed:,.1f} ms. Stages nest: technical.search includes its encode / faiss / score / rank parts.")
\ No newline at end of file
@@ -0,0 +1,459 @@
+import os
+import sys
+import csv
+import json
+import itertools
+import time
+import argparse
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Callable, Iterable, Iterator, List, Optional
+
+from agents import SalesAgent, TechnicalAgent, PricingAgent, DecisionAgent
+from allocation import demand
+from catalog import Catalog, DEFAULT_STOCK
+from dedup import Duplicate, TenderDeduper, catalog_digest, reusable_items
+from engine import MatchingEngine, get_engine, set_engine
+from inventory import get_ledger, open_ledger
+from scheduler import TenderScheduler
+from search_client import DEFAULT_SEARCH_SOCKET, SearchClient
+from telemetry import get_telemetry
+
+# ==========================================
+# HEADLESS BATCH RUNNER (Portal-Scan Mode)
+# ==========================================
+# Runs Sales -> Technical -> Pricing -> Decision for every RFP in a JSONL/CSV
+# file (or setup_data.SAMPLE_RFPS) without Streamlit. Each worker process
+# loads the matching engine once, results are appended to the output as soon
+# as each RFP finishes, and throughput is reported as RFPs/sec.
+#
+#   python batch_runner.py tenders.jsonl -o results.jsonl --workers 8
+#   python batch_runner.py --sample
+#   python batch_runner.py tenders.jsonl --schedule   # earliest-deadline-first order
+#
+# Input rows: id, title, due_date, tests_required, and either text (raw RFP
+# text/JSON) or path (PDF/DOCX/TXT). In CSV, tests_required is ';'-separated.
+#
+# Stock is reserved through inventory.py, so two tenders never get approved
+# against the same metres. Worker processes share one SQLite ledger
+# (--ledger, or a throwaway file for the run).
+#
+# Each tender's line items share stock through allocation.py (a short rank-1
+# SKU falls back to an in-spec rank-2/3 match). --allocate widens that to the
+# whole batch: results are held until every bid is priced, then decided together.
+#
+# With --dedup, a re-issued tender (MinHash near-duplicate of one already
+# processed, see dedup.py) reuses the parsed specs and matches of its unchanged
+# line items; --dedup-store keeps those fingerprints between nightly runs.
+#
+# --search-socket (or STRATABID_SEARCH_SOCKET) points the workers at a running
+# search_daemon.py: they hold no model or index of their own, so adding
+# workers no longer multiplies that memory.
+#
+# Every result carries its per-stage timings (timings_ms); --metrics writes
+# the run's stage histograms as Prometheus text (.prom) or JSON (see telemetry.py):
+# per call for spans run in this process, and per RFP (stage totals) for every bid.
+
+DEFAULT_TESTS = ["Routine Test", "Type Test"]
+
+# Status of a result whose decision waits for batch-wide allocation (--allocate)
+PENDING = "PENDING ALLOCATION"
+
+# Per-process agents, created once by _init_worker()
+_AGENTS = None
+
+
+def _init_worker(threads_per_worker: Optional[int] = None, auto_mode: bool = True,
+                 ledger_db: Optional[str] = None, catalog_handle=None,
+                 search_socket: Optional[str] = DEFAULT_SEARCH_SOCKET):
+    global _AGENTS
+    if search_socket:
+        # Thin client: the search daemon holds the model, index and catalog for every worker
+        tech = TechnicalAgent(client=SearchClient(search_socket))
+    else:
+        if threads_per_worker:
+            # N workers x all-core BLAS/OpenMP pools would oversubscribe the box
+            import faiss
+            faiss.omp_set_num_threads(threads_per_worker)
+            try:
+                import torch
+                torch.set_num_threads(threads_per_worker)
+            except ImportError:
+                pass
+
+        if catalog_handle is not None:
+            # Read-only catalog in shared memory: one copy on the box, not one per worker
+            set_engine(MatchingEngine(Catalog.attach(catalog_handle)))
+        tech = TechnicalAgent(get_engine().warm_up())
+    _AGENTS = {
+        "sales": SalesAgent(),
+        "tech": tech,
+        "pricing": PricingAgent.from_config(),
+        "decision": DecisionAgent(auto_mode=auto_mode,
+                                  ledger=open_ledger(db_path=ledger_db) if ledger_db else get_ledger()),
+    }
+
+
+def process_rfp(rfp: Dict[str, Any], top_k: int = 3, duplicate: Optional[Duplicate] = None,
+                decide: bool = True) -> Dict[str, Any]:
+    """
+    Full agent pipeline for one RFP. Errors are reported in the result, never raised.
+    duplicate: an earlier near-identical tender whose unchanged line items are reused.
+    decide=False stops after pricing with status PENDING, for allocate_pending().
+    """
+    if _AGENTS is None:
+        _init_worker()
+
+    start = time.perf_counter()
+    result = {
+        "id": rfp.get("id"),
+        "title": rfp.get("title"),
+        "due_date": rfp.get("due_date"),
+        "worker": os.getpid(),
+    }
+    telemetry = get_telemetry()
+    with telemetry.trace() as trace, telemetry.span("pipeline.rfp"):
+        _run_pipeline(rfp, result, top_k, duplicate, decide)
+
+    result["elapsed_ms"] = round(1000.0 * (time.perf_counter() - start), 2)
+    result["timings_ms"] = trace.as_ms()
+    return result
+
+
+def _run_pipeline(rfp: Dict[str, Any], result: Dict[str, Any], top_k: int, duplicate: Optional[Duplicate],
+                  decide: bool = True):
+    sales, tech = _AGENTS["sales"], _AGENTS["tech"]
+    pricing, decision = _AGENTS["pricing"], _AGENTS["decision"]
+    try:
+        # 1. PARSING (documents stream page by page; text may hold many BOQ rows)
+        fingerprints, known = [None], [None]
+        if rfp.get("path"):
+            line_items = sales.parse_document(rfp["path"])["line_items"]
+            fingerprints, known = [None] * len(line_items), [None] * len(line_items)
+        else:
+            text = rfp.get("text") or ""
+            fingerprints = sales.line_item_fingerprints(text)
+            known = [duplicate.items.get(fp) if duplicate else None for fp in fingerprints]
+            # A re-issue with every item unchanged skips parsing altogether
+            line_items = [k["spec"] for k in known] if all(known) else sales.parse_line_items(text)
+            if len(line_items) != len(fingerprints):
+                fingerprints, known = [None] * len(line_items), [None] * len(line_items)
+
+        # 2. MATCHING (unchanged items of a re-issue are reused; the rest go in one batch)
+        matches = [tech.matches_from_ids(k["matches"]) if k else None for k in known]
+        todo = [i for i, m in enumerate(matches) if m is None]
+        if todo:
+            for i, found in zip(todo, tech.search_batch([line_items[i] for i in todo], top_k=top_k)):
+                matches[i] = found
+        if duplicate is not None:
+            result["reused_from"] = {"rfp_id": duplicate.rfp_id, "similarity": duplicate.similarity,
+                                     "items_reused": len(line_items) - len(todo), "items_recomputed": len(todo)}
+
+        # 3. PRICING
+        tests_required = rfp.get("tests_required") or DEFAULT_TESTS
+        quantities = [spec.get("Quantity_m", 0) for spec in line_items]
+        report = pricing.price_line_items(matches, tests_required, quantities)
+
+        items = [{
+            "spec": spec,
+            "fingerprint": fp,
+            "matches": [{"SKU_ID": m["record"]["SKU_ID"], "Spec_Match_%": m["Spec_Match_%"],
+                         "distance": m["distance"]} for m in item_matches],
+        } for spec, fp, item_matches in zip(line_items, fingerprints, matches)]
+
+        if not decide:
+            # Batch-wide allocation decides later (allocate_pending); keep what it needs
+            for item, item_matches, priced in zip(items, matches, report["line_items"]):
+                item["pending"] = {"per_product": priced["per_product"],
+                                   "stock": [m["record"].get("Stock_Available", DEFAULT_STOCK) for m in item_matches]}
+            result.update({"status": PENDING, "line_items": items, "error": None})
+            return
+
+        # 4. DECISION (stock allocated across the tender's items; rank-2/3 step in for a short rank-1)
+        decisions = decision.decide_line_items(matches, quantities, report["line_items"], holder=result["id"])
+        _finish(result, items, [p["per_product"] for p in report["line_items"]], decisions, pricing, decision)
+    except Exception as e:
+        result.update({"status": "ERROR", "error": f"{type(e).__name__}: {e}"})
+
+
+def _finish(result, items, per_product, decisions, pricing: PricingAgent, decision: DecisionAgent):
+    """Attaches each item's decision and the price of the SKU it was allocated, then settles the tender."""
+    chosen = []
+    for item, priced, d in zip(items, per_product, decisions):
+        item["pricing"] = priced[d["rank"] - 1] if d.get("rank") else None
+        item["decision"] = d
+        chosen.append(item["pricing"])
+    result.update({
+        "status": decision.settle(decisions),
+        "Grand_Total": pricing.bill(chosen)["Grand_Total"],
+        "line_items": items,
+        "error": None,
+    })
+
+
+def allocate_pending(results: List[Dict[str, Any]], decision: DecisionAgent,
+                     pricing: Optional[PricingAgent] = None) -> Dict[str, Any]:
+    """
+    Decides every PENDING result of a batch together: stock goes to the
+    line items where it buys the most spec match, with in-spec rank-2/3
+    alternatives filling in (see allocation.py). Returns allocation stats.
+    """
+    pricing = pricing or PricingAgent.from_config()
+    pending = [r for r in results if r["status"] == PENDING]
+    items = [item for r in pending for item in r["line_items"]]
+    demands = [demand(item["spec"].get("Quantity_m", 0), item["matches"], item["pending"]["per_product"])
+               for item in items]
+    static_stock = {m["SKU_ID"]: stock for item in items
+                    for m, stock in zip(item["matches"], item["pending"]["stock"])}
+    plan = decision.allocate(demands, static_stock)
+
+    choices, shorts = iter(plan.choice), iter(plan.rank1_short)
+    for r in pending:
+        decisions, per_product = [], []
+        for item in r["line_items"]:
+            held = item.pop("pending")
+            candidates = [{"Spec_Match_%": m["Spec_Match_%"], "record": {"SKU_ID": m["SKU_ID"], "Stock_Available": stock}}
+                          for m, stock in zip(item["matches"], held["stock"])]
+            decisions.append(decision.decide_allocated(candidates, next(choices), item["spec"].get("Quantity_m", 0),
+                                                       holder=r["id"], rank1_short=next(shorts)))
+            per_product.append(held["per_product"])
+        _finish(r, r["line_items"], per_product, decisions, pricing, decision)
+    return plan.stats
+
+
+# --- INPUT / OUTPUT ---
+def read_rfps(path: str) -> Iterator[Dict[str, Any]]:
+    """Streams RFP dicts from a .jsonl or .csv file."""
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                tests = row.get("tests_required") or ""
+                row["tests_required"] = [t.strip() for t in tests.split(";") if t.strip()]
+                yield row
+    else:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def sample_rfps() -> List[Dict[str, Any]]:
+    from setup_data import SAMPLE_RFPS
+    return [dict(r, due_date=str(r["due_date"])) for r in SAMPLE_RFPS]
+
+
+def run_batch(rfps: Iterable[Dict[str, Any]], out=None, workers: int = 1, top_k: int = 3,
+              auto_mode: bool = True, progress_every: int = 100, ledger_db: Optional[str] = None,
+              on_result: Optional[Callable[[Dict[str, Any], Dict[str, Any]], None]] = None,
+              dedup: bool = False, dedup_store: Optional[str] = None, allocate: bool = False,
+              search_socket: Optional[str] = DEFAULT_SEARCH_SOCKET) -> Dict[str, Any]:
+    """
+    Processes every RFP and writes one JSON line per result to `out` as it completes.
+    rfps is pulled lazily, so it can be a scheduler's drain() that re-prioritizes
+    on every pull. on_result(rfp, result) is called after each RFP.
+    ledger_db: SQLite stock ledger to reserve against (default: in-process ledger,
+    or a temporary shared file when workers > 1).
+    dedup: reuse unchanged line items of near-duplicate tenders (dedup_store, if
+    given, is loaded first and rewritten at the end, implying dedup).
+    allocate: hold every result until the whole batch is matched and priced,
+    then decide them together so competing bids share stock (allocate_pending).
+    search_socket: match through a running search_daemon.py instead of loading
+    the model and index in every worker.
+    Returns a summary with counts per status and throughput.
+    """
+    start = time.perf_counter()
+    summary = {"processed": 0, "errors": 0, "by_status": {}}
+    deduper = None
+    held = []  # (rfp, result) awaiting batch-wide allocation
+
+    def open_deduper(digest: str):
+        nonlocal deduper
+        if dedup or dedup_store:
+            deduper = TenderDeduper(catalog=digest)
+            if dedup_store and os.path.exists(dedup_store):
+                print(f"📋 {deduper.load(dedup_store)} known tenders loaded from {dedup_store}", file=sys.stderr)
+
+    def duplicate_of(rfp, signature=None) -> Optional[Duplicate]:
+        # Results still in flight aren't indexed yet; only finished tenders are reused
+        return deduper.lookup(rfp["text"], signature) if deduper is not None and rfp.get("text") else None
+
+    def finished(rfp, result):
+        if deduper is not None and rfp.get("text"):
+            deduper.add(result["id"], rfp["text"], reusable_items(result))
+        if allocate:
+            held.append((rfp, result))
+        else:
+            emit(rfp, result)
+
+    def release_held(decision: DecisionAgent, pricing: Optional[PricingAgent] = None):
+        if held:
+            summary["allocation"] = allocate_pending([r for _, r in held], decision, pricing)
+        for rfp, result in held:
+            emit(rfp, result)
+
+    def emit(rfp, result):
+        if on_result is not None:
+            on_result(rfp, result)
+        # Per-RFP stage totals, from this process or a worker; kept apart from the per-call span histograms
+        get_telemetry().merge(result.get("timings_ms") or {})
+        summary["processed"] += 1
+        summary["errors"] += result["status"] == "ERROR"
+        summary["by_status"][result["status"]] = summary["by_status"].get(result["status"], 0) + 1
+        if out is not None:
+            out.write(json.dumps(result, default=str) + "\n")
+            out.flush()
+        if progress_every and summary["processed"] % progress_every == 0:
+            rate = summary["processed"] / (time.perf_counter() - start)
+            print(f"... {summary['processed']} RFPs ({rate:.1f} RFPs/sec)", file=sys.stderr)
+
+    if workers <= 1:
+        _init_worker(auto_mode=auto_mode, ledger_db=ledger_db, search_socket=search_socket)
+        tech = _AGENTS["tech"]
+        if dedup or dedup_store:
+            open_deduper(tech.client.catalog_digest() if tech.client else catalog_digest(tech.engine.snapshot().live_records()))
+        for rfp in rfps:
+            finished(rfp, process_rfp(rfp, top_k, duplicate_of(rfp), not allocate))
+        release_held(_AGENTS["decision"], _AGENTS["pricing"])
+    else:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        window = deque()
+        tmp_dir = None
+        if ledger_db is None:
+            # Per-worker in-memory ledgers would each see the full stock
+            tmp_dir = tempfile.TemporaryDirectory(prefix="stratabid-ledger-")
+            ledger_db = os.path.join(tmp_dir.name, "ledger.sqlite")
+            open_ledger(db_path=ledger_db)  # Seed once before the workers start
+        catalog = handle = None
+        if search_socket:
+            if dedup or dedup_store:
+                open_deduper(SearchClient(search_socket).catalog_digest())
+        else:
+            # Catalog goes into shared memory once; workers attach instead of rebuilding it
+            parent = get_engine()
+            catalog = Catalog(parent.snapshot().live_records() if parent.is_loaded else parent.records_list)
+            handle = catalog.share()
+            if dedup or dedup_store:
+                open_deduper(catalog_digest(catalog))
+        # A re-issue of a tender that is still in flight waits for it, so it can reuse its
+        # line items: in_flight indexes every submitted tender (slot = submit order) and
+        # waiting[slot] holds the near-duplicates to submit once that slot finishes.
+        in_flight = TenderDeduper(threshold=deduper.threshold) if deduper is not None else None
+        waiting: Dict[int, List[Dict[str, Any]]] = {}
+        slots = itertools.count()
+
+        def submit(pool, rfp):
+            sig = None
+            if in_flight is not None and rfp.get("text"):
+                sig = deduper.hasher.signature(rfp["text"])
+                original = in_flight.lookup(rfp["text"], sig)
+                if original is not None and int(original.rfp_id) in waiting:
+                    waiting[int(original.rfp_id)].append(rfp)
+                    return
+            slot = next(slots)
+            if sig is not None:
+                in_flight.add(str(slot), rfp["text"], {}, signature=sig)
+                waiting[slot] = []
+            window.append((slot, rfp, pool.submit(process_rfp, rfp, top_k, duplicate_of(rfp, sig), not allocate)))
+
+        def finish_next(pool):
+            slot, done_rfp, future = window.popleft()
+            finished(done_rfp, future.result())
+            for rfp in waiting.pop(slot, ()):
+                submit(pool, rfp)
+
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(threads, auto_mode, ledger_db, handle, search_socket)) as pool:
+                # Bounded in-flight window: the input file is never fully loaded
+                for rfp in rfps:
+                    submit(pool, rfp)
+                    while len(window) >= 4 * workers:
+                        finish_next(pool)
+                while window:
+                    finish_next(pool)
+            # Workers held nothing; this process reserves against the same shared ledger
+            release_held(DecisionAgent(auto_mode=auto_mode, ledger=open_ledger(db_path=ledger_db)))
+        finally:
+            if catalog is not None:
+                catalog.close()
+                catalog.unlink()
+            if tmp_dir is not None:
+                tmp_dir.cleanup()
+
+    if deduper is not None:
+        summary["dedup"] = deduper.stats()
+        if dedup_store:
+            deduper.save(dedup_store)
+
+    elapsed = time.perf_counter() - start
+    summary["elapsed_seconds"] = round(elapsed, 3)
+    summary["rfps_per_second"] = round(summary["processed"] / elapsed, 2) if elapsed else None
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the full RFP agent pipeline over a batch of tenders.")
+    parser.add_argument("input", nargs="?", help="RFPs as .jsonl or .csv")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl", help="Results .jsonl (appended to)")
+    parser.add_argument("--sample", action="store_true", help="Use setup_data.SAMPLE_RFPS instead of a file")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (engine loads once per worker)")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--no-auto", action="store_true", help="Never auto-approve; mark READY FOR SUBMISSION")
+    parser.add_argument("--ledger", help="SQLite stock ledger to reserve against (kept between runs)")
+    parser.add_argument("--schedule", action="store_true",
+                        help="Queue everything first, then run by earliest deadline / value (see scheduler.py)")
+    parser.add_argument("--min-value", type=float, default=0.0,
+                        help="With --schedule: tenders with a lower 'value' field go to the back of the queue")
+    parser.add_argument("--allocate", action="store_true",
+                        help="Decide after the whole batch is priced, sharing stock across bids (see allocation.py)")
+    parser.add_argument("--search-socket", default=DEFAULT_SEARCH_SOCKET,
+                        help="Match through a running search_daemon.py (default: $STRATABID_SEARCH_SOCKET)")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Reuse parse/match results of unchanged line items in re-issued tenders (see dedup.py)")
+    parser.add_argument("--dedup-store", help="Tender fingerprints kept between runs (.jsonl; implies --dedup)")
+    parser.add_argument("--metrics", help="Write per-stage latency histograms here (.prom = Prometheus text, else JSON)")
+    parser.add_argument("--profile", help="Sample stacks during the run and write folded stacks here (flamegraph/speedscope)")
+    args = parser.parse_args(argv)
+
+    if not args.sample and not args.input:
+        parser.error("give an input file or --sample")
+    rfps = sample_rfps() if args.sample else read_rfps(args.input)
+
+    on_result = None
+    if args.schedule:
+        scheduler = TenderScheduler(workers=args.workers, min_value=args.min_value)
+        for rfp in rfps:
+            scheduler.submit(rfp)
+        print(f"📋 Queue: {json.dumps(scheduler.stats())}", file=sys.stderr)
+        rfps = scheduler.drain()
+        on_result = lambda rfp, result: scheduler.complete(rfp, result["elapsed_ms"] / 1000.0)
+
+    telemetry = get_telemetry()
+    if args.profile:
+        if args.workers > 1:
+            print("⚠️ --profile samples this process only; use --workers 1 to profile the pipeline", file=sys.stderr)
+        telemetry.start_profiler()
+
+    with open(args.output, "a", encoding="utf-8") as out:
+        summary = run_batch(rfps, out, workers=args.workers, top_k=args.top_k,
+                            auto_mode=not args.no_auto, ledger_db=args.ledger, on_result=on_result,
+                            dedup=args.dedup, dedup_store=args.dedup_store, allocate=args.allocate,
+                            search_socket=args.search_socket)
+
+    if args.profile:
+        telemetry.stop_profiler().write_folded(args.profile)
+    if args.metrics:
+        telemetry.write(args.metrics)
+
+    print(f"✅ {summary['processed']} RFPs in {summary['elapsed_seconds']}s "
+          f"({summary['rfps_per_second']} RFPs/sec), {summary['errors']} errors", file=sys.stderr)
+    print(json.dumps(summary["by_status"]), file=sys.stderr)
+    if "allocation" in summary:
+        print(f"📦 Allocation: {json.dumps(summary['allocation'])}", file=sys.stderr)
+    if "dedup" in summary:
+        print(f"♻️ Near-duplicates: {json.dumps(summary['dedup'])}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
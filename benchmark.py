@@ -0,0 +1,308 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+import numpy as np
+from datetime import datetime, timezone
+from typing import Dict, Any, Callable, List, Optional, Sequence
+
+from setup_data import TESTS_PRICING
+
+# ==========================================
+# REPRODUCIBLE BENCHMARK SUITE
+# ==========================================
+# Generates a synthetic catalog (DATASHEET_RECORDS schema) and RFP texts
+# (SAMPLE_RFP_TEXT style) from a seed, runs every pipeline stage on them
+# under each index mode, and writes one JSON file per run:
+#
+#   python benchmark.py --sizes 1000,10000 --modes flat,hnsw -o bench.json
+#   python benchmark.py --sizes 1000,10000 --compare bench-v1.json    # exits 1 on regression
+#
+# Per catalog size x index mode it records:
+#   - throughput and p50/p99 latency of parse / search / search_batch / score / lexical / price
+#   - lexical_fast_path_rate: share of searches the BM25 fast path answered without the encoder
+#   - best_match_rate: share of RFPs whose rank-1 SKU has the best Spec_Match_% in the catalog
+#   - vector_recall@k: FAISS neighbours vs an exact flat search over the same embeddings
+#
+# Caches are disabled so every search pays the full encode + search cost.
+# Embeddings are cached per catalog size in a temp dir, so each extra index mode
+# only rebuilds the index. 1M SKUs means encoding 1M descriptions once; that
+# cost shows up as build_seconds for the first mode.
+
+# --- 1. SPEC DISTRIBUTIONS (weights roughly follow a cable maker's order book) ---
+VOLTAGES = {1.1: 0.45, 1.5: 0.05, 3.3: 0.10, 6.6: 0.08, 11.0: 0.17, 22.0: 0.05, 33.0: 0.10}
+CORES = {1: 0.15, 2: 0.05, 3: 0.35, 3.5: 0.10, 4: 0.25, 12: 0.10}
+MATERIALS = {"Aluminum": 0.7, "Copper": 0.3}
+INSULATIONS = {"XLPE": 0.75, "PVC": 0.20, "XLPO": 0.05}
+SIZES_SQMM = (16, 25, 35, 50, 70, 95, 120, 150, 185, 240, 300, 400)
+FR_SHARE = 0.6
+
+# Share of RFPs that ask for a spec that isn't exactly in stock (one field altered)
+DEFAULT_SPEC_NOISE = 0.2
+
+DEFAULT_SIZES = (1000, 10000)
+DEFAULT_MODES = ("flat", "ivf_flat", "hnsw")
+
+# --compare fails when a stage's p50 grows by more than this fraction
+# (and by more than MIN_DELTA_MS, so timer jitter on sub-ms stages isn't a regression)
+DEFAULT_TOLERANCE = 0.25
+MIN_DELTA_MS = 0.25
+
+
+def _segment(voltage: float, cores: float, insulation: str) -> str:
+    if insulation == "XLPO":
+        return "SOLAR"
+    if cores >= 7:
+        return "CTRL"
+    return "LT" if voltage <= 1.1 else ("MV" if voltage < 11 else "HT")
+
+
+def _pick(rng: np.random.Generator, dist: Dict[Any, float], n: int) -> np.ndarray:
+    values = list(dist)
+    p = np.array([dist[v] for v in values], dtype=np.float64)
+    return np.asarray(values, dtype=object)[rng.choice(len(values), size=n, p=p / p.sum())]
+
+
+def synthetic_catalog(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """n SKUs in the DATASHEET_RECORDS schema with realistic spec / price / stock spread."""
+    rng = np.random.default_rng(seed)
+    volts, cores = _pick(rng, VOLTAGES, n), _pick(rng, CORES, n)
+    metals, insul = _pick(rng, MATERIALS, n), _pick(rng, INSULATIONS, n)
+    sizes = rng.choice(SIZES_SQMM, size=n)
+    fr = rng.random(n) < FR_SHARE
+    stock = rng.choice([0, 500, 1000, 2500, 5000, 10000, 50000], size=n)
+
+    records = []
+    for i in range(n):
+        v, c, m, ins, size = float(volts[i]), float(cores[i]), metals[i], insul[i], int(sizes[i])
+        seg = _segment(v, c, ins)
+        # Price grows with voltage, copper, core count and cross-section
+        base = (40.0 + 12.0 * v) * (3.0 if m == "Copper" else 1.0) * (0.5 + c / 4.0) * (size / 95.0) ** 0.8
+        c_label = f"{c:g}"
+        records.append({
+            "SKU_ID": f"{seg}-{'CU' if m == 'Copper' else 'AL'}-{ins}-{c_label}C-{v:g}-{size}{'-FR' if fr[i] else ''}-{i:07d}",
+            "Voltage": v, "Cores": c, "Conductor_Material": m, "Insulation_Type": ins, "FR_Grade": bool(fr[i]),
+            "Base_Price_per_m": round(float(base), 2),
+            "Spec_Description": f"{v:g}kV {c_label}-Core {size} sq.mm {m} {ins} "
+                                f"{'Armoured ' if size >= 50 else ''}{'HT ' if v >= 3.3 else ''}Power Cable"
+                                f"{', Fire Retardant (FR)' if fr[i] else ''}.",
+            "Stock_Available": int(stock[i]),
+        })
+    return records
+
+
+def synthetic_rfps(catalog: Sequence[Dict[str, Any]], n: int, seed: int = 1,
+                   spec_noise: float = DEFAULT_SPEC_NOISE) -> List[str]:
+    """n RFP texts in SAMPLE_RFP_TEXT style, each written against a random catalog SKU."""
+    rng = np.random.default_rng(seed)
+    tests = list(TESTS_PRICING)
+    texts = []
+    for i, target in enumerate(rng.integers(0, len(catalog), size=n)):
+        r = catalog[int(target)]
+        volt, cores, metal = r["Voltage"], r["Cores"], r["Conductor_Material"]
+        insul, fr = r["Insulation_Type"], r["FR_Grade"]
+        if rng.random() < spec_noise:
+            # Ask for a neighbouring spec the target doesn't have
+            field = rng.integers(0, 3)
+            if field == 0:
+                volt = float(rng.choice([v for v in VOLTAGES if v != volt]))
+            elif field == 1:
+                metal = "Copper" if metal == "Aluminum" else "Aluminum"
+            else:
+                fr = not fr
+
+        qty = int(rng.choice([500, 1000, 2000, 5000, 8000, 12000, 30000]))
+        required = [t for t in tests if rng.random() < 0.5] or tests[:1]
+        lines = [
+            f"Request for Proposal (RFP) - ID: BENCH-{i:06d}",
+            "",
+            f"Project: Synthetic Tender {i}",
+            f"Material Required: {_segment(volt, cores, insul)} Power Cables",
+            "",
+            "Technical Specifications:",
+            f"1. Voltage Grade: {volt:g} kV",
+            f"2. Cores: {cores:g} Core",
+            f"3. Conductor: Stranded {metal}",
+            f"4. Insulation: {insul}",
+        ]
+        if fr:
+            lines.append("5. Special Requirement: Must be Fire Retardant (FR) type.")
+        lines += [
+            "",
+            f"Quantity: {qty} meters",
+            f"Delivery: Within {int(rng.integers(2, 16))} weeks",
+            f"Required Tests: {', '.join(required)}.",
+        ]
+        texts.append("\n".join(lines))
+    return texts
+
+
+# --- 2. MEASUREMENT ---
+def _latency_stats(seconds: Sequence[float], items: Optional[int] = None) -> Dict[str, Any]:
+    """p50/p99 per call; per_second counts items (defaults to one per call)."""
+    s = np.asarray(seconds, dtype=np.float64)
+    total = float(s.sum())
+    return {
+        "calls": len(s),
+        "per_second": round((len(s) if items is None else items) / total, 1) if total else None,
+        "p50_ms": round(1000.0 * float(np.percentile(s, 50)), 4),
+        "p99_ms": round(1000.0 * float(np.percentile(s, 99)), 4),
+    }
+
+
+def _time_each(fn: Callable[[Any], Any], items: Sequence[Any]) -> List[float]:
+    times = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def bench_catalog(records: List[Dict[str, Any]], rfp_texts: List[str], mode: str,
+                  index_dir: Optional[str] = None, k: int = 10, top_k: int = 3,
+                  batch_size: int = 64) -> Dict[str, Any]:
+    """Every stage for one catalog under one index mode."""
+    import faiss
+    from agents import SalesAgent, TechnicalAgent, PricingAgent
+    from engine import MatchingEngine
+    from lexical_index import spec_query
+
+    start = time.perf_counter()
+    engine = MatchingEngine(records, index_mode=mode, index_dir=index_dir, cache_size=0).ensure_loaded()
+    build_seconds = time.perf_counter() - start
+
+    sales, tech, pricing = SalesAgent(), TechnicalAgent(engine), PricingAgent()
+    tech.search(sales.parse_rfp(rfp_texts[0]))  # Warm-up (thread pools, lazy init)
+
+    specs = [sales.parse_rfp(t) for t in rfp_texts]
+    stages = {"parse": _latency_stats(_time_each(sales.parse_rfp, rfp_texts))}
+
+    matches = []
+    stages["search"] = _latency_stats(_time_each(lambda s: matches.append(tech.search(s, top_k=top_k)), specs))
+    batches = [specs[i:i + batch_size] for i in range(0, len(specs), batch_size)]
+    stages["search_batch"] = _latency_stats(_time_each(lambda b: tech.search_batch(b, top_k=top_k), batches),
+                                            items=len(specs))
+    stages["score"] = _latency_stats(_time_each(tech.score_catalog, specs))
+    lexical = engine.snapshot().lexical
+    stages["lexical"] = _latency_stats(_time_each(lambda s: lexical.score(spec_query(s)), specs))
+    stages["price"] = _latency_stats(_time_each(
+        lambda i: pricing.price_tests_and_consolidate(matches[i], ["Routine Test", "Type Test"], specs[i]["Quantity_m"]),
+        range(len(specs))))
+
+    # Quality 1: did rank-1 reach the best Spec_Match_% anywhere in the catalog?
+    best = [float(tech.score_catalog(s).max()) for s in specs]
+    hits = [bool(m) and m[0]["Spec_Match_%"] >= b - 1e-6 for m, b in zip(matches, best)]
+
+    # Quality 2: ANN neighbours vs exact search over the same embeddings
+    snap = engine.snapshot()
+    queries = engine.query_embeddings([("bench", i) for i in range(len(specs))],
+                                      [tech._rfp_to_query_text(s) for s in specs])
+    k = min(k, len(records))
+    exact = faiss.IndexFlatL2(snap.embeddings.shape[1])
+    exact.add(np.ascontiguousarray(snap.embeddings, dtype="float32"))
+    _, truth = exact.search(queries, k)
+    _, found = engine.vector_search(queries, k, snapshot=snap)
+    recall = sum(len(np.intersect1d(f, t)) for f, t in zip(found, truth)) / float(k * len(specs))
+
+    return {
+        "catalog_size": len(records),
+        "index_mode": mode,
+        "rfps": len(rfp_texts),
+        "build_seconds": round(build_seconds, 3),
+        "stages": stages,
+        "best_match_rate": round(float(np.mean(hits)), 4),
+        "lexical_fast_path_rate": engine.lexical_stats()["rate"],
+        f"vector_recall@{k}": round(recall, 4),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_suite(sizes: Sequence[int] = DEFAULT_SIZES, modes: Sequence[str] = DEFAULT_MODES,
+              n_rfps: int = 200, seed: int = 0, spec_noise: float = DEFAULT_SPEC_NOISE) -> Dict[str, Any]:
+    from setup_data import DEFAULT_ENCODER_BACKEND, EMBEDDING_MODEL_NAME
+
+    runs = []
+    for size in sizes:
+        records = synthetic_catalog(size, seed=seed)
+        rfp_texts = synthetic_rfps(records, n_rfps, seed=seed + 1, spec_noise=spec_noise)
+        with tempfile.TemporaryDirectory(prefix="stratabid-bench-") as index_dir:
+            for mode in modes:
+                row = bench_catalog(records, rfp_texts, mode, index_dir=index_dir)
+                runs.append(row)
+                print(f"✅ {size:>8} SKUs  {mode:<8} search p50 {row['stages']['search']['p50_ms']} ms, "
+                      f"best match {row['best_match_rate']:.1%}, lexical fast path {row['lexical_fast_path_rate']:.1%}", file=sys.stderr)
+
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "model": EMBEDDING_MODEL_NAME,
+            "encoder": DEFAULT_ENCODER_BACKEND,
+            "seed": seed,
+            "rfps": n_rfps,
+            "spec_noise": spec_noise,
+        },
+        "runs": runs,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """Regressions of current vs baseline: slower p50 per stage, or a lower best_match_rate."""
+    old = {(r["catalog_size"], r["index_mode"]): r for r in baseline["runs"]}
+    problems = []
+    for run in current["runs"]:
+        key = (run["catalog_size"], run["index_mode"])
+        prev = old.get(key)
+        if prev is None:
+            continue
+        for stage, stats in run["stages"].items():
+            before = prev["stages"].get(stage, {}).get("p50_ms")
+            if before and stats["p50_ms"] > max(before * (1.0 + tolerance), before + MIN_DELTA_MS):
+                problems.append(f"{key[0]} SKUs/{key[1]} {stage}: p50 {before} -> {stats['p50_ms']} ms")
+        if run["best_match_rate"] < prev["best_match_rate"]:
+            problems.append(f"{key[0]} SKUs/{key[1]} best_match_rate {prev['best_match_rate']} -> {run['best_match_rate']}")
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthetic end-to-end benchmark (throughput, p50/p99, recall).")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Catalog sizes, e.g. 1000,100000,1000000")
+    parser.add_argument("--modes", default=",".join(DEFAULT_MODES), help="Index modes (see ann_index.INDEX_MODES)")
+    parser.add_argument("--rfps", type=int, default=200, help="Synthetic RFPs per catalog")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--spec-noise", type=float, default=DEFAULT_SPEC_NOISE)
+    parser.add_argument("-o", "--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier run; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    results = run_suite([int(s) for s in args.sizes.split(",")], args.modes.split(","),
+                        n_rfps=args.rfps, seed=args.seed, spec_noise=args.spec_noise)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"📄 Results written to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        for p in problems:
+            print(f"❌ {p}", file=sys.stderr)
+        if problems:
+            sys.exit(1)
+        print("✅ No regressions against baseline", file=sys.stderr)
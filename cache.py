@@ -0,0 +1,95 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Hashable, Iterable, Optional, Tuple
+
+# ==========================================
+# BOUNDED LRU CACHE WITH TTL
+# ==========================================
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache. Entries expire ttl_seconds after being stored
+    (None = never); the least recently used entry is evicted once maxsize is hit.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl_seconds: Optional[float] = 3600.0):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drops every entry (counters are kept so hit rates survive invalidation)."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+def canonical_spec_key(rfp_spec: Dict[str, Any], fields: Iterable[str]) -> Tuple:
+    """
+    Hashable, normalized form of a parsed spec: fixed field order, strings
+    stripped + lowercased, numbers as floats. "Copper"/"copper " and 4/4.0
+    therefore share one cache entry.
+    """
+    key = []
+    for field in fields:
+        value = rfp_spec.get(field)
+        if isinstance(value, str):
+            value = value.strip().lower()
+        elif isinstance(value, bool):
+            pass  # bool is an int subclass; keep it distinct from 0/1
+        elif isinstance(value, (int, float)):
+            value = float(value)
+        key.append((field, value))
+    return tuple(key)
@@ -0,0 +1,598 @@
+import numpy as np
+from collections.abc import Mapping, Sequence
+from multiprocessing import shared_memory
+from typing import Dict, Any, Iterable, List, NamedTuple, Optional, Tuple
+
+# ==========================================
+# COLUMNAR CATALOG + VECTORIZED SPEC SCORING
+# ==========================================
+
+# --- SPEC MATCH WEIGHTS (w_i) ---
+# Shared by TechnicalAgent.calculate_spec_match and CatalogColumns.score_all.
+# Adjust these to change business priority
+SPEC_MATCH_WEIGHTS = {
+    "Voltage": 35.0,        # Critical safety param
+    "Material": 30.0,       # Critical cost param
+    "Cores": 20.0,          # Functional param
+    "Insulation": 10.0,     # Standard param
+    "Fire_Retardant": 5.0   # Feature param
+}
+
+# Fields that define a cable spec (what matching/scoring looks at; quantity is not one)
+SPEC_FIELDS = ("Voltage", "Cores", "Conductor_Material", "Insulation_Type", "Fire_Retardant")
+
+# Same "infinite if missing" default the Decision Agent uses
+DEFAULT_STOCK = 999999
+
+
+# ==========================================
+# IMMUTABLE COLUMNAR CATALOG
+# ==========================================
+# Replaces the pandas DataFrame + list-of-dicts: every field is one read-only
+# NumPy array (strings as int32 codes into an interned vocabulary), rows are
+# two-slot views that decode values on access, and take() selects rows by
+# index array without copying any column. Because the whole catalog is plain
+# arrays it can live in ONE shared-memory block that worker processes attach
+# to instead of each building its own copy.
+
+_MISSING = object()
+
+
+class _StringTable:
+    """Interned strings as one UTF-8 blob + offsets (shareable, no Python objects)."""
+
+    __slots__ = ("blob", "offsets")
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob, self.offsets = blob, offsets
+
+    @classmethod
+    def from_strings(cls, strings: List[str]) -> "_StringTable":
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, code: int) -> str:
+        return self.blob[self.offsets[code]:self.offsets[code + 1]].tobytes().decode("utf-8")
+
+    def tolist(self) -> List[str]:
+        return [self[c] for c in range(len(self))]
+
+    def concat(self, other: "_StringTable") -> "_StringTable":
+        """other's codes shift by len(self); nothing is decoded."""
+        offsets = np.concatenate([self.offsets, other.offsets[1:] + self.offsets[-1]])
+        return _StringTable(np.concatenate([self.blob, other.blob]), offsets)
+
+
+class _Column:
+    """
+    One catalog field. kind is bool/int/float/str/object; present is None when
+    every row has the field (rows missing it behave like a missing dict key).
+    """
+
+    __slots__ = ("kind", "data", "present", "vocab")
+
+    def __init__(self, kind: str, data, present: Optional[np.ndarray], vocab: Optional[_StringTable]):
+        self.kind, self.data, self.present, self.vocab = kind, data, present, vocab
+
+    @classmethod
+    def build(cls, values: List[Any]) -> "_Column":
+        present = np.array([v is not _MISSING for v in values], dtype=bool)
+        found = [v for v in values if v is not _MISSING]
+        types = {type(v) for v in found}
+
+        if types <= {str}:
+            codes, vocab = _intern([v if v is not _MISSING else "" for v in values])
+            kind, data, vocab = "str", codes, _StringTable.from_strings(vocab)
+        elif types <= {bool}:
+            kind, data, vocab = "bool", np.array([bool(v) if v is not _MISSING else False for v in values]), None
+        elif types <= {int}:
+            kind, data, vocab = "int", np.array([v if v is not _MISSING else 0 for v in values], dtype=np.int64), None
+        elif types <= {int, float}:
+            kind, data, vocab = "float", np.array([v if v is not _MISSING else 0.0 for v in values], dtype=np.float64), None
+        else:
+            # Mixed/other types stay Python objects (kept per process, not shared)
+            kind, data, vocab = "object", tuple(None if v is _MISSING else v for v in values), None
+
+        if isinstance(data, np.ndarray):
+            data.flags.writeable = False
+        if present.all():
+            present = None
+        else:
+            present.flags.writeable = False
+        return cls(kind, data, present, vocab)
+
+    @classmethod
+    def absent(cls, n: int, like: "_Column") -> "_Column":
+        """n rows that don't have the field (typed like `like` so concat stays columnar)."""
+        present = np.zeros(n, dtype=bool)
+        if like.kind == "object":
+            return cls("object", (None,) * n, present, None)
+        if like.kind == "str":
+            return cls("str", np.zeros(n, dtype=np.int32), present, _StringTable.from_strings([""]))
+        return cls(like.kind, np.zeros(n, dtype=like.data.dtype), present, None)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def _python_values(self) -> List[Any]:
+        return [self.value(r) if self.has(r) else _MISSING for r in range(len(self))]
+
+    def _present_or_ones(self) -> np.ndarray:
+        return np.ones(len(self), dtype=bool) if self.present is None else self.present
+
+    def concat(self, other: "_Column") -> "_Column":
+        """Rows of self followed by rows of other."""
+        kinds = {self.kind, other.kind}
+        if len(kinds) == 1 and self.kind != "object" or kinds == {"int", "float"}:
+            if self.kind == "str":
+                data = np.concatenate([self.data, other.data + len(self.vocab)]).astype(np.int32)
+                vocab = self.vocab.concat(other.vocab)
+            else:
+                data, vocab = np.concatenate([self.data, other.data]), None
+            present = np.concatenate([self._present_or_ones(), other._present_or_ones()])
+            return _Column(self.kind if len(kinds) == 1 else "float", data, present, vocab)._frozen()
+        # Kinds disagree (e.g. text arriving in a numeric field): rebuild from values
+        return _Column.build(self._python_values() + other._python_values())
+
+    def gather(self, rows: np.ndarray) -> "_Column":
+        """New column holding rows[i] at position i (vocabulary is shared)."""
+        if self.kind == "object":
+            data = tuple(self.data[r] for r in rows)
+        else:
+            data = self.data[rows]
+        present = None if self.present is None else self.present[rows]
+        return _Column(self.kind, data, present, self.vocab)._frozen()
+
+    def _frozen(self) -> "_Column":
+        if isinstance(self.data, np.ndarray):
+            self.data.flags.writeable = False
+        if self.present is not None:
+            if self.present.all():
+                self.present = None
+            else:
+                self.present.flags.writeable = False
+        return self
+
+    def has(self, row: int) -> bool:
+        return self.present is None or bool(self.present[row])
+
+    def value(self, row: int):
+        if self.kind == "str":
+            return self.vocab[self.data[row]]
+        if self.kind == "object":
+            return self.data[row]
+        return self.data[row].item()  # NumPy scalar -> Python bool/int/float
+
+
+
+class SKURecord(Mapping):
+    """
+    Read-only dict-like view of one catalog row. Holds only (columns, row),
+    so creating one per search hit allocates almost nothing.
+    """
+
+    __slots__ = ("_columns", "_row")
+
+    def __init__(self, columns: Dict[str, _Column], row: int):
+        self._columns = columns
+        self._row = row
+
+    @property
+    def row(self) -> int:
+        """Row number in the full catalog (aligned with the FAISS ids)."""
+        return self._row
+
+    def __getitem__(self, key):
+        col = self._columns.get(key)
+        if col is None or not col.has(self._row):
+            raise KeyError(key)
+        return col.value(self._row)
+
+    def __iter__(self):
+        return (name for name, col in self._columns.items() if col.has(self._row))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: self[key] for key in self}
+
+    def __repr__(self) -> str:
+        return f"SKURecord({self.to_dict()!r})"
+
+
+class SharedCatalogHandle(NamedTuple):
+    """Picklable pointer to a catalog in shared memory (see Catalog.share / Catalog.attach)."""
+    shm_name: str
+    n_rows: int
+    layout: Tuple  # (field, kind, part, dtype, shape, byte offset)
+    objects: Dict[str, tuple]  # "object" columns travel by pickle
+
+
+class Catalog(Sequence):
+    """
+    Immutable, array-backed SKU catalog. Behaves like the old records list:
+    len(), catalog[i] -> SKURecord, iteration; catalog[idx_array] or
+    take(idx) gives a sub-catalog that shares every column (zero-copy).
+    """
+
+    def __init__(self, records_list: Iterable[Dict[str, Any]] = (), _columns=None, _rows=None,
+                 _n_base: int = 0, _shm=None):
+        if _columns is None:
+            records_list = list(records_list)
+            names = list(dict.fromkeys(k for r in records_list for k in r))
+            _columns = {name: _Column.build([r.get(name, _MISSING) for r in records_list]) for name in names}
+            _n_base = len(records_list)
+        self._columns = _columns
+        self._rows = _rows      # None = every base row, else int64 base-row index array
+        self._n_base = _n_base
+        self._shm = _shm        # Keeps an attached/owned shared-memory block alive
+
+    # --- SEQUENCE / RECORDS-LIST INTERFACE ---
+    def __len__(self) -> int:
+        return self._n_base if self._rows is None else len(self._rows)
+
+    def _base_row(self, i: int) -> int:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return i if self._rows is None else int(self._rows[i])
+
+    def __getitem__(self, i):
+        if isinstance(i, (int, np.integer)):
+            return SKURecord(self._columns, self._base_row(int(i)))
+        return self.take(i)
+
+    def __iter__(self):
+        rows = range(self._n_base) if self._rows is None else self._rows.tolist()
+        return (SKURecord(self._columns, r) for r in rows)
+
+    def take(self, idx) -> "Catalog":
+        """Sub-catalog of the given rows; columns are shared, only the row index is new."""
+        base = np.arange(self._n_base) if self._rows is None else self._rows
+        rows = base[idx]
+        rows = np.atleast_1d(np.asarray(rows, dtype=np.int64))
+        rows.flags.writeable = False
+        return Catalog(_columns=self._columns, _rows=rows, _n_base=self._n_base, _shm=self._shm)
+
+    # --- COPY-ON-WRITE UPDATES (return a new catalog; this one never changes) ---
+    def _require_full(self):
+        if self._rows is not None:
+            raise ValueError("updates need a full catalog; materialize() a sub-catalog first")
+
+    def extend(self, records_list: Iterable[Dict[str, Any]]) -> "Catalog":
+        """New catalog with records_list appended as rows len(self)... (columnar concat)."""
+        self._require_full()
+        new = Catalog(records_list)
+        columns = {}
+        for name in dict.fromkeys(list(self._columns) + list(new._columns)):
+            old_col, new_col = self._columns.get(name), new._columns.get(name)
+            if old_col is None:
+                old_col = _Column.absent(self._n_base, new_col)
+            if new_col is None:
+                new_col = _Column.absent(new._n_base, old_col)
+            columns[name] = old_col.concat(new_col)
+        return Catalog(_columns=columns, _n_base=self._n_base + new._n_base)
+
+    def replace_values(self, field: str, rows: Iterable[int], values: Iterable[Any]) -> "Catalog":
+        """New catalog where field[rows[i]] = values[i]; only that one column is copied."""
+        self._require_full()
+        rows = np.asarray(list(rows), dtype=np.int64)
+        values = list(values)
+        old_col = self._columns.get(field)
+        if old_col is not None and all(v is _MISSING for v in values):
+            patch = _Column.absent(len(values), old_col)  # Stays columnar
+        else:
+            patch = _Column.build(values)
+        if old_col is None:
+            old_col = _Column.absent(self._n_base, patch)
+
+        gather = np.arange(self._n_base, dtype=np.int64)
+        gather[rows] = self._n_base + np.arange(len(rows), dtype=np.int64)
+        columns = dict(self._columns)
+        columns[field] = old_col.concat(patch).gather(gather)
+        return Catalog(_columns=columns, _n_base=self._n_base)
+
+    def replace_rows(self, rows: List[int], records_list: List[Dict[str, Any]]) -> "Catalog":
+        """New catalog where each rows[i] becomes records_list[i] (fields it lacks become missing)."""
+        catalog = self
+        names = dict.fromkeys(list(self._columns) + [k for r in records_list for k in r])
+        for name in names:
+            catalog = catalog.replace_values(name, rows, [r.get(name, _MISSING) for r in records_list])
+        return catalog
+
+    def owns(self, record) -> bool:
+        """True when record is a row view of this catalog's columns."""
+        return isinstance(record, SKURecord) and record._columns is self._columns
+
+    # --- COLUMN ACCESS ---
+    @property
+    def field_names(self) -> List[str]:
+        return list(self._columns)
+
+    def _select(self, arr):
+        return arr if self._rows is None else arr[self._rows]
+
+    def numeric(self, name: str, default, dtype=np.float64) -> np.ndarray:
+        """Field as a typed array for the selected rows; missing rows get default."""
+        col = self._columns.get(name)
+        if col is None:
+            return np.full(len(self), default, dtype=dtype)
+        if col.kind in ("str", "object"):
+            values = [col.value(r) if col.has(r) else default for r in self._base_rows()]
+            return np.array(values, dtype=dtype)
+        out = self._select(col.data).astype(dtype)
+        if col.present is not None:
+            out[~self._select(col.present)] = default
+        return out
+
+    def codes(self, name: str, default: str = "") -> Tuple[np.ndarray, List[str]]:
+        """(int32 code per selected row, vocabulary) of a text field; missing rows get default."""
+        col = self._columns.get(name)
+        if col is None:
+            return np.zeros(len(self), dtype=np.int32), [default]
+        if col.kind != "str":
+            return _intern([str(col.value(r)) if col.has(r) else default for r in self._base_rows()])
+        vocab = col.vocab.tolist()
+        codes = self._select(col.data)
+        if col.present is not None:
+            missing = ~self._select(col.present)
+            if missing.any():
+                codes = np.where(missing, len(vocab), codes).astype(np.int32)
+                vocab.append(default)
+        return codes, vocab
+
+    def values(self, name: str, rows: Iterable[int]) -> List[Any]:
+        """Python values of one field for the given catalog rows (None where missing)."""
+        col = self._columns.get(name)
+        if col is None:
+            return [None for _ in rows]
+        return [col.value(r) if col.has(r) else None for r in rows]
+
+    def _base_rows(self) -> List[int]:
+        return list(range(self._n_base)) if self._rows is None else self._rows.tolist()
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        return [r.to_dict() for r in self]
+
+    def to_frame(self):
+        import pandas as pd
+        return pd.DataFrame(self.to_records())
+
+    # --- SHARED MEMORY ---
+    def share(self) -> SharedCatalogHandle:
+        """
+        Copies every array column into one shared-memory block and returns a
+        handle to pass to worker processes (Catalog.attach). This catalog owns
+        the block: call unlink() once the workers are done.
+        """
+        if self._rows is not None:
+            raise ValueError("share() needs a full catalog; materialize() a sub-catalog first")
+
+        parts = []
+        for name, col in self._columns.items():
+            if col.kind != "object":
+                parts.append((name, col.kind, "data", col.data))
+            if col.present is not None:
+                parts.append((name, col.kind, "present", col.present))
+            if col.vocab is not None:
+                parts.append((name, col.kind, "blob", col.vocab.blob))
+                parts.append((name, col.kind, "offsets", col.vocab.offsets))
+
+        layout, offset = [], 0
+        for name, kind, part, arr in parts:
+            offset = (offset + 63) // 64 * 64  # Cache-line aligned
+            layout.append((name, kind, part, arr.dtype.str, arr.shape, offset))
+            offset += arr.nbytes
+
+        shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for (name, kind, part, dtype, shape, start), (_, _, _, arr) in zip(layout, parts):
+            np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=start)[...] = arr
+
+        self._shm = shm
+        objects = {name: col.data for name, col in self._columns.items() if col.kind == "object"}
+        return SharedCatalogHandle(shm.name, self._n_base, tuple(layout), objects)
+
+    def materialize(self) -> "Catalog":
+        """Copy of the selected rows as a standalone catalog."""
+        return Catalog(self.to_records())
+
+    @classmethod
+    def attach(cls, handle: SharedCatalogHandle) -> "Catalog":
+        """Read-only catalog over the shared block created by share() (no copy)."""
+        shm = shared_memory.SharedMemory(name=handle.shm_name)
+        arrays, kinds = {}, {}
+        for name, kind, part, dtype, shape, start in handle.layout:
+            arr = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=start)
+            arr.flags.writeable = False
+            arrays.setdefault(name, {})[part] = arr
+            kinds[name] = kind
+
+        columns = {}
+        for name in list(dict.fromkeys([l[0] for l in handle.layout] + list(handle.objects))):
+            got = arrays.get(name, {})
+            if name in handle.objects:
+                kind, data = "object", handle.objects[name]
+            else:
+                kind, data = kinds[name], got["data"]
+            vocab = _StringTable(got["blob"], got["offsets"]) if "blob" in got else None
+            columns[name] = _Column(kind, data, got.get("present"), vocab)
+        return cls(_columns=columns, _n_base=handle.n_rows, _shm=shm)
+
+    def close(self):
+        """Detaches from the shared block (views into it must not be used afterwards)."""
+        if self._shm is not None:
+            self._shm.close()
+
+    def unlink(self):
+        """Frees the shared block; only the process that called share() should do this."""
+        if self._shm is not None:
+            self._shm.unlink()
+
+
+def _intern(values: List[str]):
+    """Maps strings to small int codes. Returns (codes, vocabulary)."""
+    vocab, codes = {}, np.empty(len(values), dtype=np.int32)
+    for i, v in enumerate(values):
+        codes[i] = vocab.setdefault(v, len(vocab))
+    return codes, list(vocab)
+
+
+def _lowered(codes: np.ndarray, vocab: List[str]):
+    """Re-interns a code/vocab pair case-insensitively (one pass over the vocabulary, not the rows)."""
+    lowered_codes, lowered = _intern([v.lower() for v in vocab])
+    return lowered_codes[codes], lowered
+
+
+def _round1(x: np.ndarray) -> np.ndarray:
+    """round(x, 1) with Python's exact semantics, vectorized."""
+    out = np.round(x, 1)
+    # np.round scales by 10 first, which can flip values sitting on a .x5 boundary.
+    # Those are rare, so only they go through Python's correctly-rounded round().
+    scaled = x * 10.0
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    flat_x, flat_out = x.reshape(-1), out.reshape(-1)
+    for i in np.flatnonzero(near_tie):
+        flat_out[i] = round(float(flat_x[i]), 1)
+    return out
+
+
+class CatalogColumns:
+    """
+    Typed NumPy view of the SKU catalog: one array per spec field.
+    Materials/insulations are lowercased and interned, so categorical
+    checks run once per distinct value instead of once per SKU.
+    """
+
+    def __init__(self, records_list):
+        catalog = records_list if isinstance(records_list, Catalog) else Catalog(records_list)
+        self.sku_ids = np.array(catalog.values("SKU_ID", catalog._base_rows()), dtype=object)
+
+        self.voltage = catalog.numeric("Voltage", 1.1)
+        self.cores = catalog.numeric("Cores", 3)
+        self.fr = catalog.numeric("FR_Grade", False, dtype=bool)
+
+        self.material_codes, self.materials = _lowered(*catalog.codes("Conductor_Material"))
+        self.insulation_codes, self.insulations = _lowered(*catalog.codes("Insulation_Type"))
+
+        self.price = catalog.numeric("Base_Price_per_m", 0)
+        self.stock = catalog.numeric("Stock_Available", DEFAULT_STOCK, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.sku_ids)
+
+    def score_all(self, rfp_spec: Dict[str, Any]) -> np.ndarray:
+        """
+        Spec_Match_% for every SKU in one pass. Same formula and rounding as
+        TechnicalAgent.calculate_spec_match:
+        Score = 100 * (Sum(w_i * score_i) / Sum(w_i))
+        """
+        return self.score_many([rfp_spec])[0]
+
+    def score_many(self, rfp_specs: List[Dict[str, Any]]) -> np.ndarray:
+        """Spec_Match_% matrix of shape (len(rfp_specs), len(catalog)), one broadcast pass."""
+        w = SPEC_MATCH_WEIGHTS
+        n_specs = len(rfp_specs)
+
+        # A. Voltage: 1.0 when SKU >= RFP, otherwise proportional credit
+        r_volt = np.array([float(r.get("Voltage", 1.1)) for r in rfp_specs], dtype=np.float64)[:, None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            s_volt = np.where(self.voltage >= r_volt, 1.0, self.voltage / r_volt)
+
+        # B. Material: strict, substring either way (evaluated per distinct material)
+        table = np.zeros((n_specs, len(self.materials)), dtype=np.float64)
+        for row, spec in enumerate(rfp_specs):
+            raw_rmat = spec.get("Conductor_Material")
+            if not raw_rmat:
+                continue  # SAFETY CATCH: parser couldn't find material -> 0.0
+            r_mat = str(raw_rmat).lower()
+            table[row] = [1.0 if (r_mat in m or m in r_mat) else 0.0 for m in self.materials]
+        s_mat = table[:, self.material_codes]
+
+        # C. Cores: exact 1.0, more cores 0.5, fewer 0.0
+        r_core = np.array([float(r.get("Cores", 3)) for r in rfp_specs], dtype=np.float64)[:, None]
+        s_core = np.where(self.cores == r_core, 1.0, np.where(self.cores > r_core, 0.5, 0.0))
+
+        # D. Insulation: loose substring
+        table = np.zeros((n_specs, len(self.insulations)), dtype=np.float64)
+        for row, spec in enumerate(rfp_specs):
+            r_ins = str(spec.get("Insulation_Type", "XLPE")).lower()
+            table[row] = [1.0 if r_ins in ins else 0.0 for ins in self.insulations]
+        s_ins = table[:, self.insulation_codes]
+
+        # E. Fire retardant: only fails when requested and missing
+        wants_fr = np.array([bool(r.get("Fire_Retardant", False)) for r in rfp_specs], dtype=bool)[:, None]
+        s_fr = np.where(wants_fr & ~self.fr, 0.0, 1.0)
+
+        # Same accumulation order as the scalar version so results are bit-identical
+        weighted_sum = (
+            w["Voltage"] * s_volt
+            + w["Material"] * s_mat
+            + w["Cores"] * s_core
+            + w["Insulation"] * s_ins
+            + w["Fire_Retardant"] * s_fr
+        )
+        total_weight = sum(w.values())
+
+        return _round1((weighted_sum / total_weight) * 100.0)
+
+
+class ConstraintIndex:
+    """
+    Inverted/bitmap index over the hard spec constraints.
+    Gives the set of spec-feasible SKUs (right material, insulation, FR,
+    enough voltage and cores) so the vector search only ranks those.
+    """
+
+    def __init__(self, columns: CatalogColumns):
+        self.columns = columns
+
+        # One bitmap per distinct category value
+        self._material_masks = [columns.material_codes == c for c in range(len(columns.materials))]
+        self._insulation_masks = [columns.insulation_codes == c for c in range(len(columns.insulations))]
+
+        # Sorted copies turn ">= threshold" into a binary search + slice
+        self._volt_order = np.argsort(columns.voltage, kind="stable")
+        self._volt_sorted = columns.voltage[self._volt_order]
+        self._core_order = np.argsort(columns.cores, kind="stable")
+        self._core_sorted = columns.cores[self._core_order]
+
+    def _at_least(self, order, sorted_vals, threshold) -> np.ndarray:
+        mask = np.zeros(len(self.columns), dtype=bool)
+        mask[order[np.searchsorted(sorted_vals, threshold, side="left"):]] = True
+        return mask
+
+    def _any_of(self, masks, vocab, matches) -> np.ndarray:
+        mask = np.zeros(len(self.columns), dtype=bool)
+        for code, value in enumerate(vocab):
+            if matches(value):
+                mask |= masks[code]
+        return mask
+
+    def mask(self, rfp_spec: Dict[str, Any]) -> np.ndarray:
+        """Boolean mask (row-aligned with the catalog) of SKUs meeting every hard constraint."""
+        # Material: unknown material can't be guaranteed, so nothing is feasible
+        raw_rmat = rfp_spec.get("Conductor_Material")
+        if not raw_rmat:
+            return np.zeros(len(self.columns), dtype=bool)
+        r_mat = str(raw_rmat).lower()
+        mask = self._any_of(self._material_masks, self.columns.materials, lambda m: r_mat in m or m in r_mat)
+
+        r_ins = str(rfp_spec.get("Insulation_Type", "XLPE")).lower()
+        mask &= self._any_of(self._insulation_masks, self.columns.insulations, lambda ins: r_ins in ins)
+
+        if rfp_spec.get("Fire_Retardant", False):
+            mask &= self.columns.fr
+
+        mask &= self._at_least(self._volt_order, self._volt_sorted, float(rfp_spec.get("Voltage", 1.1)))
+        mask &= self._at_least(self._core_order, self._core_sorted, float(rfp_spec.get("Cores", 3)))
+        return mask
+
+    def feasible_ids(self, rfp_spec: Dict[str, Any]) -> np.ndarray:
+        return np.flatnonzero(self.mask(rfp_spec))
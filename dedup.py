@@ -0,0 +1,174 @@
+import re
+import json
+import zlib
+import hashlib
+import threading
+import numpy as np
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
+
+# ==========================================
+# NEAR-DUPLICATE TENDER DETECTION (MinHash + LSH)
+# ==========================================
+# Portals re-issue the same tender with a corrigendum or light edits. Every
+# processed RFP text is fingerprinted with a MinHash signature (word 3-shingles),
+# and the signature is split into LSH bands, so a lookup touches only the
+# tenders that share at least one band bucket - not the whole history.
+# Candidates are then verified on estimated Jaccard similarity.
+#
+# A near-duplicate hands its per-line-item results to the pipeline: an item
+# whose fingerprint (its BOQ row + the tender-wide clauses, see
+# SalesAgent.line_item_fingerprints) is unchanged keeps its parsed spec and
+# matches; only edited or new items are parsed and searched again. Pricing and
+# the stock decision always re-run: they are one array pass / one ledger call,
+# and quantities and stock may have moved since.
+#
+# Matches depend on the catalog, so every entry carries the catalog digest it
+# was computed against and entries from another catalog are never reused.
+
+NUM_PERM = 128
+LSH_BANDS = 16          # 16 bands x 8 rows: ~95% chance to surface a 0.8-similar text, ~24% at 0.6
+SHINGLE_WORDS = 3
+
+# Estimated Jaccard at or above this counts as a re-issue of the same tender
+DEFAULT_DUP_THRESHOLD = 0.8
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_TOKEN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+
+def _shingles(text: str, k: int = SHINGLE_WORDS) -> np.ndarray:
+    tokens = _TOKEN.findall(text.lower())
+    if len(tokens) < k:
+        tokens = tokens + [""] * (k - len(tokens))
+    grams = {" ".join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) & _MERSENNE_PRIME for g in grams),
+                       dtype=np.int64, count=len(grams))
+
+
+class MinHasher:
+    """NUM_PERM universal hashes (a*x + b) mod p, minimised over a text's shingles (vectorised)."""
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, _MERSENNE_PRIME, size=num_perm, dtype=np.int64)
+        self.b = rng.integers(0, _MERSENNE_PRIME, size=num_perm, dtype=np.int64)
+
+    def signature(self, text: str) -> np.ndarray:
+        x = _shingles(text)
+        # a < 2^31 and x < 2^31, so a*x + b stays inside int64
+        return ((np.outer(x, self.a) + self.b) % _MERSENNE_PRIME).min(axis=0).astype(np.uint32)
+
+
+def similarity(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two texts from their signatures."""
+    return float(np.mean(sig_a == sig_b))
+
+
+def catalog_digest(catalog) -> str:
+    """Fingerprint of everything matching reads (ids, specs, descriptions); prices and stock don't count."""
+    h = hashlib.sha256()
+    for name in ("SKU_ID", "Spec_Description", "Conductor_Material", "Insulation_Type"):
+        codes, vocab = catalog.codes(name)
+        h.update(json.dumps(vocab).encode("utf-8"))
+        h.update(codes.tobytes())
+    for name in ("Voltage", "Cores", "FR_Grade"):
+        h.update(catalog.numeric(name, np.nan).tobytes())
+    return h.hexdigest()[:16]
+
+
+class Duplicate(NamedTuple):
+    rfp_id: str
+    similarity: float
+    items: Dict[str, Dict[str, Any]]   # Line-item fingerprint -> {"spec", "matches"}
+
+
+class TenderDeduper:
+    """Sub-linear lookup of previously processed tenders by text similarity (thread-safe)."""
+
+    def __init__(self, threshold: float = DEFAULT_DUP_THRESHOLD, catalog: Optional[str] = None,
+                 num_perm: int = NUM_PERM, bands: int = LSH_BANDS):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.catalog = catalog          # catalog_digest() the stored matches belong to
+        self.bands = bands
+        self.hasher = MinHasher(num_perm)
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        # Slot -> (rfp_id, signature, items); None once that tender was re-added under the same id
+        self._entries: List[Optional[Tuple[str, np.ndarray, Dict[str, Dict[str, Any]]]]] = []
+        self._slot_of: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        self.lookups = 0
+        self.hits = 0
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def _band_keys(self, sig: np.ndarray) -> List[bytes]:
+        return [band.tobytes() for band in np.split(sig, self.bands)]
+
+    def add(self, rfp_id: str, text: str, items: Dict[str, Dict[str, Any]], signature: Optional[np.ndarray] = None):
+        """Remembers a processed tender and its reusable line items (replaces an earlier one with the same id)."""
+        sig = self.hasher.signature(text) if signature is None else signature
+        with self._lock:
+            old = self._slot_of.get(rfp_id)
+            if old is not None:
+                self._entries[old] = None  # Its bucket entries are skipped from now on
+            slot = self._slot_of[rfp_id] = len(self._entries)
+            self._entries.append((rfp_id, sig, items))
+            for table, key in zip(self._buckets, self._band_keys(sig)):
+                table.setdefault(key, []).append(slot)
+
+    def lookup(self, text: str, signature: Optional[np.ndarray] = None) -> Optional[Duplicate]:
+        """The most similar earlier tender at or above the threshold, if any."""
+        sig = self.hasher.signature(text) if signature is None else signature
+        with self._lock:
+            self.lookups += 1
+            candidates = set()
+            for table, key in zip(self._buckets, self._band_keys(sig)):
+                candidates.update(table.get(key, ()))
+            best, best_sim = None, self.threshold
+            for slot in candidates:
+                if self._entries[slot] is None:
+                    continue
+                sim = similarity(sig, self._entries[slot][1])
+                if sim >= best_sim:
+                    best, best_sim = slot, sim
+            if best is None:
+                return None
+            self.hits += 1
+            rfp_id, _, items = self._entries[best]
+            return Duplicate(rfp_id, round(best_sim, 4), items)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"tenders": len(self), "lookups": self.lookups, "near_duplicates": self.hits}
+
+    # --- PERSISTENCE (JSON lines; one tender per line) ---
+    def save(self, path: str):
+        with self._lock, open(path, "w", encoding="utf-8") as f:
+            for rfp_id, sig, items in filter(None, self._entries):
+                f.write(json.dumps({"rfp_id": rfp_id, "catalog": self.catalog,
+                                    "signature": sig.tolist(), "items": items}, default=str) + "\n")
+
+    def load(self, path: str) -> int:
+        """Adds the tenders saved at path that were matched against this catalog; returns how many."""
+        loaded = 0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry.get("catalog") != self.catalog:
+                    continue  # Matches from another catalog version are stale
+                self.add(entry["rfp_id"], "", entry["items"], signature=np.asarray(entry["signature"], dtype=np.uint32))
+                loaded += 1
+        return loaded
+
+
+def reusable_items(result: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Line items of a finished batch_runner result that a re-issue may reuse."""
+    if result.get("status") == "ERROR":
+        return {}
+    return {item["fingerprint"]: {"spec": item["spec"], "matches": item["matches"]}
+            for item in result.get("line_items", []) if item.get("fingerprint")}
@@ -0,0 +1,174 @@
+import time
+import json
+import argparse
+import numpy as np
+from typing import Dict, Any, List, Sequence
+
+from catalog import SPEC_FIELDS
+
+# ==========================================
+# PLUGGABLE TEXT ENCODERS
+# ==========================================
+# Every backend looks like a SentenceTransformer to the rest of the code
+# (encode() + get_sentence_embedding_dimension()), so setup_vector_db, the
+# embedding store and query encoding don't care which one is running.
+#
+#   "torch" -> full-precision PyTorch model (default, identical to before)
+#   "int8"  -> same model, nn.Linear layers dynamically quantized to int8 (CPU only, torch only)
+#   "onnx"  -> exported ONNX graph run by onnxruntime (needs `optimum[onnxruntime]`);
+#              ONNX_MODEL_FILE picks the variant, by default the quantized AVX2 export
+#
+# Catalog vectors are cached per backend (cache_name), so switching backends
+# never mixes int8 queries with float catalog vectors from an old run.
+# Run `python encoders.py --backend int8` to check ranking parity and latency
+# against the torch model before switching STRATABID_ENCODER in production.
+
+ENCODER_BACKENDS = ("torch", "int8", "onnx")
+
+# Which export of the model the "onnx" backend loads (files shipped in the model's onnx/ folder)
+ONNX_MODEL_FILE = "onnx/model_quint8_avx2.onnx"
+
+# Minimum agreement with the torch model for a backend to count as equivalent
+PARITY_MIN_TOP1 = 1.0
+PARITY_MIN_RECALL = 0.95
+
+
+class Encoder:
+    """A loaded embedding model plus the backend it runs on."""
+
+    def __init__(self, model, model_name: str, backend: str):
+        self.model = model
+        self.model_name = model_name
+        self.backend = backend
+
+    @property
+    def cache_name(self) -> str:
+        # "torch" keeps the plain model name so existing index caches stay valid
+        return self.model_name if self.backend == "torch" else f"{self.model_name}+{self.backend}"
+
+    def encode(self, texts, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        return np.asarray(self.model.encode(texts, convert_to_numpy=True, **kwargs), dtype="float32")
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def __repr__(self):
+        return f"Encoder({self.model_name!r}, backend={self.backend!r})"
+
+
+def load_encoder(model_name: str, backend: str = "torch", onnx_file: str = ONNX_MODEL_FILE) -> Encoder:
+    """Loads model_name on the requested backend."""
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown encoder backend '{backend}'. Choose one of {ENCODER_BACKENDS}.")
+
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        model = SentenceTransformer(model_name)
+    elif backend == "int8":
+        import torch
+        model = SentenceTransformer(model_name, device="cpu")
+        # Weights stored as int8, activations quantized on the fly: ~2-3x faster Linear layers on CPU
+        torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    else:
+        model = SentenceTransformer(model_name, device="cpu", backend="onnx",
+                                    model_kwargs={"file_name": onnx_file})
+    return Encoder(model, model_name, backend)
+
+
+# ==========================================
+# PARITY + LATENCY CHECK
+# ==========================================
+def _normalized(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.where(norms > 0, norms, 1.0)
+
+
+def _per_query_ms(encoder: Encoder, queries: Sequence[str], repeats: int) -> float:
+    """Median latency of encoding ONE query, the way a single search does it."""
+    encoder.encode(list(queries[:1]))  # Warm-up (lazy init, thread pools)
+    times = []
+    for _ in range(repeats):
+        for q in queries:
+            start = time.perf_counter()
+            encoder.encode([q])
+            times.append(time.perf_counter() - start)
+    return 1000.0 * float(np.median(times))
+
+
+def default_parity_queries(records_list: Sequence[Dict[str, Any]]) -> List[str]:
+    """One spec-style query per SKU, phrased like TechnicalAgent's query text."""
+    queries = []
+    for r in records_list:
+        spec = {k: r.get(k) for k in SPEC_FIELDS}
+        spec["Fire_Retardant"] = r.get("FR_Grade")
+        queries.append("; ".join(f"{k}: {v}" for k, v in spec.items() if v))
+    return queries
+
+
+def parity_report(reference: Encoder, candidate: Encoder, documents: Sequence[str],
+                  queries: Sequence[str], k: int = 3, repeats: int = 5) -> Dict[str, Any]:
+    """
+    Ranks `documents` for every query with both encoders (cosine, exact) and
+    compares: top-1 agreement, recall@k of the candidate's top-k against the
+    reference's, and how close the two embeddings of the same text are.
+    Also times single-query encoding for both.
+    """
+    k = min(k, len(documents))
+    ref_docs, cand_docs = _normalized(reference.encode(list(documents))), _normalized(candidate.encode(list(documents)))
+    ref_q, cand_q = _normalized(reference.encode(list(queries))), _normalized(candidate.encode(list(queries)))
+
+    ref_rank = np.argsort(-(ref_q @ ref_docs.T), axis=1, kind="stable")[:, :k]
+    cand_rank = np.argsort(-(cand_q @ cand_docs.T), axis=1, kind="stable")[:, :k]
+    hits = sum(len(np.intersect1d(r, c)) for r, c in zip(ref_rank, cand_rank))
+
+    same_text = np.concatenate([np.sum(ref_docs * cand_docs, axis=1), np.sum(ref_q * cand_q, axis=1)])
+    ref_ms = _per_query_ms(reference, queries, repeats)
+    cand_ms = _per_query_ms(candidate, queries, repeats)
+
+    report = {
+        "reference": reference.backend,
+        "candidate": candidate.backend,
+        "documents": len(documents),
+        "queries": len(queries),
+        "top1_agreement": round(float(np.mean(ref_rank[:, 0] == cand_rank[:, 0])), 4),
+        f"recall@{k}": round(hits / float(k * len(queries)), 4),
+        "min_cosine": round(float(same_text.min()), 4),
+        "mean_cosine": round(float(same_text.mean()), 4),
+        "reference_ms_per_query": round(ref_ms, 3),
+        "candidate_ms_per_query": round(cand_ms, 3),
+        "speedup": round(ref_ms / cand_ms, 2) if cand_ms else None,
+    }
+    report["equivalent"] = (report["top1_agreement"] >= PARITY_MIN_TOP1
+                            and report[f"recall@{k}"] >= PARITY_MIN_RECALL)
+    return report
+
+
+if __name__ == "__main__":
+    from setup_data import DATASHEET_RECORDS, EMBEDDING_MODEL_NAME, SAMPLE_RFP_TEXT
+
+    parser = argparse.ArgumentParser(description="Ranking parity and latency of an encoder backend vs the torch model.")
+    parser.add_argument("--backend", default="int8", choices=ENCODER_BACKENDS)
+    parser.add_argument("--onnx-file", default=ONNX_MODEL_FILE)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--repeats", type=int, default=5, help="Timing passes over the query set")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    reference = load_encoder(EMBEDDING_MODEL_NAME, "torch")
+    candidate = load_encoder(EMBEDDING_MODEL_NAME, args.backend, onnx_file=args.onnx_file)
+    documents = [r.get("Spec_Description", "") for r in DATASHEET_RECORDS]
+    queries = default_parity_queries(DATASHEET_RECORDS) + [SAMPLE_RFP_TEXT]
+    report = parity_report(reference, candidate, documents, queries, k=args.k, repeats=args.repeats)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{args.backend} vs torch on {report['documents']} SKUs / {report['queries']} queries")
+        print(f"  top-1 agreement : {report['top1_agreement']:.2%}")
+        print(f"  recall@{args.k}        : {report[f'recall@{args.k}']:.2%}")
+        print(f"  embedding cosine: min {report['min_cosine']}, mean {report['mean_cosine']}")
+        print(f"  ms / query      : {report['reference_ms_per_query']} -> {report['candidate_ms_per_query']} "
+              f"({report['speedup']}x)")
+        print("✅ Ranking equivalent" if report["equivalent"] else "❌ Ranking differs from the torch model")
+    raise SystemExit(0 if report["equivalent"] else 1)
@@ -0,0 +1,490 @@
+import time
+import threading
+import numpy as np
+from typing import Dict, Any, Iterable, List, NamedTuple, Optional
+
+from setup_data import DATASHEET_RECORDS, DEFAULT_ENCODER_BACKEND, DEFAULT_INDEX_DIR, DEFAULT_INDEX_MODE, setup_vector_db
+from catalog import Catalog, CatalogColumns, ConstraintIndex
+from cache import LRUCache
+from lexical_index import LexicalIndex
+
+# ==========================================
+# CATALOG SNAPSHOTS
+# ==========================================
+# Everything a search reads is bundled into one immutable snapshot, and a
+# catalog update publishes a NEW snapshot with a single reference swap.
+# A search grabs the snapshot once, so it never mixes old prices with new
+# rows, and readers never take a lock.
+#
+# Catalog rows are append-only and row i is vector i:
+#   - price/stock change     -> that column is replaced, embeddings untouched
+#   - description change/new -> only that text is encoded, vector appended
+#                               (old row tombstoned via `live`)
+#   - delete                 -> row tombstoned
+# Vectors live in two segments: the base index (built at load/compaction,
+# never touched afterwards) holds rows [0, base), and a small flat `delta`
+# index holds the rows appended since. An upsert copies only the delta (its
+# old version may still be searched), so its cost follows the batch and the
+# delta, not the catalog; the delta is folded into a new base once it
+# outgrows DELTA_MERGE_FRACTION of it. Embeddings sit in a buffer with spare
+# capacity: appends write past every published view, so no copy per update.
+# The lexical (BM25) index only covers SKU_ID + Spec_Description: it is rebuilt
+# when rows are added and carried over as is otherwise.
+# Tombstones are filtered with the same IDSelectorBitmap as the spec
+# prefilter; compaction drops them once they pile up.
+#
+# faiss / ann_index are imported inside the methods that need them: importing
+# this module (and agents) must not load faiss or torch (see import_budget.py).
+
+# Compact automatically once this share of vectors is dead
+COMPACT_DEAD_FRACTION = 0.3
+
+# Fold the delta segment into the base index once it holds this share of the
+# base's vectors (and at least DELTA_MERGE_MIN): merges stay rare, copies small
+DELTA_MERGE_FRACTION = 0.1
+DELTA_MERGE_MIN = 1024
+
+
+class CatalogSnapshot(NamedTuple):
+    version: int
+    records: Catalog                # All rows ever added (row == FAISS id), dead ones included
+    live: Optional[np.ndarray]      # Bool per row; None = every row is live
+    row_of_sku: Dict[str, int]      # Live SKU_ID -> row
+    columns: CatalogColumns
+    constraints: ConstraintIndex
+    index: Any                      # Base faiss.Index: rows [0, index.ntotal), never mutated once published
+    embeddings: np.ndarray
+    lexical: LexicalIndex           # BM25 over SKU_ID + Spec_Description, same rows
+    delta: Any = None               # faiss.IndexFlatL2 over the rows appended after the base (or None)
+
+    @property
+    def num_live(self) -> int:
+        return len(self.records) if self.live is None else int(self.live.sum())
+
+    @property
+    def num_vectors(self) -> int:
+        return int(self.index.ntotal) + (int(self.delta.ntotal) if self.delta is not None else 0)
+
+    def live_records(self) -> Catalog:
+        """The current catalog without tombstoned rows (zero-copy view)."""
+        return self.records if self.live is None else self.records.take(np.flatnonzero(self.live))
+
+
+# ==========================================
+# SHARED MATCHING ENGINE (Model + Vector DB)
+# ==========================================
+class MatchingEngine:
+    """
+    Owns the text encoder (encoders.Encoder), the FAISS index and the catalog.
+    Loading is lazy, happens once and is guarded by a lock, so every
+    TechnicalAgent (and every Streamlit session/rerun) can share one copy.
+    records_list may already be a catalog.Catalog (e.g. attached from shared memory).
+    Catalog state lives in an immutable CatalogSnapshot; upsert() / delete() /
+    update_values() publish a new one without rebuilding the index.
+    """
+
+    def __init__(self, records_list: Optional[List[Dict[str, Any]]] = None,
+                 index_mode: str = DEFAULT_INDEX_MODE, index_params: Optional[Dict[str, Any]] = None,
+                 cache_size: int = 1024, cache_ttl: Optional[float] = 3600.0,
+                 encoder_backend: str = DEFAULT_ENCODER_BACKEND, index_dir: Optional[str] = DEFAULT_INDEX_DIR):
+        self.records_list = records_list if records_list is not None else DATASHEET_RECORDS
+        self.index_mode = index_mode
+        self.index_params = index_params
+        self.encoder_backend = encoder_backend
+        self.index_dir = index_dir  # None = build in memory, never touch the on-disk cache
+        self.model = None
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._embedding_buffer: Optional[np.ndarray] = None  # Snapshots view its first rows
+
+        # Query embeddings depend only on the model; ranked results also depend on
+        # the catalog, so their keys carry the snapshot version and every publish clears them.
+        self.version = 0
+        self.query_cache = LRUCache(cache_size, cache_ttl)
+        self.result_cache = LRUCache(cache_size, cache_ttl)
+
+        # Uncached specs answered by the lexical fast path vs. by encoder + FAISS
+        self.lexical_fast_path = 0
+        self.lexical_dense = 0
+        self._stats_lock = threading.Lock()
+
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.last_error = None
+
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded
+
+    def ensure_loaded(self) -> "MatchingEngine":
+        """Loads the model and builds the index on first use (thread-safe)."""
+        if self._loaded:
+            return self
+
+        with self._lock:
+            # Double-checked: another thread may have finished while we waited
+            if self._loaded:
+                return self
+
+            start = time.perf_counter()
+            try:
+                catalog = self.records_list if isinstance(self.records_list, Catalog) else Catalog(self.records_list)
+                index, embeddings, model = setup_vector_db(
+                    catalog, index_mode=self.index_mode, index_params=self.index_params,
+                    encoder_backend=self.encoder_backend, index_dir=self.index_dir,
+                )
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                raise
+
+            self.model = model
+            self._embedding_buffer = np.asarray(embeddings, dtype="float32")
+            self._publish(catalog, None, index, self._embedding_buffer)
+            self.load_seconds = time.perf_counter() - start
+            self.last_error = None
+            self._loaded = True
+
+        return self
+
+    def query_embeddings(self, spec_keys: List[Any], query_texts: List[str]) -> np.ndarray:
+        """
+        (n, d) embedding matrix for n queries. Cached specs skip the transformer;
+        everything else goes through a single model.encode batch.
+        """
+        embs = [self.query_cache.get(key) for key in spec_keys]
+        missing = [i for i, emb in enumerate(embs) if emb is None]
+
+        if missing:
+            self.ensure_loaded()
+            encoded = self.model.encode([query_texts[i] for i in missing], convert_to_numpy=True)
+            for i, row in zip(missing, encoded):
+                emb = np.array(row, dtype="float32")
+                emb.flags.writeable = False  # Shared between callers
+                self.query_cache.put(spec_keys[i], emb)
+                embs[i] = emb
+
+        if not embs:
+            return np.empty((0, self.index.d), dtype="float32")
+        return np.vstack(embs)
+
+    # --- SNAPSHOT ACCESS ---
+    def snapshot(self) -> CatalogSnapshot:
+        """The current catalog version. Hold on to it for the whole of one search."""
+        self.ensure_loaded()
+        return self._snapshot
+
+    # Read-only shortcuts to the current snapshot
+    @property
+    def records(self) -> Optional[Catalog]:
+        return self._snapshot.records if self._snapshot else None
+
+    @property
+    def columns(self) -> Optional[CatalogColumns]:
+        return self._snapshot.columns if self._snapshot else None
+
+    @property
+    def constraints(self) -> Optional[ConstraintIndex]:
+        return self._snapshot.constraints if self._snapshot else None
+
+    @property
+    def index(self):
+        return self._snapshot.index if self._snapshot else None
+
+    @property
+    def embeddings(self) -> Optional[np.ndarray]:
+        return self._snapshot.embeddings if self._snapshot else None
+
+    def _publish(self, records: Catalog, live: Optional[np.ndarray], index, embeddings: np.ndarray,
+                 row_of_sku: Optional[Dict[str, int]] = None, lexical: Optional[LexicalIndex] = None,
+                 delta=None):
+        """Builds the derived structures and swaps the new snapshot in (caller holds _lock)."""
+        if live is not None and live.all():
+            live = None
+        if live is not None:
+            live.flags.writeable = False
+        if row_of_sku is None:
+            rows = range(len(records)) if live is None else np.flatnonzero(live).tolist()
+            row_of_sku = {str(sku): r for r, sku in zip(rows, records.values("SKU_ID", rows))}
+        embeddings = embeddings[:len(records)]  # A read-only view; the buffer behind it stays writable
+        embeddings.flags.writeable = False
+
+        columns = CatalogColumns(records)
+        snapshot = CatalogSnapshot(self.version + 1, records, live, row_of_sku, columns, ConstraintIndex(columns),
+                                   index, embeddings, lexical if lexical is not None else LexicalIndex(records),
+                                   delta)
+        self._snapshot = snapshot  # Atomic swap: searches see the old or the new, never a mix
+        self.version = snapshot.version
+        self.result_cache.clear()
+
+    def invalidate(self):
+        """Call whenever something outside the snapshot changes ranking: bumps version and drops cached results."""
+        with self._lock:
+            self.version += 1
+            self.result_cache.clear()
+
+    # --- INCREMENTAL CATALOG UPDATES ---
+    def upsert(self, records_list: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Adds or replaces SKUs (matched on SKU_ID, last one wins within a batch).
+        Only new SKUs and changed Spec_Descriptions are encoded; everything
+        else is a column update. Publishes one new version for the whole batch.
+        """
+        self.ensure_loaded()
+        batch = {str(r["SKU_ID"]): r for r in records_list}
+
+        with self._lock:
+            snap = self._snapshot
+            records = snap.records
+            live = np.ones(len(records), dtype=bool) if snap.live is None else snap.live.copy()
+            row_of_sku = dict(snap.row_of_sku)
+
+            in_place_rows, in_place, appended = [], [], []
+            for sku, rec in batch.items():
+                row = row_of_sku.get(sku)
+                if row is not None and rec.get("Spec_Description", "") == records[row].get("Spec_Description", ""):
+                    in_place_rows.append(row)
+                    in_place.append(rec)
+                else:
+                    if row is not None:
+                        live[row] = False  # Old text's vector stays in the index, tombstoned
+                    appended.append(rec)
+
+            if in_place:
+                records = records.replace_rows(in_place_rows, in_place)
+
+            index, delta, embeddings = snap.index, snap.delta, snap.embeddings
+            if appended:
+                vectors = self.model.encode([r.get("Spec_Description", "") for r in appended], convert_to_numpy=True)
+                vectors = np.ascontiguousarray(vectors, dtype="float32")
+                embeddings = self._append_embeddings(len(records), vectors)
+                index, delta = self._append_vectors(snap, vectors, embeddings)
+
+                first = len(records)
+                records = records.extend(appended)
+                live = np.concatenate([live, np.ones(len(appended), dtype=bool)])
+                for i, rec in enumerate(appended):
+                    row_of_sku[str(rec["SKU_ID"])] = first + i
+
+            self._publish(records, live, index, embeddings, row_of_sku, delta=delta)
+            self._maybe_compact()
+            return {"updated": len(in_place), "encoded": len(appended), "version": self.version}
+
+    def _append_embeddings(self, n: int, vectors: np.ndarray) -> np.ndarray:
+        """Writes vectors as rows n.. of the embedding buffer (growing it x2 when full); returns the buffer."""
+        buf = self._embedding_buffer
+        end = n + len(vectors)
+        if end > len(buf) or not buf.flags.writeable:
+            grown = np.empty((max(end, 2 * len(buf)), buf.shape[1]), dtype="float32")
+            grown[:n] = buf[:n]
+            buf = self._embedding_buffer = grown
+        buf[n:end] = vectors  # Past every published view: running searches can't see it
+        return buf
+
+    def _append_vectors(self, snap: CatalogSnapshot, vectors: np.ndarray, embeddings: np.ndarray):
+        """(base, delta) with vectors added. Copy-on-write touches only the delta, or merges it into a new base."""
+        import faiss
+        base = snap.index
+        delta = faiss.clone_index(snap.delta) if snap.delta is not None else faiss.IndexFlatL2(base.d)
+        delta.add(vectors)
+        if delta.ntotal > max(DELTA_MERGE_MIN, DELTA_MERGE_FRACTION * base.ntotal):
+            merged = faiss.clone_index(base)
+            merged.add(np.ascontiguousarray(embeddings[base.ntotal:base.ntotal + delta.ntotal]))
+            return merged, None
+        return base, delta
+
+    def delete(self, sku_ids: Iterable[str]) -> Dict[str, Any]:
+        """Removes SKUs from search results (tombstones; no index rebuild)."""
+        self.ensure_loaded()
+        with self._lock:
+            snap = self._snapshot
+            live = np.ones(len(snap.records), dtype=bool) if snap.live is None else snap.live.copy()
+            row_of_sku = dict(snap.row_of_sku)
+            removed = 0
+            for sku in sku_ids:
+                row = row_of_sku.pop(str(sku), None)
+                if row is not None:
+                    live[row] = False
+                    removed += 1
+            if removed:
+                self._publish(snap.records, live, snap.index, snap.embeddings, row_of_sku, snap.lexical, snap.delta)
+                self._maybe_compact()
+            return {"deleted": removed, "version": self.version}
+
+    def update_values(self, updates: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Price/stock feed: {SKU_ID: {"Base_Price_per_m": ..., "Stock_Available": ...}}.
+        Swaps just those columns; embeddings and the index are untouched.
+        (The inventory ledger keeps its own stock: push feeds there with set_on_hand.)
+        """
+        self.ensure_loaded()
+        with self._lock:
+            snap = self._snapshot
+            per_field, unknown = {}, []
+            for sku, fields in updates.items():
+                row = snap.row_of_sku.get(str(sku))
+                if row is None:
+                    unknown.append(sku)
+                    continue
+                for field, value in fields.items():
+                    if field in ("SKU_ID", "Spec_Description"):
+                        raise ValueError(f"{field} changes need upsert(), not update_values()")
+                    rows, values = per_field.setdefault(field, ([], []))
+                    rows.append(row)
+                    values.append(value)
+
+            records = snap.records
+            for field, (rows, values) in per_field.items():
+                records = records.replace_values(field, rows, values)
+            if per_field:
+                # Prices/stock aren't indexed text: the lexical index carries over as is
+                self._publish(records, snap.live, snap.index, snap.embeddings, snap.row_of_sku, snap.lexical,
+                              snap.delta)
+            return {"updated": len(updates) - len(unknown), "unknown": unknown, "version": self.version}
+
+    def compact(self) -> Dict[str, Any]:
+        """Drops tombstoned rows and rebuilds the index from the stored vectors (no re-encoding)."""
+        self.ensure_loaded()
+        with self._lock:
+            return self._compact()
+
+    def _maybe_compact(self):
+        snap = self._snapshot
+        if snap.live is not None and 1.0 - snap.num_live / len(snap.records) > COMPACT_DEAD_FRACTION:
+            self._compact()
+
+    def _compact(self) -> Dict[str, Any]:
+        from ann_index import build_index
+        snap = self._snapshot
+        if snap.live is None:
+            return {"dropped": 0, "version": self.version}
+        rows = np.flatnonzero(snap.live)
+        embeddings = np.ascontiguousarray(snap.embeddings[rows])
+        index = build_index(embeddings, self.index_mode, **(self.index_params or {}))
+        records = Catalog(snap.records.take(rows).to_records())  # Fresh vocabularies too
+        self._embedding_buffer = embeddings
+        self._publish(records, None, index, embeddings)
+        return {"dropped": len(snap.records) - len(rows), "version": self.version}
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return {
+            "query_embeddings": self.query_cache.stats(),
+            "results": self.result_cache.stats(),
+        }
+
+    def count_lexical(self, fast_path: int, dense: int):
+        with self._stats_lock:
+            self.lexical_fast_path += fast_path
+            self.lexical_dense += dense
+
+    def lexical_stats(self) -> Dict[str, Any]:
+        total = self.lexical_fast_path + self.lexical_dense
+        return {"fast_path": self.lexical_fast_path, "dense": self.lexical_dense,
+                "rate": round(self.lexical_fast_path / total, 4) if total else 0.0}
+
+    def vector_search(self, queries: np.ndarray, k: int, mask: Optional[np.ndarray] = None,
+                      snapshot: Optional[CatalogSnapshot] = None):
+        """
+        FAISS k-NN for a (n, d) query matrix. With a boolean mask, only rows
+        where mask is True are considered (faiss IDSelectorBitmap), so all k
+        neighbours come from that subset. Tombstoned rows are always excluded.
+        """
+        snap = snapshot or self.snapshot()
+        queries = np.ascontiguousarray(queries, dtype="float32")
+        if snap.live is not None:
+            mask = snap.live if mask is None else mask & snap.live
+        base = int(snap.index.ntotal)
+        D, I = self._search_segment(snap.index, queries, k, None if mask is None else mask[:base])
+        if snap.delta is None or not snap.delta.ntotal:
+            return D, I
+
+        # Appended rows: search the delta too and keep the k nearest of both
+        D2, I2 = self._search_segment(snap.delta, queries, k, None if mask is None else mask[base:])
+        D, I = np.hstack([D, D2]), np.hstack([I, np.where(I2 >= 0, I2 + base, -1)])
+        order = np.argsort(np.where(I >= 0, D, np.inf), axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(D, order, axis=1), np.take_along_axis(I, order, axis=1)
+
+    @staticmethod
+    def _search_segment(index, queries: np.ndarray, k: int, mask: Optional[np.ndarray]):
+        if mask is None:
+            return index.search(queries, k)
+        if not mask.any():
+            return (np.full((len(queries), k), np.inf, dtype="float32"),
+                    np.full((len(queries), k), -1, dtype="int64"))
+
+        import faiss
+        from ann_index import search_parameters
+        bits = np.packbits(mask, bitorder="little")
+        selector = faiss.IDSelectorBitmap(len(bits), faiss.swig_ptr(bits))
+        return index.search(queries, k, params=search_parameters(index, selector))
+
+    def warm_up(self) -> "MatchingEngine":
+        """Loads everything and runs one throwaway query so the first user doesn't pay the cold start."""
+        self.ensure_loaded()
+
+        start = time.perf_counter()
+        q_emb = self.model.encode(["Voltage: 1.1; Cores: 4.0"], convert_to_numpy=True)
+        self.index.search(np.asarray(q_emb, dtype="float32"), 1)
+        self.warmup_seconds = time.perf_counter() - start
+        return self
+
+    def warm_up_in_background(self) -> threading.Thread:
+        """Starts warm_up() on a daemon thread (e.g. at process start) and returns it."""
+        t = threading.Thread(target=self._safe_warm_up, name="engine-warmup", daemon=True)
+        t.start()
+        return t
+
+    def _safe_warm_up(self):
+        try:
+            self.warm_up()
+        except Exception:
+            pass  # Recorded in last_error; health() reports it
+
+    def health(self) -> Dict[str, Any]:
+        """Cheap status snapshot for the sidebar / readiness probes. Never triggers a load."""
+        return {
+            "status": "ready" if self._loaded else ("error" if self.last_error else "cold"),
+            "num_skus": self._snapshot.num_live if self._snapshot else len(self.records_list),
+            "index_mode": self.index_mode,
+            "encoder": self.encoder_backend,
+            "index_size": self._snapshot.num_live if self._snapshot else 0,  # Searchable SKUs
+            "index_vectors": self._snapshot.num_vectors if self._snapshot else 0,
+            "delta_vectors": int(self._snapshot.delta.ntotal) if self._snapshot and self._snapshot.delta else 0,
+            "dead_vectors": len(self._snapshot.records) - self._snapshot.num_live if self._snapshot else 0,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "last_error": self.last_error,
+            "version": self.version,
+            "cache": self.cache_stats(),
+            "lexical": self.lexical_stats(),
+        }
+
+
+# --- PROCESS-WIDE SINGLETON ---
+_ENGINE = None
+_ENGINE_LOCK = threading.Lock()
+
+
+def get_engine() -> MatchingEngine:
+    """Returns the process-wide engine (created on first call, not loaded until used)."""
+    global _ENGINE
+    if _ENGINE is None:
+        with _ENGINE_LOCK:
+            if _ENGINE is None:
+                _ENGINE = MatchingEngine()
+    return _ENGINE
+
+
+def set_engine(engine: MatchingEngine):
+    """Installs a pre-configured engine as the process-wide one (e.g. in a worker initializer)."""
+    global _ENGINE
+    with _ENGINE_LOCK:
+        _ENGINE = engine
+
+
+def reset_engine():
+    """Drops the shared engine so the next get_engine() builds a fresh one."""
+    global _ENGINE
+    with _ENGINE_LOCK:
+        _ENGINE = None
@@ -0,0 +1,146 @@
+import re
+from typing import Dict, Any, Iterator, List, NamedTuple, Optional
+
+# ==========================================
+# SINGLE-PASS RFP FIELD EXTRACTION
+# ==========================================
+# Every field pattern is folded into ONE compiled alternation, so a document
+# is scanned exactly once no matter how many fields we look for. Numeric
+# alternatives only start at the beginning of a number - not after a digit,
+# nor inside a decimal ((?<!\d)(?<!\d\.)) - which keeps long digit runs from
+# being rescanned at every offset (linear time). A number right after a plain
+# period ("Qty.5000 m", "no.4 core") still counts, as it did before.
+#
+# Order matters where alternatives could start at the same offset:
+# "1.1 kV" is a voltage before it could be anything else, "4C" a core count.
+
+_FIELD_PATTERNS = [
+    ("Voltage", r"(?<!\d)(?<!\d\.)(?P<Voltage>\d+(?:\.\d+)?)\s*k?v"),
+    ("Cores", r"(?<!\d)(?<!\d\.)(?P<Cores>\d+(?:\.\d+)?)\s*-?\s*(?:core|c)\b"),
+    ("Quantity_m", r"(?<!\d)(?<!\d\.)(?P<Quantity_m>\d{3,7})\s*m"),
+    # \b ensures we match "Al" as a whole word, not inside "Materi-al"
+    ("Material", r"\b(?P<Material>copper|cu|aluminum|aluminium|al)\b"),
+    # Whatever follows "Conductor:" - captured by lookahead so a known metal
+    # right after it is still reported as a Material hit too
+    ("Conductor", r"conductor\s*[:\-]?\s*(?:stranded\s+)?(?=(?P<Conductor>[a-z]+))"),
+    ("Insulation", r"(?P<Insulation>pvc)"),
+    ("Fire_Retardant", r"(?P<Fire_Retardant>fire retard|frls|fr grade)"),
+]
+
+EXTRACTION_PATTERN = re.compile("|".join(p for _, p in _FIELD_PATTERNS), re.IGNORECASE)
+
+_MATERIAL_NAMES = {
+    "copper": "Copper", "cu": "Copper",
+    "aluminum": "Aluminum", "aluminium": "Aluminum", "al": "Aluminum",
+}
+
+
+# Fields whose first occurrence is final (Material needs "Copper" seen to be final)
+_SETTLED_FIELDS = frozenset({"Voltage", "Cores", "Quantity_m", "Insulation", "Fire_Retardant"})
+
+
+class Extraction(NamedTuple):
+    field: str
+    value: Any
+    start: int   # Character offsets into the scanned text
+    end: int
+
+
+def _convert(field: str, raw: str):
+    if field == "Voltage" or field == "Cores":
+        return float(raw)
+    if field == "Quantity_m":
+        return int(raw)
+    if field == "Material":
+        return _MATERIAL_NAMES[raw.lower()]
+    if field == "Conductor":
+        return raw.lower().capitalize()
+    if field == "Insulation":
+        return "PVC"
+    return True  # Fire_Retardant
+
+
+def iter_extractions(text: str, offset: int = 0) -> Iterator[Extraction]:
+    """Yields every field occurrence in document order (one regex pass)."""
+    for m in EXTRACTION_PATTERN.finditer(text):
+        field = m.lastgroup
+        if field is None:
+            # Conductor's capture sits in a lookahead, so lastgroup can't see it
+            field = "Conductor"
+        raw = m.group(field)
+        yield Extraction(field, _convert(field, raw), offset + m.start(field), offset + m.end(field))
+
+
+def extract_all(text: str) -> List[Extraction]:
+    return list(iter_extractions(text))
+
+
+def spec_from_extractions(extractions) -> Dict[str, Any]:
+    """
+    Folds extractions into the SalesAgent spec dict using the parser's rules:
+    first occurrence wins, Copper beats Aluminum, a generic "Conductor: X"
+    only counts when no known metal appears anywhere.
+    """
+    first: Dict[str, Extraction] = {}
+    metals = set()
+    for ex in extractions:
+        first.setdefault(ex.field, ex)
+        if ex.field == "Material":
+            metals.add(ex.value)
+        # Nothing later can change the result once every field is settled
+        if "Copper" in metals and _SETTLED_FIELDS.issubset(first):
+            break
+
+    cond: Optional[str] = None
+    if "Copper" in metals:
+        cond = "Copper"
+    elif "Aluminum" in metals:
+        cond = "Aluminum"
+    elif "Conductor" in first:
+        cond = first["Conductor"].value
+
+    return {
+        "Voltage": first["Voltage"].value if "Voltage" in first else 1.1,
+        "Cores": first["Cores"].value if "Cores" in first else 3.0,
+        "Conductor_Material": cond,
+        "Insulation_Type": "PVC" if "Insulation" in first else "XLPE",
+        "Fire_Retardant": "Fire_Retardant" in first,
+        "Quantity_m": first["Quantity_m"].value if "Quantity_m" in first else 1000
+    }
+
+
+def extract_spec(text: str) -> Dict[str, Any]:
+    return spec_from_extractions(iter_extractions(text))
+
+
+# --- REGRESSION CASES (python extraction.py) ---
+# (text, expected subset of extract_spec(text)); each one was parsed wrongly at some point
+REGRESSION_CASES = [
+    ("Qty.5000 m of cable", {"Quantity_m": 5000}),
+    ("Rated Voltage.11kV", {"Voltage": 11.0}),
+    ("Item no.4 core", {"Cores": 4.0}),
+    ("1.1 kV 3.5C Aluminium XLPE, 2500 m", {"Voltage": 1.1, "Cores": 3.5, "Quantity_m": 2500}),
+    ("Voltage 33.0kV, 4-Core copper FRLS", {"Voltage": 33.0, "Cores": 4.0, "Conductor_Material": "Copper",
+                                            "Fire_Retardant": True}),
+]
+
+
+def check_regressions() -> List[str]:
+    """One message per REGRESSION_CASES entry whose parse differs from the expected fields."""
+    failures = []
+    for text, expected in REGRESSION_CASES:
+        spec = extract_spec(text)
+        wrong = {k: spec.get(k) for k, v in expected.items() if spec.get(k) != v}
+        if wrong:
+            failures.append(f"{text!r}: got {wrong}, expected {({k: expected[k] for k in wrong})}")
+    return failures
+
+
+if __name__ == "__main__":
+    import sys
+    problems = check_regressions()
+    for p in problems:
+        print(f"❌ {p}", file=sys.stderr)
+    if problems:
+        sys.exit(1)
+    print(f"✅ {len(REGRESSION_CASES)} extraction regression cases pass")
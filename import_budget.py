@@ -0,0 +1,112 @@
+import sys
+import json
+import argparse
+import subprocess
+from typing import Dict, Any, List
+
+# ==========================================
+# IMPORT-TIME BUDGET
+# ==========================================
+# Importing the agents must stay cheap: CLI tools, the batch runner's
+# workers and anything that only parses or prices should start in well
+# under a second. torch / sentence-transformers / faiss are loaded on the
+# first vector search (MatchingEngine.ensure_loaded), never at import.
+#
+#   python import_budget.py            # measure agents + batch_runner against the budget
+#   python import_budget.py --json     # machine-readable report
+#
+# Exits 1 when a module is over budget or pulls in a heavy dependency.
+
+# Wall-clock import budget per entry module (fresh interpreter, warm disk cache)
+IMPORT_BUDGET_SECONDS = {
+    "agents": 1.5,
+    "batch_runner": 1.5,
+}
+
+# Must not be imported by the modules above
+HEAVY_MODULES = ("torch", "sentence_transformers", "transformers", "faiss")
+
+# Runs in a fresh interpreter so nothing is already cached in sys.modules
+_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+try:
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        rss_kb //= 1024  # macOS reports bytes
+except ImportError:
+    rss_kb = None
+print(json.dumps({{"seconds": elapsed, "max_rss_kb": rss_kb, "modules": sorted(sys.modules)}}))
+"""
+
+
+def _parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """'import time: self [us] | cumulative | name' lines from python -X importtime."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append({"module": name.strip(), "self_ms": int(self_us) / 1000.0,
+                     "cumulative_ms": int(cumulative_us) / 1000.0})
+    return rows
+
+
+def measure(module: str, top: int = 10) -> Dict[str, Any]:
+    """Imports `module` in a fresh interpreter; returns time, peak RSS, heavy modules hit, slowest imports."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module)],
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    probe = json.loads(proc.stdout.strip().splitlines()[-1])
+    loaded = set(probe["modules"])
+    timings = _parse_importtime(proc.stderr)
+    return {
+        "module": module,
+        "seconds": round(probe["seconds"], 3),
+        "budget_seconds": IMPORT_BUDGET_SECONDS.get(module),
+        "max_rss_mb": round(probe["max_rss_kb"] / 1024.0, 1) if probe["max_rss_kb"] else None,
+        "heavy_loaded": [m for m in HEAVY_MODULES if m in loaded],
+        "slowest": sorted(timings, key=lambda r: -r["cumulative_ms"])[1:top + 1],
+    }
+
+
+def check(report: Dict[str, Any]) -> List[str]:
+    problems = []
+    if report["heavy_loaded"]:
+        problems.append(f"{report['module']} imports {', '.join(report['heavy_loaded'])}")
+    budget = report["budget_seconds"]
+    if budget is not None and report["seconds"] > budget:
+        problems.append(f"{report['module']} took {report['seconds']}s (budget {budget}s)")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure module import time against the startup budget.")
+    parser.add_argument("modules", nargs="*", default=list(IMPORT_BUDGET_SECONDS))
+    parser.add_argument("--json", action="store_true", help="Print the full report as JSON")
+    args = parser.parse_args(argv)
+
+    reports = [measure(m) for m in args.modules]
+    problems = [p for r in reports for p in check(r)]
+
+    if args.json:
+        print(json.dumps({"reports": reports, "problems": problems}, indent=2))
+    else:
+        for r in reports:
+            budget = f" / {r['budget_seconds']}s budget" if r["budget_seconds"] is not None else ""
+            print(f"{r['module']}: {r['seconds']}s{budget}, peak RSS {r['max_rss_mb']} MB, "
+                  f"heavy: {r['heavy_loaded'] or 'none'}")
+            for row in r["slowest"][:5]:
+                print(f"    {row['cumulative_ms']:8.1f} ms  {row['module']}")
+        print("✅ Within import budget" if not problems else "❌ " + "; ".join(problems))
+
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import os
+import json
+import hashlib
+import numpy as np
+import faiss
+from ann_index import DEFAULT_INDEX_MODE, build_index, tune_index
+from typing import Dict, Any, List, Optional, Tuple
+
+# ==========================================
+# PERSISTENT EMBEDDING + FAISS INDEX STORE
+# ==========================================
+# Layout of a store directory:
+#   manifest.json            -> model name, dimension, one content hash per SKU (in row order)
+#   embeddings-<gen>.npy     -> float32 matrix, row i == manifest["skus"][i]
+#   index-<gen>.faiss        -> serialized FAISS index built from that matrix
+# <gen> is derived from the manifest contents, and the manifest is replaced last,
+# so a crash mid-save can never pair a manifest with the wrong matrix.
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+
+# Search-time knobs: applied after loading, never a reason to rebuild the index
+SEARCH_PARAMS = ("nprobe", "ef_search")
+
+
+def content_hash(description: str) -> str:
+    """Stable fingerprint of the text we embed for one SKU."""
+    return hashlib.sha256(str(description).encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    def __init__(self, store_dir: str, model_name: str):
+        self.store_dir = store_dir
+        self.model_name = model_name
+        # Filled in by load_or_build() so callers can log what actually happened
+        self.last_stats = {}
+
+    # --- PUBLIC API ---
+    def load_or_build(self, records_list: List[Dict[str, Any]], model,
+                      index_mode: str = DEFAULT_INDEX_MODE,
+                      index_params: Optional[Dict[str, Any]] = None) -> Tuple[Any, np.ndarray]:
+        """
+        Returns (faiss_index, embeddings) for records_list.
+        Unchanged catalogs are served straight from disk (mmap, no encoding);
+        otherwise only new/changed Spec_Description rows are sent to the model.
+        A different index_mode/build params reuses every embedding and only rebuilds the index.
+        """
+        index_params = dict(index_params or {})
+        search_params = {k: index_params.pop(k) for k in SEARCH_PARAMS if k in index_params}
+        index_config = {"mode": index_mode, "params": index_params}
+
+        sku_ids = [str(r["SKU_ID"]) for r in records_list]
+        hashes = [content_hash(r.get("Spec_Description", "")) for r in records_list]
+
+        manifest = self._read_manifest()
+
+        # --- 1. FAST PATH: identical catalog -> load everything memory-mapped ---
+        if (manifest and self._same_catalog(manifest, sku_ids, hashes)
+                and manifest.get("index_config") == index_config):
+            loaded = self._load_files(manifest)
+            if loaded is not None:
+                tune_index(loaded[0], **search_params)
+                self.last_stats = {"source": "disk", "encoded": 0, "reused": len(sku_ids)}
+                return loaded
+
+        # --- 2. INCREMENTAL PATH: reuse rows whose hash still matches ---
+        old_rows = self._reusable_rows(manifest)
+        old_emb = self._load_embeddings(manifest) if old_rows else None
+
+        reuse_src, reuse_dst, encode_dst = [], [], []
+        for i, (sku, h) in enumerate(zip(sku_ids, hashes)):
+            j = old_rows.get((sku, h)) if old_emb is not None else None
+            if j is not None and j < len(old_emb):
+                reuse_src.append(j)
+                reuse_dst.append(i)
+            else:
+                encode_dst.append(i)
+
+        dimension = old_emb.shape[1] if old_emb is not None else None
+        new_emb = None
+        if encode_dst:
+            texts = [records_list[i].get("Spec_Description", "") for i in encode_dst]
+            new_emb = np.asarray(model.encode(texts, convert_to_numpy=True), dtype="float32")
+            dimension = new_emb.shape[1]
+
+        if dimension is None:
+            # Empty catalog: nothing to encode and nothing on disk to copy from
+            dimension = model.get_sentence_embedding_dimension()
+
+        embeddings = np.empty((len(sku_ids), dimension), dtype="float32")
+        if reuse_dst:
+            embeddings[reuse_dst] = old_emb[reuse_src]
+        if encode_dst:
+            embeddings[encode_dst] = new_emb
+
+        index = build_index(embeddings, index_mode, **index_params, **search_params)
+
+        self._save(sku_ids, hashes, embeddings, index, index_config)
+        self.last_stats = {"source": "rebuilt", "encoded": len(encode_dst), "reused": len(reuse_dst)}
+        return index, embeddings
+
+    def clear(self):
+        """Deletes every file this store owns (next start re-encodes the catalog)."""
+        if not os.path.isdir(self.store_dir):
+            return
+        for name in os.listdir(self.store_dir):
+            if name == MANIFEST_FILE or name.startswith(("embeddings-", "index-")):
+                self._remove_quietly(os.path.join(self.store_dir, name))
+
+    # --- MANIFEST HELPERS ---
+    def _read_manifest(self) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self.store_dir, MANIFEST_FILE)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if manifest.get("version") != MANIFEST_VERSION:
+            return None
+        return manifest
+
+    def _same_catalog(self, manifest, sku_ids, hashes) -> bool:
+        if manifest.get("model_name") != self.model_name:
+            return False
+        stored = manifest.get("skus", [])
+        if len(stored) != len(sku_ids):
+            return False
+        return all(s["SKU_ID"] == sku and s["hash"] == h for s, sku, h in zip(stored, sku_ids, hashes))
+
+    def _reusable_rows(self, manifest) -> Dict[Tuple[str, str], int]:
+        # Embeddings from another model are never comparable, so nothing is reusable
+        if not manifest or manifest.get("model_name") != self.model_name:
+            return {}
+        return {(s["SKU_ID"], s["hash"]): row for row, s in enumerate(manifest.get("skus", []))}
+
+    # --- FILE I/O ---
+    def _load_embeddings(self, manifest) -> Optional[np.ndarray]:
+        path = os.path.join(self.store_dir, manifest.get("embeddings_file", ""))
+        try:
+            return np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+
+    def _load_files(self, manifest):
+        embeddings = self._load_embeddings(manifest)
+        if embeddings is None:
+            return None
+
+        path = os.path.join(self.store_dir, manifest.get("index_file", ""))
+        if not os.path.isfile(path):
+            return None
+        try:
+            index = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            # Some index types/builds can't be mmapped; a normal read is still far cheaper than re-encoding
+            index = faiss.read_index(path)
+
+        if index.ntotal != len(embeddings):
+            return None
+        return index, embeddings
+
+    def _save(self, sku_ids, hashes, embeddings, index, index_config):
+        os.makedirs(self.store_dir, exist_ok=True)
+        previous = self._read_manifest()
+
+        gen = hashlib.sha256(
+            (self.model_name + json.dumps(index_config, sort_keys=True)
+             + "".join(hashes) + "".join(sku_ids)).encode("utf-8")
+        ).hexdigest()[:16]
+        emb_file = f"embeddings-{gen}.npy"
+        idx_file = f"index-{gen}.faiss"
+
+        self._atomic_write(emb_file, lambda p: np.save(p, embeddings))
+        self._atomic_write(idx_file, lambda p: faiss.write_index(index, p))
+
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "model_name": self.model_name,
+            "dimension": int(embeddings.shape[1]),
+            "faiss_index": type(faiss.downcast_index(index)).__name__,
+            "index_config": index_config,
+            "embeddings_file": emb_file,
+            "index_file": idx_file,
+            "skus": [{"SKU_ID": s, "hash": h} for s, h in zip(sku_ids, hashes)],
+        }
+
+        def write_manifest(p):
+            with open(p, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=1)
+
+        self._atomic_write(MANIFEST_FILE, write_manifest)
+
+        # Old generation is now unreachable; best effort cleanup (may still be mmapped elsewhere)
+        if previous:
+            for key in ("embeddings_file", "index_file"):
+                old = previous.get(key)
+                if old and old not in (emb_file, idx_file):
+                    self._remove_quietly(os.path.join(self.store_dir, old))
+
+    def _atomic_write(self, name, writer):
+        final_path = os.path.join(self.store_dir, name)
+        # Keep the real extension last: np.save() appends ".npy" to paths that don't end with it
+        root, ext = os.path.splitext(name)
+        tmp_path = os.path.join(self.store_dir, f"{root}.tmp{os.getpid()}{ext}")
+        writer(tmp_path)
+        os.replace(tmp_path, final_path)
+
+    @staticmethod
+    def _remove_quietly(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
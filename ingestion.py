@@ -0,0 +1,245 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Iterator, NamedTuple, Optional
+
+from extraction import iter_extractions, spec_from_extractions
+
+# ==========================================
+# STREAMING TENDER INGESTION (PDF / DOCX / TXT)
+# ==========================================
+# Documents are turned into a lazy stream of page chunks. Pages are read only
+# when the parser asks for the next one, and the parser stops pulling as soon
+# as every spec field is settled, so memory stays flat whatever the page count.
+# PDFs can be extracted across a process pool; at most 2 x workers pages are
+# in flight, and results still come back in page order. The pool is started
+# once per process and reused (a click in the app must not fork a pool), and
+# short PDFs skip it: below PARALLEL_MIN_PAGES start-up costs more than it saves.
+# BOQ line items can sit on any page, so splitting into line items reads every
+# page; the splitter is fed one page at a time and keeps parsed rows, not text.
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".txt")
+
+# DOCX/TXT have no real pages; chunk them so provenance still points somewhere useful
+DOCX_BLOCKS_PER_PAGE = 40
+TEXT_LINES_PER_PAGE = 60
+
+# PDFs shorter than this are extracted serially even when workers > 1
+PARALLEL_MIN_PAGES = 8
+
+
+class PageChunk(NamedTuple):
+    page: int   # 1-based
+    text: str
+
+
+class PageExtraction(NamedTuple):
+    field: str
+    value: Any
+    page: int
+    start: int  # Character offsets within that page's text
+    end: int
+
+
+# --- PDF ---
+def _pdf_reader(path: str):
+    try:
+        from pypdf import PdfReader
+    except ImportError as e:
+        raise ImportError("PDF ingestion needs pypdf: pip install pypdf") from e
+    return PdfReader(path)
+
+
+# One open reader per worker process, so a worker pays the xref parse once per file
+_WORKER_READERS = {}
+
+
+def _extract_pdf_page(path: str, page_index: int) -> PageChunk:
+    key = (path, os.path.getmtime(path))
+    reader = _WORKER_READERS.get(key)
+    if reader is None:
+        _WORKER_READERS.clear()
+        reader = _WORKER_READERS[key] = _pdf_reader(path)
+    return PageChunk(page_index + 1, reader.pages[page_index].extract_text() or "")
+
+
+def iter_pdf_pages(path: str) -> Iterator[PageChunk]:
+    reader = _pdf_reader(path)
+    for i, page in enumerate(reader.pages):
+        yield PageChunk(i + 1, page.extract_text() or "")
+
+
+_PAGE_POOL = None
+_PAGE_POOL_LOCK = threading.Lock()
+
+
+def get_page_pool(workers: int) -> ProcessPoolExecutor:
+    """The process-wide PDF extraction pool (started on first use, sized by its first caller)."""
+    global _PAGE_POOL
+    with _PAGE_POOL_LOCK:
+        if _PAGE_POOL is None or getattr(_PAGE_POOL, "_broken", False):
+            _PAGE_POOL = ProcessPoolExecutor(max_workers=workers)
+        return _PAGE_POOL
+
+
+def iter_pdf_pages_parallel(path: str, workers: int) -> Iterator[PageChunk]:
+    reader = _pdf_reader(path)
+    n_pages = len(reader.pages)
+    if n_pages < PARALLEL_MIN_PAGES:
+        for i, page in enumerate(reader.pages):
+            yield PageChunk(i + 1, page.extract_text() or "")
+        return
+
+    pool = get_page_pool(workers)
+    window = deque()
+    next_page = 0
+    try:
+        while next_page < n_pages or window:
+            while next_page < n_pages and len(window) < 2 * workers:
+                window.append(pool.submit(_extract_pdf_page, path, next_page))
+                next_page += 1
+            yield window.popleft().result()
+    finally:
+        # Consumer stopped early (e.g. every field found): drop queued pages; the pool stays up
+        for future in window:
+            future.cancel()
+
+
+# --- DOCX ---
+def iter_docx_pages(path: str) -> Iterator[PageChunk]:
+    try:
+        import docx
+    except ImportError as e:
+        raise ImportError("DOCX ingestion needs python-docx: pip install python-docx") from e
+
+    document = docx.Document(path)
+    page, lines, blocks = 1, [], 0
+
+    # Paragraphs and tables in document order; BOQs usually live in tables
+    for block in document.iter_inner_content():
+        if hasattr(block, "rows"):
+            for row in block.rows:
+                lines.append(" | ".join(cell.text for cell in row.cells))
+        else:
+            lines.append(block.text)
+        blocks += 1
+
+        if blocks >= DOCX_BLOCKS_PER_PAGE:
+            yield PageChunk(page, "\n".join(lines))
+            page, lines, blocks = page + 1, [], 0
+
+    if lines:
+        yield PageChunk(page, "\n".join(lines))
+
+
+# --- Plain text ---
+def iter_text_pages(path: str) -> Iterator[PageChunk]:
+    """Form feeds mark pages (pdftotext output); otherwise every TEXT_LINES_PER_PAGE lines."""
+    page, lines = 1, []
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            parts = line.split("\f")
+            for i, part in enumerate(parts):
+                if i > 0 or len(lines) >= TEXT_LINES_PER_PAGE:
+                    yield PageChunk(page, "".join(lines))
+                    page, lines = page + 1, []
+                lines.append(part)
+
+    if lines:
+        yield PageChunk(page, "".join(lines))
+
+
+def iter_pages(path: str, workers: Optional[int] = None) -> Iterator[PageChunk]:
+    """Lazy page stream for any supported document. workers > 1 parallelizes PDFs."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".pdf":
+        if workers and workers > 1:
+            return iter_pdf_pages_parallel(path, workers)
+        return iter_pdf_pages(path)
+    if ext == ".docx":
+        return iter_docx_pages(path)
+    if ext == ".txt":
+        return iter_text_pages(path)
+    raise ValueError(f"Unsupported document type '{ext}'. Supported: {SUPPORTED_EXTENSIONS}")
+
+
+# ==========================================
+# PAGE STREAM -> SALES AGENT SPEC
+# ==========================================
+def iter_page_extractions(pages) -> Iterator[PageExtraction]:
+    for chunk in pages:
+        for ex in iter_extractions(chunk.text):
+            yield PageExtraction(ex.field, ex.value, chunk.page, ex.start, ex.end)
+
+
+# Spec field -> extraction field that decided it
+_PROVENANCE_FIELDS = {
+    "Voltage": "Voltage",
+    "Cores": "Cores",
+    "Quantity_m": "Quantity_m",
+    "Insulation_Type": "Insulation",
+    "Fire_Retardant": "Fire_Retardant",
+}
+
+
+def parse_pages(pages) -> Dict[str, Any]:
+    """
+    Runs the SalesAgent extraction rules over a page stream.
+    Returns {"spec", "provenance", "pages_read"}; provenance maps each spec
+    field to the page/offsets of the hit that set it (None = default value).
+    """
+    first, first_metal, pages_read = {}, {}, [0]
+
+    def tracked():
+        for chunk in pages:
+            pages_read[0] = chunk.page
+            for ex in iter_page_extractions([chunk]):
+                first.setdefault(ex.field, ex)
+                if ex.field == "Material":
+                    first_metal.setdefault(ex.value, ex)
+                yield ex
+
+    spec = spec_from_extractions(tracked())
+
+    def where(ex):
+        return {"page": ex.page, "start": ex.start, "end": ex.end} if ex else None
+
+    provenance = {field: where(first.get(src)) for field, src in _PROVENANCE_FIELDS.items()}
+    material_hit = first_metal.get(spec["Conductor_Material"]) or first.get("Conductor")
+    provenance["Conductor_Material"] = where(material_hit) if spec["Conductor_Material"] else None
+
+    return {"spec": spec, "provenance": provenance, "pages_read": pages_read[0]}
+
+
+def parse_document(path: str, workers: Optional[int] = None, line_items=None) -> Dict[str, Any]:
+    """
+    Streams a PDF/DOCX/TXT tender straight into the spec extractor. line_items
+    (e.g. agents.LineItemStream) gets every page's text through feed(text), then
+    finish(spec) returns result["line_items"].
+    """
+    pages = iter_pages(path, workers)
+    try:
+        if line_items is None:
+            return parse_pages(pages)
+
+        last_page = [0]
+
+        def fed():
+            for chunk in pages:
+                line_items.feed(chunk.text)
+                last_page[0] = chunk.page
+                yield chunk
+
+        stream = fed()
+        parsed = parse_pages(stream)
+        for _ in stream:
+            pass  # The spec is settled, but BOQ rows can still follow
+        parsed["pages_read"] = last_page[0]
+        parsed["line_items"] = line_items.finish(parsed["spec"])
+        return parsed
+    finally:
+        # Stops the page generator (and any PDF worker pool) if parsing finished early
+        close = getattr(pages, "close", None)
+        if close:
+            close()
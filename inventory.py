@@ -0,0 +1,324 @@
+import os
+import time
+import uuid
+import heapq
+import sqlite3
+import threading
+from typing import Dict, Any, Iterable, List, NamedTuple, Optional
+
+from catalog import DEFAULT_STOCK
+
+# ==========================================
+# INVENTORY RESERVATION LEDGER
+# ==========================================
+# The Decision Agent used to compare Stock_Available against the required
+# quantity without ever taking anything out, so two parallel bids could both
+# be approved against the same drum. Bids now place a HOLD on the stock:
+#   reserve()  -> atomic check-and-hold (None when not enough is free)
+#   confirm()  -> hold becomes a real deduction from on-hand stock
+#   release()  -> hold is given back
+# Unconfirmed holds expire after hold_ttl seconds.
+#
+# Two backends with the same interface:
+#   InventoryLedger        in-process; one lock per stripe of SKUs, reads take no lock
+#   SQLiteInventoryLedger  shared by every process that opens the same file (batch workers)
+
+DEFAULT_HOLD_TTL = float(os.environ.get("STRATABID_HOLD_TTL", 900.0))
+DEFAULT_LEDGER_DB = os.environ.get("STRATABID_LEDGER_DB") or None
+
+
+class Reservation(NamedTuple):
+    id: str
+    sku_id: str
+    qty: float
+    holder: Optional[str]
+    expires_at: float
+
+
+def _stock_from_records(records_list: Iterable[Dict[str, Any]]) -> Dict[str, float]:
+    return {r["SKU_ID"]: r.get("Stock_Available", DEFAULT_STOCK) for r in records_list}
+
+
+class InventoryLedger:
+    """
+    In-memory ledger. Writers lock only the stripe their SKU hashes to, so
+    bids on different SKUs never wait on each other; available() is a plain
+    dict read (atomic under the GIL) and takes no lock at all.
+    """
+
+    def __init__(self, stock: Dict[str, float], hold_ttl: float = DEFAULT_HOLD_TTL,
+                 clock=time.time, n_stripes: int = 64):
+        self.hold_ttl = hold_ttl
+        self.clock = clock
+        self._stripes = [threading.Lock() for _ in range(n_stripes)]
+
+        self._on_hand = dict(stock)
+        self._free = dict(stock)                       # on_hand - active holds, kept in step
+        self._holds: Dict[str, Reservation] = {}
+        self._expiry = {sku: [] for sku in stock}      # per-SKU heap of (expires_at, reservation id)
+
+        self.reserved_count = 0
+        self.rejected_count = 0
+        self.expired_count = 0
+
+    def _lock(self, sku_id: str) -> threading.Lock:
+        return self._stripes[hash(sku_id) % len(self._stripes)]
+
+    def __contains__(self, sku_id) -> bool:
+        return sku_id in self._on_hand
+
+    # --- READS ---
+    def available(self, sku_id: str) -> float:
+        """Stock not yet held by another bid."""
+        heap = self._expiry[sku_id]
+        if heap and heap[0][0] <= self.clock():
+            with self._lock(sku_id):
+                self._expire(sku_id, self.clock())
+        return self._free[sku_id]
+
+    def on_hand(self, sku_id: str) -> float:
+        return self._on_hand[sku_id]
+
+    def holds(self, sku_id: Optional[str] = None) -> List[Reservation]:
+        return [h for h in list(self._holds.values()) if sku_id is None or h.sku_id == sku_id]
+
+    # --- WRITES (caller holds the SKU's stripe lock for the _ helpers) ---
+    def _expire(self, sku_id: str, now: float):
+        heap = self._expiry[sku_id]
+        while heap and heap[0][0] <= now:
+            _, res_id = heapq.heappop(heap)
+            hold = self._holds.pop(res_id, None)
+            if hold is not None:  # Already confirmed/released otherwise
+                self._free[sku_id] += hold.qty
+                self.expired_count += 1
+
+    def reserve(self, sku_id: str, qty: float, holder: Optional[str] = None,
+                ttl: Optional[float] = None) -> Optional[Reservation]:
+        """Holds qty of sku_id if that much is free; None otherwise (nothing is held)."""
+        with self._lock(sku_id):
+            now = self.clock()
+            self._expire(sku_id, now)
+            if self._free[sku_id] < qty:
+                self.rejected_count += 1
+                return None
+
+            hold = Reservation(uuid.uuid4().hex, sku_id, qty, holder,
+                               now + (self.hold_ttl if ttl is None else ttl))
+            self._free[sku_id] -= qty
+            self._holds[hold.id] = hold
+            heapq.heappush(self._expiry[sku_id], (hold.expires_at, hold.id))
+            self.reserved_count += 1
+            return hold
+
+    def _take(self, reservation_id: str, deduct: bool) -> bool:
+        hold = self._holds.get(reservation_id)
+        if hold is None:
+            return False
+        with self._lock(hold.sku_id):
+            self._expire(hold.sku_id, self.clock())
+            if self._holds.pop(reservation_id, None) is None:
+                return False
+            if deduct:
+                # Held qty already left _free; now it leaves on-hand too
+                self._on_hand[hold.sku_id] -= hold.qty
+            else:
+                self._free[hold.sku_id] += hold.qty
+            return True
+
+    def confirm(self, reservation_id: str) -> bool:
+        """Turns a live hold into a stock deduction. False if it expired or is unknown."""
+        return self._take(reservation_id, deduct=True)
+
+    def release(self, reservation_id: str) -> bool:
+        return self._take(reservation_id, deduct=False)
+
+    def set_on_hand(self, sku_id: str, qty: float):
+        """New stock figure from the ERP; active holds stay in place."""
+        with self._lock(sku_id):
+            held = self._on_hand.get(sku_id, qty) - self._free.get(sku_id, qty)
+            self._on_hand[sku_id] = qty
+            self._free[sku_id] = qty - held
+            self._expiry.setdefault(sku_id, [])
+
+    def expire_holds(self) -> int:
+        """Sweeps every SKU; returns how many holds lapsed."""
+        before = self.expired_count
+        now = self.clock()
+        for sku_id in list(self._expiry):
+            with self._lock(sku_id):
+                self._expire(sku_id, now)
+        return self.expired_count - before
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "skus": len(self._on_hand),
+            "active_holds": len(self._holds),
+            "reserved": self.reserved_count,
+            "rejected": self.rejected_count,
+            "expired": self.expired_count,
+        }
+
+
+class SQLiteInventoryLedger:
+    """
+    Same interface, backed by one SQLite file so separate worker processes
+    share stock. Each write is a short BEGIN IMMEDIATE transaction (the
+    check and the hold happen under the same write lock); WAL mode keeps
+    available() readers from blocking on writers.
+    """
+
+    def __init__(self, db_path: str, stock: Optional[Dict[str, float]] = None,
+                 hold_ttl: float = DEFAULT_HOLD_TTL, clock=time.time, timeout: float = 30.0):
+        self.db_path = db_path
+        self.hold_ttl = hold_ttl
+        self.clock = clock
+        self.timeout = timeout
+        self._local = threading.local()  # sqlite3 connections are per thread
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS stock (sku_id TEXT PRIMARY KEY, on_hand REAL NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS holds (id TEXT PRIMARY KEY, sku_id TEXT NOT NULL, "
+                     "qty REAL NOT NULL, holder TEXT, expires_at REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS holds_by_sku ON holds (sku_id, expires_at)")
+        if stock:
+            # OR IGNORE: the first process to open the file seeds it, later ones don't reset it
+            conn.executemany("INSERT OR IGNORE INTO stock VALUES (?, ?)", stock.items())
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def _write(self, fn):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+            conn.execute("COMMIT")
+            return result
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def __contains__(self, sku_id) -> bool:
+        return self._conn().execute("SELECT 1 FROM stock WHERE sku_id = ?", (sku_id,)).fetchone() is not None
+
+    # --- READS ---
+    def available(self, sku_id: str) -> float:
+        row = self._conn().execute(
+            "SELECT on_hand - COALESCE((SELECT SUM(qty) FROM holds WHERE sku_id = ? AND expires_at > ?), 0) "
+            "FROM stock WHERE sku_id = ?", (sku_id, self.clock(), sku_id)).fetchone()
+        if row is None:
+            raise KeyError(sku_id)
+        return row[0]
+
+    def on_hand(self, sku_id: str) -> float:
+        row = self._conn().execute("SELECT on_hand FROM stock WHERE sku_id = ?", (sku_id,)).fetchone()
+        if row is None:
+            raise KeyError(sku_id)
+        return row[0]
+
+    def holds(self, sku_id: Optional[str] = None) -> List[Reservation]:
+        sql, args = "SELECT id, sku_id, qty, holder, expires_at FROM holds WHERE expires_at > ?", [self.clock()]
+        if sku_id is not None:
+            sql += " AND sku_id = ?"
+            args.append(sku_id)
+        return [Reservation(*row) for row in self._conn().execute(sql, args)]
+
+    # --- WRITES ---
+    def reserve(self, sku_id: str, qty: float, holder: Optional[str] = None,
+                ttl: Optional[float] = None) -> Optional[Reservation]:
+        now = self.clock()
+        hold = Reservation(uuid.uuid4().hex, sku_id, qty, holder,
+                           now + (self.hold_ttl if ttl is None else ttl))
+
+        def txn(conn):
+            conn.execute("DELETE FROM holds WHERE sku_id = ? AND expires_at <= ?", (sku_id, now))
+            free = conn.execute(
+                "SELECT on_hand - COALESCE((SELECT SUM(qty) FROM holds WHERE sku_id = ?), 0) "
+                "FROM stock WHERE sku_id = ?", (sku_id, sku_id)).fetchone()
+            if free is None:
+                raise KeyError(sku_id)
+            if free[0] < qty:
+                return None
+            conn.execute("INSERT INTO holds VALUES (?, ?, ?, ?, ?)", hold)
+            return hold
+
+        return self._write(txn)
+
+    def confirm(self, reservation_id: str) -> bool:
+        def txn(conn):
+            row = conn.execute("SELECT sku_id, qty FROM holds WHERE id = ? AND expires_at > ?",
+                               (reservation_id, self.clock())).fetchone()
+            if row is None:
+                return False
+            conn.execute("UPDATE stock SET on_hand = on_hand - ? WHERE sku_id = ?", (row[1], row[0]))
+            conn.execute("DELETE FROM holds WHERE id = ?", (reservation_id,))
+            return True
+
+        return self._write(txn)
+
+    def release(self, reservation_id: str) -> bool:
+        def txn(conn):
+            cur = conn.execute("DELETE FROM holds WHERE id = ? AND expires_at > ?", (reservation_id, self.clock()))
+            return cur.rowcount > 0
+
+        return self._write(txn)
+
+    def set_on_hand(self, sku_id: str, qty: float):
+        self._write(lambda conn: conn.execute(
+            "INSERT INTO stock VALUES (?, ?) ON CONFLICT(sku_id) DO UPDATE SET on_hand = excluded.on_hand",
+            (sku_id, qty)))
+
+    def expire_holds(self) -> int:
+        return self._write(lambda conn: conn.execute(
+            "DELETE FROM holds WHERE expires_at <= ?", (self.clock(),)).rowcount)
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        return {
+            "backend": "sqlite",
+            "db_path": self.db_path,
+            "skus": conn.execute("SELECT COUNT(*) FROM stock").fetchone()[0],
+            "active_holds": conn.execute("SELECT COUNT(*) FROM holds WHERE expires_at > ?",
+                                         (self.clock(),)).fetchone()[0],
+        }
+
+
+def open_ledger(records_list=None, db_path: Optional[str] = DEFAULT_LEDGER_DB,
+                hold_ttl: float = DEFAULT_HOLD_TTL):
+    """Ledger seeded from the catalog records; SQLite-backed when db_path is given."""
+    if records_list is None:
+        from setup_data import DATASHEET_RECORDS
+        records_list = DATASHEET_RECORDS
+    stock = _stock_from_records(records_list)
+    if db_path:
+        return SQLiteInventoryLedger(db_path, stock, hold_ttl=hold_ttl)
+    return InventoryLedger(stock, hold_ttl=hold_ttl)
+
+
+# ==========================================
+# PROCESS-WIDE LEDGER
+# ==========================================
+_LEDGER = None
+_LEDGER_LOCK = threading.Lock()
+
+
+def get_ledger(db_path: Optional[str] = DEFAULT_LEDGER_DB):
+    """Returns the process-wide ledger (created on first call)."""
+    global _LEDGER
+    if _LEDGER is None:
+        with _LEDGER_LOCK:
+            if _LEDGER is None:
+                _LEDGER = open_ledger(db_path=db_path)
+    return _LEDGER
+
+
+def reset_ledger():
+    global _LEDGER
+    with _LEDGER_LOCK:
+        _LEDGER = None
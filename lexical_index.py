@@ -0,0 +1,192 @@
+import os
+import re
+import numpy as np
+from collections import Counter
+from typing import Dict, Any, Iterable, List, Optional, Sequence
+
+# ==========================================
+# LEXICAL INDEX (BM25 over SKU_ID + Spec_Description)
+# ==========================================
+# The dense model is good at "roughly this kind of cable" and bad at exact
+# tokens: a quoted SKU code, "3.5C", "XLPO", "33kV". This inverted index
+# scores those exactly, in microseconds, with no encoder call.
+#
+# Both sides go through the same normalizer, so "33 kV" / "33kV" / a spec's
+# Voltage 33.0 all become the token "33kv", "4-Core" / "4C" / Cores 4 -> "4c",
+# "Aluminium" / "AL" -> "aluminum". A SKU_ID is indexed whole (an exact code
+# is the rarest, highest-IDF token there is) and by its parts.
+#
+# TechnicalAgent uses it two ways:
+#   - ranking: Spec_Match_% first, BM25 breaks its ties, vector distance the rest
+#   - fast path: when the spec quotes a catalog SKU_ID and Spec_Match_% + BM25
+#     already fix the top-k (no tie on both at the cut-off or inside it), the
+#     vector search could not change the answer, so the encoder and FAISS are skipped
+#   - fusion: otherwise the dense and lexical shortlists are merged by
+#     reciprocal rank before the rule-based re-sort
+
+# STRATABID_LEXICAL_FAST_PATH=1 takes the fast path for every settled spec, quoted
+# code or not. Catalog-style specs almost always settle, so that skips the encoder,
+# prefilter and FAISS for nearly all traffic (and their matches carry no distance):
+# cheaper, but rankings then never see the vector search. Off by default.
+FAST_PATH_ALL = os.environ.get("STRATABID_LEXICAL_FAST_PATH", "0") == "1"
+
+# Okapi BM25 parameters (the usual defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Reciprocal-rank fusion constant: score = sum over rankings of 1 / (RRF_K + rank)
+RRF_K = 60
+
+_UNITS = [
+    (re.compile(r"(\d+(?:\.\d+)?)\s*-?\s*kv\b"), r"\1kv"),
+    (re.compile(r"(\d+(?:\.\d+)?)\s*-?\s*(?:cores?|c)\b"), r"\1c"),
+    (re.compile(r"\bfire\s*retardant\b|\bfrls\b"), "fr"),
+]
+_WORD = re.compile(r"\d+(?:\.\d+)?[a-z]*|[a-z][a-z0-9]*")
+_SYNONYMS = {"aluminium": "aluminum", "al": "aluminum", "cu": "copper"}
+
+
+def tokens(text: str) -> List[str]:
+    """Normalized lexical tokens of free text (descriptions, RFP phrases)."""
+    text = str(text or "").lower()
+    for pattern, repl in _UNITS:
+        text = pattern.sub(repl, text)
+    return [_SYNONYMS.get(t, t) for t in _WORD.findall(text)]
+
+
+def sku_tokens(sku_id: str) -> List[str]:
+    """The whole code plus its parts; in catalog codes the number right after <cores>C is the kV grade."""
+    code = str(sku_id or "").lower()
+    parts = []
+    for part in code.split("-"):
+        if parts and re.fullmatch(r"\d+(?:\.\d+)?c", parts[-1]) and re.fullmatch(r"\d+(?:\.\d+)?", part):
+            parts.append(f"{part}kv")
+        else:
+            parts.extend(tokens(part))
+    return [code] + parts if code else parts
+
+
+def _num(value) -> str:
+    return f"{float(value):g}"
+
+
+def spec_query(rfp_spec: Dict[str, Any]) -> List[str]:
+    """Lexical query for a parsed spec: its fields in index vocabulary, plus a quoted SKU_ID."""
+    q = []
+    if rfp_spec.get("SKU_ID"):
+        q.append(str(rfp_spec["SKU_ID"]).lower())
+    if rfp_spec.get("Voltage"):
+        q.append(_num(rfp_spec["Voltage"]) + "kv")
+    if rfp_spec.get("Cores"):
+        q.append(_num(rfp_spec["Cores"]) + "c")
+    for field in ("Conductor_Material", "Insulation_Type"):
+        if rfp_spec.get(field):
+            q.extend(tokens(rfp_spec[field]))
+    if rfp_spec.get("Fire_Retardant"):
+        q.append("fr")
+    return q
+
+
+class LexicalIndex:
+    """
+    Immutable BM25 index over catalog rows (row i = FAISS id i). Postings
+    store each term's finished BM25 weight, so scoring a query is one
+    scatter-add per query term.
+    """
+
+    def __init__(self, records):
+        n = len(records)
+        rows = range(n)
+        skus = records.values("SKU_ID", rows) if n else []
+        descriptions = records.values("Spec_Description", rows) if n else []
+
+        counts = [Counter(sku_tokens(s) + tokens(d)) for s, d in zip(skus, descriptions)]
+        doc_len = np.array([sum(c.values()) for c in counts], dtype=np.float64)
+        avg_len = float(doc_len.mean()) if n else 0.0
+
+        postings: Dict[str, List] = {}
+        for row, c in enumerate(counts):
+            for term, tf in c.items():
+                postings.setdefault(term, []).append((row, tf))
+
+        self.num_rows = n
+        self.vocab: Dict[str, int] = {}
+        self._rows: List[np.ndarray] = []
+        self._weights: List[np.ndarray] = []
+        norm = BM25_K1 * (1.0 - BM25_B + BM25_B * doc_len / avg_len) if n else doc_len
+        for term, plist in postings.items():
+            r = np.array([p[0] for p in plist], dtype=np.int64)
+            tf = np.array([p[1] for p in plist], dtype=np.float64)
+            idf = np.log(1.0 + (n - len(r) + 0.5) / (len(r) + 0.5))
+            self.vocab[term] = len(self._rows)
+            self._rows.append(r)
+            self._weights.append(idf * tf * (BM25_K1 + 1.0) / (tf + norm[r]))
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    def score(self, query: Iterable[str]) -> np.ndarray:
+        """BM25 of every row for a token list (repeated tokens count once)."""
+        out = np.zeros(self.num_rows, dtype=np.float64)
+        for term in set(query):
+            t = self.vocab.get(term)
+            if t is not None:
+                out[self._rows[t]] += self._weights[t]  # A term's rows are unique, so no np.add.at needed
+        return out
+
+    def score_many(self, queries: Sequence[Iterable[str]]) -> np.ndarray:
+        """(n_queries, n_rows) BM25 matrix."""
+        out = np.zeros((len(queries), self.num_rows), dtype=np.float64)
+        for i, q in enumerate(queries):
+            out[i] = self.score(q)
+        return out
+
+    def search(self, query: Iterable[str], k: int = 10) -> List[int]:
+        """Rows of the k best BM25 matches, best first."""
+        return top_rows(self.score(query), k)
+
+
+def top_rows(scores: np.ndarray, k: int) -> List[int]:
+    """Rows of the k highest positive BM25 scores, best first."""
+    hits = np.flatnonzero(scores > 0)
+    if len(hits) > k:
+        hits = hits[np.argpartition(-scores[hits], k - 1)[:k]] if k > 0 else hits[:0]
+    return hits[np.lexsort((hits, -scores[hits]))].tolist()
+
+
+def best_rows(scores: np.ndarray, lexical: np.ndarray, k: int) -> np.ndarray:
+    """The k best rows by (Spec_Match_%, BM25), best first; partitions instead of sorting the catalog."""
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if n > k:
+        kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        rows = np.flatnonzero(scores >= kth)  # Everything tied with the k-th competes on BM25
+    else:
+        rows = np.arange(n)
+    return rows[np.lexsort((rows, -lexical[rows], -scores[rows]))][:k]
+
+
+def settled_top_k(scores: np.ndarray, lexical: np.ndarray, k: int) -> Optional[np.ndarray]:
+    """
+    best_rows(scores, lexical, k) when Spec_Match_% (scores) plus BM25 decide
+    them on their own: the k-th row beats every row left out, and no two rows
+    in the top-k tie on both. None when vector distance could still change the answer.
+    """
+    k = min(k, len(scores))
+    top = best_rows(scores, lexical, k + 1)
+    if k == 0 or not np.isfinite(scores[top[k - 1]]):
+        return None
+    s, lex = scores[top], lexical[top]
+    if np.any((s[1:] == s[:-1]) & (lex[1:] == lex[:-1])):
+        return None  # A tie only the vector search can break
+    return top[:k]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = RRF_K) -> Dict[int, float]:
+    """{item: sum of 1 / (k + rank)} over best-first rankings (rank starts at 1)."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (k + rank)
+    return fused
@@ -0,0 +1,97 @@
+import numpy as np
+from typing import Dict, Any, Iterable, List, Optional, Sequence, Tuple
+
+# ==========================================
+# VECTORIZED PRICING ENGINE
+# ==========================================
+# Prices N candidate SKUs x M quantities in one array pass:
+#   1. billed metres   = quantity rounded UP to whole drums (per-SKU drum length)
+#   2. unit price      = Base_Price_per_m less the volume-break discount of the billed metres
+#   3. material price  = unit price x billed metres
+#   4. services        = each distinct test charged once (duplicates in tests_required ignored)
+# A what-if sweep over quantities is just a wider M, so a full price curve
+# costs the same single pass as one quote.
+
+# (min billed metres, discount) - must start at 0 and be sorted
+Tiers = Sequence[Tuple[float, float]]
+
+
+def parse_tiers(text: Optional[str]) -> Optional[List[Tuple[float, float]]]:
+    """ "5000:0.03,10000:0.06" -> [(0, 0.0), (5000, 0.03), (10000, 0.06)]; empty/None = no tiers."""
+    if not text or not text.strip():
+        return None
+    tiers = {0.0: 0.0}
+    for part in text.split(","):
+        metres, _, rate = part.partition(":")
+        try:
+            tiers[float(metres)] = float(rate)
+        except ValueError:
+            raise ValueError(f"volume tier {part.strip()!r} is not <min metres>:<discount>")
+    return sorted(tiers.items())
+
+
+def unique_tests(tests_required: Iterable[str]) -> List[str]:
+    """Order-preserving dedup: asking for 'Type Test' twice doesn't bill it twice."""
+    return list(dict.fromkeys(t for t in tests_required if t))
+
+
+def services_price(tests_required: Iterable[str], tests_pricing: Dict[str, float]) -> float:
+    return float(sum(tests_pricing.get(t, 0) for t in unique_tests(tests_required)))
+
+
+def billed_metres(quantities, drum_lengths) -> np.ndarray:
+    """Metres rounded UP to whole drums (drum length <= 0 = no rounding). Broadcasts."""
+    q = np.asarray(quantities, dtype=np.float64)
+    drums = np.asarray(drum_lengths, dtype=np.float64)
+    rounded = np.ceil(q / np.where(drums > 0, drums, 1.0)) * drums
+    return np.where(drums > 0, rounded, q)
+
+
+def discount_rates(billed: np.ndarray, tiers: Optional[Tiers]) -> np.ndarray:
+    """Volume-break discount (fraction) for every billed quantity."""
+    if not tiers:
+        return np.zeros_like(billed)
+    breaks = np.array([t[0] for t in tiers], dtype=np.float64)
+    rates = np.array([t[1] for t in tiers], dtype=np.float64)
+    idx = np.searchsorted(breaks, billed, side="right") - 1
+    return np.where(idx >= 0, rates[np.clip(idx, 0, None)], 0.0)
+
+
+def _price(base, quantities, drums, tiers, services) -> Dict[str, np.ndarray]:
+    billed = billed_metres(quantities, drums)
+    discount = discount_rates(billed, tiers)
+    unit = base * (1.0 - discount)
+    material = unit * billed
+    return {
+        "Billed_m": billed,
+        "Discount": discount,
+        "Unit_Price": unit,
+        "Material_Price": material,
+        "Total_Price": material + services,
+    }
+
+
+def price_grid(base_prices: Sequence[float], quantities: Sequence[float], drum_lengths,
+               tiers: Optional[Tiers] = None, services: float = 0.0) -> Dict[str, np.ndarray]:
+    """
+    Every SKU at every quantity. base_prices / drum_lengths are per SKU (N,),
+    quantities (M,). Returns (N, M) arrays: Billed_m, Discount, Unit_Price,
+    Material_Price, Total_Price.
+    """
+    base = np.asarray(base_prices, dtype=np.float64).reshape(-1, 1)
+    drums = np.broadcast_to(np.asarray(drum_lengths, dtype=np.float64), (base.shape[0],)).reshape(-1, 1)
+    q = np.asarray(quantities, dtype=np.float64).reshape(1, -1)
+    return _price(base, q, drums, tiers, services)
+
+
+def price_pairs(base_prices: Sequence[float], quantities: Sequence[float], drum_lengths,
+                tiers: Optional[Tiers] = None, services: float = 0.0) -> Dict[str, np.ndarray]:
+    """Like price_grid, but SKU i is priced only at quantities[i] -> (N,) arrays."""
+    base = np.asarray(base_prices, dtype=np.float64)
+    return _price(base, np.asarray(quantities, dtype=np.float64), drum_lengths, tiers, services)
+
+
+def quantity_grid(center: float, points: int = 50, low: float = 0.25, high: float = 4.0) -> np.ndarray:
+    """Quantities from low x to high x the requested metres, for what-if sweeps."""
+    center = max(float(center), 1.0)
+    return np.unique(np.round(np.geomspace(center * low, center * high, points)))
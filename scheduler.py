@@ -0,0 +1,198 @@
+import heapq
+import itertools
+import threading
+import time
+import datetime
+import sys
+import pandas as pd
+from typing import Dict, Any, Callable, Iterator, List, Optional
+
+# ==========================================
+# DEADLINE-AWARE TENDER SCHEDULER
+# ==========================================
+# Two lanes, each a heap:
+#   on-time lane -> Earliest Deadline First; ties go to higher value per second of work
+#   late lane    -> tenders that can no longer make their due_date (or are below
+#                   min_value). Only served when nothing on-time is waiting,
+#                   highest value first.
+# Lanes are re-checked lazily at dispatch: a tender whose slack ran out while
+# queued drops to the late lane instead of taking a worker from one that can still make it.
+
+ON_TIME, LATE = 0, 1
+
+# Starting guess for processing cost until real timings come in (seconds per 1k chars)
+DEFAULT_SECONDS_PER_KCHAR = 0.05
+
+
+def to_epoch(due_date) -> Optional[float]:
+    """due_date (str / datetime / pd.Timestamp / epoch) -> epoch seconds. Naive times are local; blank/NaN -> None."""
+    if due_date is None or due_date == "" or (not isinstance(due_date, str) and pd.isna(due_date)):
+        return None
+    if isinstance(due_date, (int, float)):
+        return float(due_date)
+    ts = pd.Timestamp(due_date)
+    if ts.tzinfo is None:
+        return ts.to_pydatetime().timestamp()
+    return ts.timestamp()
+
+
+class TenderScheduler:
+    def __init__(self, workers: int = 1, min_value: float = 0.0,
+                 clock: Callable[[], float] = time.time, ewma_alpha: float = 0.2):
+        self.workers = max(1, workers)
+        self.min_value = min_value
+        self.clock = clock
+        self.ewma_alpha = ewma_alpha
+        self.seconds_per_kchar = DEFAULT_SECONDS_PER_KCHAR
+
+        self._lanes = {ON_TIME: [], LATE: []}
+        self._seq = itertools.count()  # FIFO tie-break, keeps heap entries comparable
+        self._lock = threading.Lock()
+
+        self.submitted = 0
+        self.completed = 0
+        self.demoted = 0
+
+    # --- COST / VALUE MODEL ---
+    def _size_kchars(self, rfp: Dict[str, Any]) -> float:
+        text = rfp.get("text") or ""
+        return max(1.0, len(text) / 1000.0)
+
+    def estimate_cost(self, rfp: Dict[str, Any]) -> float:
+        """Expected processing seconds, from an EWMA of observed seconds per 1k chars."""
+        return self.seconds_per_kchar * self._size_kchars(rfp)
+
+    def _value(self, rfp: Dict[str, Any]) -> float:
+        """Bid value; missing or blank (e.g. an empty CSV cell) -> 1.0, an explicit 0 stays 0."""
+        value = rfp.get("value")
+        if value is None or (isinstance(value, str) and not value.strip()):
+            return 1.0
+        try:
+            value = float(value)
+        except (ValueError, TypeError) as exc:
+            print(f"⚠️ RFP {rfp.get('id')}: ignoring unparseable value {value!r} ({exc})", file=sys.stderr)
+            return 1.0
+        if value != value:  # NaN (pandas blank) can't be ordered in the heaps
+            return 1.0
+        return value
+
+    def _due(self, rfp: Dict[str, Any]) -> Optional[float]:
+        """Deadline in epoch seconds; an unparseable due_date is queued as no deadline instead of failing submit."""
+        try:
+            return to_epoch(rfp.get("due_date"))
+        except (ValueError, TypeError, OverflowError) as exc:
+            print(f"⚠️ RFP {rfp.get('id')}: ignoring unparseable due_date {rfp.get('due_date')!r} ({exc})",
+                  file=sys.stderr)
+            return None
+
+    def complete(self, rfp: Dict[str, Any], elapsed_seconds: float):
+        """Feeds an observed processing time back into the cost model."""
+        rate = elapsed_seconds / self._size_kchars(rfp)
+        with self._lock:
+            self.seconds_per_kchar += self.ewma_alpha * (rate - self.seconds_per_kchar)
+            self.completed += 1
+
+    # --- QUEUE ---
+    def _entry(self, lane: int, job: Dict[str, Any]):
+        if lane == ON_TIME:
+            key = (job["due"] if job["due"] is not None else float("inf"), -job["value"] / job["cost"])
+        else:
+            key = (-job["value"], job["due"] if job["due"] is not None else float("inf"))
+        return key + (next(self._seq), job)
+
+    def _lane_for(self, job: Dict[str, Any], now: float) -> int:
+        if job["value"] < self.min_value:
+            return LATE
+        if job["due"] is not None and now + job["cost"] > job["due"]:
+            return LATE
+        return ON_TIME
+
+    def submit(self, rfp: Dict[str, Any]):
+        job = {
+            "rfp": rfp,
+            "id": rfp.get("id"),
+            "due": self._due(rfp),
+            "value": self._value(rfp),
+            "cost": max(self.estimate_cost(rfp), 1e-6),
+        }
+        with self._lock:
+            lane = self._lane_for(job, self.clock())
+            heapq.heappush(self._lanes[lane], self._entry(lane, job))
+            self.submitted += 1
+
+    def next_job(self) -> Optional[Dict[str, Any]]:
+        """Pops the RFP that should run next (None when the queue is empty)."""
+        with self._lock:
+            now = self.clock()
+            on_time = self._lanes[ON_TIME]
+            while on_time:
+                job = heapq.heappop(on_time)[-1]
+                if self._lane_for(job, now) == ON_TIME:
+                    return job["rfp"]
+                # Slack ran out while queued -> demote
+                heapq.heappush(self._lanes[LATE], self._entry(LATE, job))
+                self.demoted += 1
+
+            late = self._lanes[LATE]
+            if late:
+                return heapq.heappop(late)[-1]["rfp"]
+            return None
+
+    def drain(self) -> Iterator[Dict[str, Any]]:
+        """Yields queued RFPs in priority order; re-prioritizes on every pull."""
+        while True:
+            rfp = self.next_job()
+            if rfp is None:
+                return
+            yield rfp
+
+    # --- OBSERVABILITY ---
+    def queue_depth(self) -> Dict[str, int]:
+        with self._lock:
+            on_time, late = len(self._lanes[ON_TIME]), len(self._lanes[LATE])
+        return {"on_time": on_time, "late": late, "total": on_time + late}
+
+    def forecast(self) -> List[Dict[str, Any]]:
+        """
+        Expected start/completion of every queued tender if dispatched in priority
+        order to `workers` parallel workers (list scheduling on current cost estimates).
+        """
+        now = self.clock()
+        with self._lock:
+            ordered = [(ON_TIME, e) for e in sorted(self._lanes[ON_TIME])] + \
+                      [(LATE, e) for e in sorted(self._lanes[LATE])]
+
+        free_at = [now] * self.workers
+        plan = []
+        for lane, entry in ordered:
+            job = entry[-1]
+            start = heapq.heappop(free_at)
+            finish = start + job["cost"]
+            heapq.heappush(free_at, finish)
+            plan.append({
+                "id": job["id"],
+                "lane": "on_time" if lane == ON_TIME else "late",
+                "due": _fmt(job["due"]),
+                "expected_start": _fmt(start),
+                "expected_completion": _fmt(finish),
+                "meets_deadline": job["due"] is None or finish <= job["due"],
+            })
+        return plan
+
+    def stats(self) -> Dict[str, Any]:
+        plan = self.forecast()
+        return {
+            "queue_depth": self.queue_depth(),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "demoted_to_late": self.demoted,
+            "at_risk": sum(1 for p in plan if not p["meets_deadline"]),
+            "drain_eta": max(p["expected_completion"] for p in plan) if plan else None,
+            "seconds_per_kchar": round(self.seconds_per_kchar, 5),
+        }
+
+
+def _fmt(epoch: Optional[float]) -> Optional[str]:
+    if epoch is None:
+        return None
+    return datetime.datetime.fromtimestamp(epoch).isoformat(timespec="seconds")
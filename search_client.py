@@ -0,0 +1,156 @@
+import os
+import json
+import socket
+import struct
+import threading
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
+
+# ==========================================
+# SEARCH DAEMON CLIENT + WIRE FORMAT
+# ==========================================
+# Every Streamlit replica and batch worker used to load its own
+# SentenceTransformer, FAISS index and catalog. search_daemon.py owns ONE copy
+# and serves it over a Unix socket; SearchClient is what a process holds
+# instead, so per-worker memory no longer grows with the model or the catalog.
+#
+#   python search_daemon.py --socket /tmp/stratabid-search.sock
+#   STRATABID_SEARCH_SOCKET=/tmp/stratabid-search.sock python batch_runner.py tenders.jsonl --workers 16
+#
+# With STRATABID_SEARCH_SOCKET set, TechnicalAgent() becomes a thin client
+# (see TechnicalAgent.__init__). This module only needs the stdlib and numpy,
+# so importing it never pulls in torch or faiss.
+#
+# Frame (both directions): 4-byte big-endian header length, a JSON header,
+# then - when header["array"] = {"dtype", "shape"} - the raw array bytes.
+# Vectors travel as bytes, everything else as JSON.
+
+DEFAULT_SEARCH_SOCKET = os.environ.get("STRATABID_SEARCH_SOCKET") or None
+
+MAX_FRAME_BYTES = 256 << 20
+_HEADER_LEN = struct.Struct(">I")
+
+
+class SearchDaemonError(RuntimeError):
+    """The daemon answered with an error (including "overloaded"), or could not be reached."""
+
+
+def pack_frame(header: Dict[str, Any], array: Optional[np.ndarray] = None) -> bytes:
+    payload = b""
+    if array is not None:
+        array = np.ascontiguousarray(array)
+        header = dict(header, array={"dtype": array.dtype.str, "shape": list(array.shape)})
+        payload = array.tobytes()
+    head = json.dumps(header, default=str).encode("utf-8")
+    return _HEADER_LEN.pack(len(head)) + head + payload
+
+
+def unpack_array(header: Dict[str, Any], payload: bytes) -> Optional[np.ndarray]:
+    meta = header.get("array")
+    if meta is None:
+        return None
+    return np.frombuffer(payload, dtype=np.dtype(meta["dtype"])).reshape(meta["shape"])
+
+
+def array_nbytes(header: Dict[str, Any]) -> int:
+    meta = header.get("array")
+    if meta is None:
+        return 0
+    return int(np.dtype(meta["dtype"]).itemsize * np.prod(meta["shape"], dtype=np.int64))
+
+
+def _recv_exactly(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray(n)
+    view, got = memoryview(buf), 0
+    while got < n:
+        read = sock.recv_into(view[got:])
+        if not read:
+            raise ConnectionError("search daemon closed the connection")
+        got += read
+    return bytes(buf)
+
+
+def read_frame(sock: socket.socket) -> Tuple[Dict[str, Any], Optional[np.ndarray]]:
+    (length,) = _HEADER_LEN.unpack(_recv_exactly(sock, _HEADER_LEN.size))
+    if length > MAX_FRAME_BYTES:
+        raise ConnectionError(f"frame of {length} bytes exceeds MAX_FRAME_BYTES")
+    header = json.loads(_recv_exactly(sock, length))
+    return header, unpack_array(header, _recv_exactly(sock, array_nbytes(header)))
+
+
+class SearchClient:
+    """
+    Blocking client, safe to share between threads (one connection per
+    thread). Calls that fail on a dropped connection are retried once on a
+    fresh one, so a daemon restart costs callers nothing but latency.
+    """
+
+    def __init__(self, path: str = DEFAULT_SEARCH_SOCKET, timeout: Optional[float] = 60.0):
+        if not path:
+            raise ValueError("no search daemon socket given (set STRATABID_SEARCH_SOCKET)")
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _conn(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.path)
+            except OSError as e:
+                sock.close()
+                raise SearchDaemonError(f"search daemon not reachable at {self.path}: {e}") from e
+            self._local.sock = sock
+        return sock
+
+    def _drop(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def call(self, op: str, array: Optional[np.ndarray] = None, **fields) -> Tuple[Dict[str, Any], Optional[np.ndarray]]:
+        frame = pack_frame(dict(fields, op=op), array)
+        for attempt in (1, 2):
+            try:
+                sock = self._conn()
+                sock.sendall(frame)
+                header, out = read_frame(sock)
+                break
+            except (ConnectionError, socket.timeout, BrokenPipeError) as e:
+                self._drop()
+                if attempt == 2:
+                    raise SearchDaemonError(f"{op}: {type(e).__name__}: {e}") from e
+        if header.get("error"):
+            raise SearchDaemonError(header["error"])
+        return header, out
+
+    # --- OPERATIONS ---
+    def search_batch(self, rfp_specs: List[Dict[str, Any]], top_k: int = 3,
+                     prefilter: bool = True) -> List[List[Dict[str, Any]]]:
+        """TechnicalAgent.search_batch() run by the daemon; records come back as plain dicts."""
+        header, _ = self.call("search", specs=rfp_specs, top_k=top_k, prefilter=prefilter)
+        return [[{"record": m["record"], "distance": m["distance"], "Spec_Match_%": m["Spec_Match_%"]}
+                 for m in matches] for matches in header["results"]]
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """(n, d) float32 embeddings from the daemon's model."""
+        _, vectors = self.call("encode", texts=list(texts))
+        return vectors
+
+    def records(self, sku_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Current catalog rows for sku_ids (None where the SKU is gone)."""
+        header, _ = self.call("records", sku_ids=list(sku_ids))
+        return header["records"]
+
+    def catalog_digest(self) -> str:
+        """dedup.catalog_digest() of the daemon's live catalog."""
+        return self.call("digest")[0]["digest"]
+
+    def health(self) -> Dict[str, Any]:
+        return self.call("health")[0]["health"]
+
+    def close(self):
+        self._drop()
@@ -0,0 +1,233 @@
+import os
+import sys
+import json
+import signal
+import asyncio
+import argparse
+import tempfile
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+from agents import TechnicalAgent
+from dedup import catalog_digest
+from engine import MatchingEngine, get_engine
+from search_client import MAX_FRAME_BYTES, _HEADER_LEN, array_nbytes, pack_frame, unpack_array
+from service import MicroBatcher, Overloaded
+from telemetry import get_telemetry, span
+
+# ==========================================
+# SHARED SEARCH DAEMON (one model + index per box)
+# ==========================================
+# Owns the MatchingEngine (encoder, FAISS index, catalog snapshots) and serves
+# it to any number of local processes over a Unix socket (search_client.py has
+# the client and the wire format). Concurrent requests are coalesced the same
+# way service.py does it: every "search" that arrives within max_wait_ms goes
+# through ONE TechnicalAgent.search_batch, every "encode" through ONE model.encode.
+#
+#   python search_daemon.py --socket /tmp/stratabid-search.sock --workers 2
+#
+# Operations: search, encode, records (by SKU_ID), digest, health, metrics.
+# The socket is created mode 0600: only the owning user's processes connect.
+
+DEFAULT_SOCKET_PATH = os.path.join(tempfile.gettempdir(), "stratabid-search.sock")
+
+# Spec fields a search reads -> type they are coerced to (anything else is passed through)
+_NUMERIC_FIELDS = ("Voltage", "Cores", "Quantity_m")
+_TEXT_FIELDS = ("Conductor_Material", "Insulation_Type", "SKU_ID")
+
+
+def _clean_spec(spec: Any) -> Dict[str, Any]:
+    """Coerces one client spec to the types search_batch expects; ValueError names the bad field."""
+    if not isinstance(spec, dict):
+        raise ValueError("each spec must be an object")
+    spec = dict(spec)
+    for field in _NUMERIC_FIELDS:
+        value = spec.get(field)
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            raise ValueError(f"{field} must be a number")
+        try:
+            spec[field] = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{field} must be a number, got {value!r}")
+        if not np.isfinite(spec[field]):
+            raise ValueError(f"{field} must be finite")
+    for field in _TEXT_FIELDS:
+        value = spec.get(field)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"{field} must be a string")
+    if "Fire_Retardant" in spec:
+        spec["Fire_Retardant"] = bool(spec["Fire_Retardant"])
+    return spec
+
+
+class SearchDaemon:
+    """The engine behind two micro-batchers (search, encode). Start with serve()."""
+
+    def __init__(self, engine: Optional[MatchingEngine] = None, workers: int = 2, max_batch: int = 256,
+                 max_wait_ms: float = 2.0, queue_size: int = 4096):
+        self.engine = (engine or get_engine()).warm_up()
+        self.tech = TechnicalAgent(self.engine)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="search")
+        batcher = dict(max_batch=max_batch, max_wait=max_wait_ms / 1000.0, queue_size=queue_size, concurrency=workers)
+        self.search_batcher = MicroBatcher(self._search_batch, self.executor, **batcher)
+        self.encode_batcher = MicroBatcher(self._encode_batch, self.executor, **batcher)
+        self.connections = 0
+
+    async def start(self):
+        self.search_batcher.start()
+        self.encode_batcher.start()
+
+    async def close(self):
+        await self.search_batcher.stop()
+        await self.encode_batcher.stop()
+        self.executor.shutdown(wait=False)
+
+    # --- BATCH WORK (executor thread) ---
+    def _search_batch(self, requests: List[Dict[str, Any]]) -> List[Any]:
+        """
+        One search_batch per distinct (top_k, prefilter) over every request's specs.
+        If a group fails it is re-run one request at a time, so only the
+        request that caused it gets the error.
+        """
+        with span("daemon.search"):
+            out: List[Any] = [None] * len(requests)
+            groups: Dict[Tuple[int, bool], List[int]] = {}
+            for i, req in enumerate(requests):
+                groups.setdefault((req["top_k"], req["prefilter"]), []).append(i)
+            for (top_k, prefilter), rows in groups.items():
+                specs = [spec for i in rows for spec in requests[i]["specs"]]
+                try:
+                    found = iter(self.tech.search_batch(specs, top_k=top_k, prefilter=prefilter))
+                except Exception:
+                    for i in rows:
+                        try:
+                            out[i] = self._serialize(self.tech.search_batch(requests[i]["specs"], top_k=top_k,
+                                                                            prefilter=prefilter))
+                        except Exception as e:
+                            out[i] = e
+                    continue
+                for i in rows:
+                    out[i] = self._serialize([next(found) for _ in requests[i]["specs"]])
+            return out
+
+    @staticmethod
+    def _serialize(results: List[List[Dict[str, Any]]]) -> List[Any]:
+        return [[{"record": m["record"].to_dict(), "distance": m["distance"], "Spec_Match_%": m["Spec_Match_%"]}
+                 for m in matches] for matches in results]
+
+    def _encode_batch(self, requests: List[List[str]]) -> List[Any]:
+        with span("daemon.encode"):
+            texts = [t for req in requests for t in req]
+            vectors = self.engine.model.encode(texts, convert_to_numpy=True) if texts else None
+            out, offset = [], 0
+            for req in requests:
+                out.append(vectors[offset:offset + len(req)] if req else np.empty((0, 0), dtype="float32"))
+                offset += len(req)
+            return out
+
+    # --- REQUESTS (event loop) ---
+    async def handle(self, header: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[np.ndarray]]:
+        op = header.get("op")
+        if op == "search":
+            specs = header.get("specs")
+            if not isinstance(specs, list):
+                raise ValueError('"specs" must be a list of objects')
+            specs = [_clean_spec(spec) for spec in specs]  # A bad spec fails here, before it is batched
+            req = {"specs": specs, "top_k": int(header.get("top_k", 3)), "prefilter": bool(header.get("prefilter", True))}
+            return {"results": await self.search_batcher.submit(req) if specs else []}, None
+        if op == "encode":
+            texts = header.get("texts")
+            if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                raise ValueError('"texts" must be a list of strings')
+            return {}, await self.encode_batcher.submit(texts)
+        if op == "records":
+            snap = self.engine.snapshot()
+            rows = [snap.row_of_sku.get(str(sku)) for sku in header.get("sku_ids") or []]
+            return {"records": [snap.records[r].to_dict() if r is not None else None for r in rows]}, None
+        if op == "digest":
+            return {"digest": catalog_digest(self.engine.snapshot().live_records())}, None
+        if op == "health":
+            return {"health": self.health()}, None
+        if op == "metrics":
+            return {"metrics": get_telemetry().to_prometheus()}, None
+        raise ValueError(f"unknown op {op!r}")
+
+    def health(self) -> Dict[str, Any]:
+        return {"engine": self.engine.health(), "pid": os.getpid(), "connections": self.connections,
+                "search": self.search_batcher.stats(), "encode": self.encode_batcher.stats()}
+
+
+async def _handle_connection(daemon: SearchDaemon, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    daemon.connections += 1
+    try:
+        while True:
+            try:
+                (length,) = _HEADER_LEN.unpack(await reader.readexactly(_HEADER_LEN.size))
+            except asyncio.IncompleteReadError:
+                break  # Client closed between requests
+            if length > MAX_FRAME_BYTES:
+                break
+            header = json.loads(await reader.readexactly(length))
+            unpack_array(header, await reader.readexactly(array_nbytes(header)))  # No op takes an array yet
+
+            try:
+                reply, array = await daemon.handle(header)
+            except Overloaded as e:
+                reply, array = {"error": f"overloaded: {e}", "overloaded": True}, None
+            except Exception as e:
+                reply, array = {"error": f"{type(e).__name__}: {e}"}, None
+            writer.write(pack_frame(reply, array))
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass  # Client hung up or sent garbage; drop the connection
+    finally:
+        daemon.connections -= 1
+        writer.close()
+
+
+async def serve(path: str = DEFAULT_SOCKET_PATH, **daemon_kwargs):
+    daemon = SearchDaemon(**daemon_kwargs)
+    await daemon.start()
+    if os.path.exists(path):
+        os.unlink(path)  # Stale socket from a previous run
+    old_umask = os.umask(0o177)
+    try:
+        server = await asyncio.start_unix_server(lambda r, w: _handle_connection(daemon, r, w), path)
+    finally:
+        os.umask(old_umask)
+    health = daemon.engine.health()
+    print(f"✅ Search daemon on {path} ({health['index_size']} SKUs, encoder {health['encoder']}, "
+          f"batch ≤{daemon.search_batcher.max_batch}, wait ≤{1000 * daemon.search_batcher.max_wait:g} ms)",
+          file=sys.stderr)
+    # SIGTERM (systemd, docker stop) shuts down like Ctrl-C: the socket file is removed
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await daemon.close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the encoder + FAISS index to local processes over a Unix socket.")
+    parser.add_argument("--socket", default=os.environ.get("STRATABID_SEARCH_SOCKET") or DEFAULT_SOCKET_PATH)
+    parser.add_argument("--workers", type=int, default=2, help="Executor threads = batches in flight")
+    parser.add_argument("--max-batch", type=int, default=256, help="Requests coalesced into one search")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0, help="How long a batch waits to fill up")
+    parser.add_argument("--queue", type=int, default=4096, help="Waiting requests before answering 'overloaded'")
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(serve(args.socket, workers=args.workers, max_batch=args.max_batch,
+                          max_wait_ms=args.max_wait_ms, queue_size=args.queue))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+
+
+if __name__ == "__main__":
+    main()
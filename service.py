@@ -0,0 +1,348 @@
+import sys
+import json
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+from agents import SalesAgent, TechnicalAgent, PricingAgent
+from batch_runner import DEFAULT_TESTS
+from engine import get_engine
+from telemetry import get_telemetry, span
+
+# ==========================================
+# ASYNC MATCHING SERVICE (Micro-Batching)
+# ==========================================
+# An HTTP/JSON front end for ERP integrations, written on asyncio streams (no web
+# framework dependency). Requests that arrive within max_wait_ms of each other
+# are coalesced: the whole batch is parsed, searched with ONE search_batch call
+# (one model.encode + one FAISS search per constraint group) and priced on a
+# bounded thread pool, so the event loop only shuffles bytes.
+#
+#   python service.py --port 8080 --workers 2 --max-batch 64 --max-wait-ms 5
+#
+#   POST /match   {"text": "<rfp text>"} or {"spec": {...}}, optional "top_k"
+#   POST /quote   same, plus optional "tests_required" and "quantity_m"
+#   GET  /health  engine + batcher status
+#   GET  /metrics stage latency histograms (Prometheus text)
+#
+# Backpressure: at most queue_size requests wait for a batch; beyond that the
+# service answers 503 + Retry-After at once instead of queueing without bound.
+
+DEFAULT_PORT = 8080
+MAX_BODY_BYTES = 1 << 20
+MAX_TOP_K = 20
+
+
+class Overloaded(Exception):
+    """The batch queue is full; the caller should retry later."""
+
+
+class MicroBatcher:
+    """
+    Collects submitted items into batches of up to max_batch, waiting at most
+    max_wait seconds after the first one, and runs handler(batch) -> results on
+    the executor. `concurrency` batches can be in flight at once.
+    """
+
+    def __init__(self, handler: Callable[[List[Any]], List[Any]], executor: ThreadPoolExecutor,
+                 max_batch: int = 64, max_wait: float = 0.005, queue_size: int = 1024, concurrency: int = 1):
+        self.handler = handler
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue_size = queue_size
+        self.concurrency = concurrency
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+        self.submitted = 0
+        self.rejected = 0
+        self.batches = 0
+        self.batched_items = 0
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._dispatch()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def submit(self, item: Any) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((item, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise Overloaded(f"{self.queue_size} requests already queued")
+        self.submitted += 1
+        return await future
+
+    async def _next_batch(self) -> List[Tuple[Any, asyncio.Future, float]]:
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        # Whatever else is already waiting rides along for free
+        while len(batch) < self.max_batch and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        telemetry = get_telemetry()
+        while True:
+            batch = await self._next_batch()
+            now = time.perf_counter()
+            for _, _, queued_at in batch:
+                telemetry.observe("service.queue_wait", now - queued_at)
+            self.batches += 1
+            self.batched_items += len(batch)
+
+            try:
+                results = await loop.run_in_executor(self.executor, self.handler, [item for item, _, _ in batch])
+            except Exception as e:
+                results = [e] * len(batch)
+            for (_, future, _), result in zip(batch, results):
+                if future.done():
+                    continue  # Client went away
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "queue_size": self.queue_size,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "mean_batch_size": round(self.batched_items / self.batches, 2) if self.batches else None,
+        }
+
+
+class MatchService:
+    """The agents behind one micro-batcher. Usable in-process (await service.match(...)) or via serve()."""
+
+    def __init__(self, workers: int = 2, max_batch: int = 64, max_wait_ms: float = 5.0, queue_size: int = 1024):
+        self.sales = SalesAgent()
+        self.tech = TechnicalAgent(get_engine().warm_up())
+        self.pricing = PricingAgent.from_config()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="match")
+        self.batcher = MicroBatcher(self._run_batch, self.executor, max_batch=max_batch,
+                                    max_wait=max_wait_ms / 1000.0, queue_size=queue_size, concurrency=workers)
+
+    async def start(self):
+        self.batcher.start()
+
+    async def close(self):
+        await self.batcher.stop()
+        self.executor.shutdown(wait=False)
+
+    # --- REQUEST VALIDATION (event loop; cheap) ---
+    def _request(self, payload: Dict[str, Any], quote: bool) -> Dict[str, Any]:
+        if not isinstance(payload, dict) or not (isinstance(payload.get("text"), str) or isinstance(payload.get("spec"), dict)):
+            raise ValueError('body must be a JSON object with "text" (string) or "spec" (object)')
+        try:
+            top_k = int(payload.get("top_k", 3))
+        except (TypeError, ValueError):
+            raise ValueError("top_k must be an integer")
+        if not 1 <= top_k <= MAX_TOP_K:
+            raise ValueError(f"top_k must be between 1 and {MAX_TOP_K}")
+
+        quantity_m = payload.get("quantity_m")
+        if quantity_m is not None:
+            if isinstance(quantity_m, bool) or not isinstance(quantity_m, (int, float)) or not quantity_m >= 0:
+                raise ValueError("quantity_m must be a non-negative number")
+            quantity_m = float(quantity_m)
+        tests_required = payload.get("tests_required")
+        if tests_required is None:
+            tests_required = DEFAULT_TESTS
+        elif not isinstance(tests_required, list) or not all(isinstance(t, str) for t in tests_required):
+            raise ValueError("tests_required must be a list of test names")
+        return {
+            "text": payload.get("text"),
+            "spec": payload.get("spec"),
+            "top_k": top_k,
+            "quote": quote,
+            "tests_required": tests_required,
+            "quantity_m": quantity_m,
+        }
+
+    async def match(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.batcher.submit(self._request(payload, quote=False))
+
+    async def quote(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.batcher.submit(self._request(payload, quote=True))
+
+    # --- BATCH WORK (executor thread) ---
+    def _run_batch(self, requests: List[Dict[str, Any]]) -> List[Any]:
+        with span("service.batch"):
+            out: List[Any] = [None] * len(requests)
+            specs = {}
+            for i, req in enumerate(requests):
+                try:
+                    specs[i] = self.sales._spec_from_json(req["spec"]) if req["spec"] is not None \
+                        else self.sales.parse_rfp(req["text"])
+                except (TypeError, ValueError) as e:
+                    out[i] = ValueError(f"invalid spec: {e}")
+
+            # One search_batch per distinct top_k (normally just one). If it fails, the
+            # group is retried one request at a time so only the bad request errors.
+            by_k: Dict[int, List[int]] = {}
+            for i in specs:
+                by_k.setdefault(requests[i]["top_k"], []).append(i)
+            for top_k, rows in by_k.items():
+                try:
+                    matches = self.tech.search_batch([specs[i] for i in rows], top_k=top_k)
+                except Exception:
+                    matches = []
+                    for i in rows:
+                        try:
+                            matches.append(self.tech.search(specs[i], top_k=top_k))
+                        except Exception as e:
+                            matches.append(e)
+                for i, item_matches in zip(rows, matches):
+                    if isinstance(item_matches, Exception):
+                        out[i] = item_matches
+                        continue
+                    try:
+                        out[i] = self._response(requests[i], specs[i], item_matches)
+                    except Exception as e:
+                        out[i] = e
+            return out
+
+    def _response(self, req: Dict[str, Any], spec: Dict[str, Any], matches: List[Dict[str, Any]]) -> Dict[str, Any]:
+        body = {
+            "spec": spec,
+            "matches": [{"SKU_ID": m["record"]["SKU_ID"], "Spec_Match_%": m["Spec_Match_%"],
+                         "distance": m["distance"]} for m in matches],
+        }
+        if req["quote"] and matches:
+            qty = req["quantity_m"] if req["quantity_m"] is not None else spec.get("Quantity_m", 0)
+            body["pricing"] = self.pricing.price_tests_and_consolidate(matches, req["tests_required"], qty)["per_product"]
+        return body
+
+    def health(self) -> Dict[str, Any]:
+        return {"engine": get_engine().health(), "batcher": self.batcher.stats()}
+
+
+# ==========================================
+# MINIMAL HTTP/1.1 LAYER (keep-alive, JSON only)
+# ==========================================
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+def _http_response(status: int, body: bytes, content_type: str, keep_alive: bool,
+                   extra_headers: Optional[Dict[str, str]] = None) -> bytes:
+    headers = {
+        "Content-Type": content_type,
+        "Content-Length": str(len(body)),
+        "Connection": "keep-alive" if keep_alive else "close",
+        **(extra_headers or {}),
+    }
+    head = f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n" + "".join(f"{k}: {v}\r\n" for k, v in headers.items())
+    return head.encode("latin-1") + b"\r\n" + body
+
+
+async def _route(service: MatchService, method: str, path: str, body: bytes) -> Tuple[int, Any, Dict[str, str]]:
+    if path == "/health" and method == "GET":
+        return 200, service.health(), {}
+    if path == "/metrics" and method == "GET":
+        return 200, get_telemetry().to_prometheus(), {}
+    if path in ("/match", "/quote"):
+        if method != "POST":
+            return 405, {"error": "use POST"}, {}
+        try:
+            payload = json.loads(body or b"{}")
+            handler = service.match if path == "/match" else service.quote
+            return 200, await handler(payload), {}
+        except Overloaded as e:
+            return 503, {"error": f"overloaded: {e}"}, {"Retry-After": "1"}
+        except ValueError as e:  # Includes malformed JSON
+            return 400, {"error": str(e)}, {}
+        except Exception as e:
+            return 500, {"error": f"{type(e).__name__}: {e}"}, {}
+    return 404, {"error": f"no route for {method} {path}"}, {}
+
+
+async def _handle_connection(service: MatchService, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                break
+            method, target, version = request_line.decode("latin-1").split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                key, _, value = line.decode("latin-1").partition(":")
+                headers[key.strip().lower()] = value.strip()
+
+            keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+            length = int(headers.get("content-length") or 0)
+            if length > MAX_BODY_BYTES:
+                writer.write(_http_response(413, b'{"error": "body too large"}', "application/json", False))
+                break
+            body = await reader.readexactly(length) if length else b""
+
+            status, payload, extra = await _route(service, method, target.split("?", 1)[0], body)
+            if isinstance(payload, str):
+                data, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+            else:
+                data, content_type = json.dumps(payload, default=str).encode("utf-8"), "application/json"
+            writer.write(_http_response(status, data, content_type, keep_alive, extra))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass  # Client hung up or sent garbage; drop the connection
+    finally:
+        writer.close()
+
+
+async def serve(host: str = "127.0.0.1", port: int = DEFAULT_PORT, **service_kwargs):
+    service = MatchService(**service_kwargs)
+    await service.start()
+    server = await asyncio.start_server(lambda r, w: _handle_connection(service, r, w), host, port)
+    print(f"✅ Matching service on http://{host}:{port} "
+          f"(batch ≤{service.batcher.max_batch}, wait ≤{1000 * service.batcher.max_wait:g} ms)", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Async HTTP matching service with micro-batching.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=2, help="Executor threads = batches in flight")
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="How long a batch waits to fill up")
+    parser.add_argument("--queue", type=int, default=1024, help="Waiting requests before answering 503")
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(serve(args.host, args.port, workers=args.workers, max_batch=args.max_batch,
+                          max_wait_ms=args.max_wait_ms, queue_size=args.queue))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
+import os
 import pandas as pd
 import numpy as np
-from sentence_transformers import SentenceTransformer
-import faiss
+
+from pricing import parse_tiers
 
 # --- 1. EXPANDED MOCK DATASHEET REPOSITORY ---
 # We now include a variety of cables: LT (Low Tension), HT (High Tension), Control Cables, etc.
@@ -95,25 +96,58 @@ DATASHEET_RECORDS = [
 ]
 
 # --- 2. SETUP VECTOR DATABASE ---
-def setup_vector_db(records_list=None):
-    """Initializes and returns a FAISS index and the sentence transformer model."""
+# We use a small, fast model for the prototype
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# Embeddings + FAISS index are persisted here and reused across restarts.
+# Set STRATABID_INDEX_DIR to move it (e.g. onto a shared volume).
+DEFAULT_INDEX_DIR = os.environ.get(
+    "STRATABID_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".index_cache")
+)
+
+# FAISS backend: "flat" (exact), "ivf_flat", "hnsw" or "ivf_pq" (see ann_index.py)
+DEFAULT_INDEX_MODE = os.environ.get("STRATABID_INDEX_MODE", "flat")
+
+# Text encoder backend: "torch" (full precision), "int8" or "onnx" (see encoders.py)
+DEFAULT_ENCODER_BACKEND = os.environ.get("STRATABID_ENCODER", "torch")
+
+def setup_vector_db(records_list=None, index_dir=DEFAULT_INDEX_DIR, index_mode=DEFAULT_INDEX_MODE, index_params=None,
+                    encoder_backend=DEFAULT_ENCODER_BACKEND):
+    """
+    Initializes and returns a FAISS index and the sentence transformer model.
+    With an index_dir, unchanged SKUs are loaded from disk and only new/edited
+    Spec_Description rows are re-encoded. Pass index_dir=None to always rebuild in memory.
+    index_params are forwarded to ann_index.build_index (nlist, nprobe, ef_search, pq_m, ...).
+    The returned model is an encoders.Encoder running on encoder_backend.
+    """
+    # Heavy imports (torch, sentence-transformers, faiss) happen here, on first use,
+    # so importing this module for the catalog/sample data stays fast (see import_budget.py)
+    from encoders import load_encoder
+    from index_store import EmbeddingStore
+    from ann_index import INDEX_MODES, build_index
+
+    if index_mode not in INDEX_MODES:
+        raise ValueError(f"Unknown index mode '{index_mode}'. Choose one of {INDEX_MODES}.")
     if records_list is None:
         records_list = DATASHEET_RECORDS
-        
-    df = pd.DataFrame(records_list)
     
-    # We use a small, fast model for the prototype
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+    model = load_encoder(EMBEDDING_MODEL_NAME, encoder_backend)
+
+    if index_dir:
+        store = EmbeddingStore(index_dir, model.cache_name)
+        index, embeddings = store.load_or_build(records_list, model, index_mode, index_params)
+        stats = store.last_stats
+        print(f"✅ Vector Database (FAISS) Initialized with {len(records_list)} diverse SKUs "
+              f"({stats['source']}: {stats['encoded']} encoded, {stats['reused']} reused).")
+        return index, embeddings, model
     
-    descriptions = df['Spec_Description'].tolist()
+    descriptions = [r.get('Spec_Description', '') for r in records_list]
     embeddings = model.encode(descriptions, convert_to_numpy=True)
     
     # Create FAISS index
-    dimension = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dimension)
-    index.add(embeddings)
+    index = build_index(embeddings, index_mode, **(index_params or {}))
     
-    print(f"✅ Vector Database (FAISS) Initialized with {len(df)} diverse SKUs.")
+    print(f"✅ Vector Database (FAISS) Initialized with {len(records_list)} diverse SKUs.")
     return index, embeddings, model
 
 # --- 3. SAMPLE DATA FOR DEMO ---
@@ -142,6 +176,15 @@ TESTS_PRICING = {
     "Drum Packing": 2000.00
 }
 
+# --- OPT-IN PRICING RULES (off by default: quotes bill exact metres at Base_Price_per_m) ---
+# Volume breaks: (min billed metres, discount off Base_Price_per_m), e.g.
+#   STRATABID_VOLUME_TIERS="5000:0.03,10000:0.06,25000:0.10"
+VOLUME_TIERS = parse_tiers(os.environ.get("STRATABID_VOLUME_TIERS"))
+
+# Cable ships on drums; with a drum length, billed metres round up to whole drums
+# (once on, a record's Drum_Length_m overrides it), e.g. STRATABID_DRUM_LENGTH_M=500
+DRUM_LENGTH_M = float(os.environ.get("STRATABID_DRUM_LENGTH_M") or 0.0)
+
 # Mock Registry for "Scanning" mode (if used)
 SAMPLE_RFPS = [
     {"id": "RFP-101", "title": "Metro Rail Cabling", "due_date": pd.Timestamp.now() + pd.Timedelta(days=10), "text": SAMPLE_RFP_TEXT, "tests_required": ["Routine Test"]},
@@ -0,0 +1,352 @@
+import os
+import sys
+import json
+import atexit
+import time
+import bisect
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+# ==========================================
+# STAGE LATENCY SPANS + HISTOGRAMS
+# ==========================================
+# Every agent stage runs inside a named span ("technical.encode", "pricing.consolidate", ...).
+# A span adds its wall time to one process-wide histogram per stage and, when
+# the calling thread has an open Trace, to that bid's own breakdown.
+# Spans nest: "technical.search" includes its encode / faiss / score / rank parts.
+# merge() takes a whole bid's breakdown (e.g. from a worker process): those are
+# per-RFP totals, not single calls, so they go to a separate set of histograms
+# (RFP_METRIC_NAME / "per_rfp") instead of being mixed into the span ones.
+#
+#   from telemetry import get_telemetry
+#   print(get_telemetry().to_prometheus())     # text exposition format
+#   get_telemetry().to_json()                  # count / mean / p50 / p95 / p99 per stage
+#
+# STRATABID_TELEMETRY=0 turns spans into no-ops. STRATABID_PROFILE=<file> runs the
+# sampling profiler for the life of the process and writes folded stacks there on exit.
+
+# Upper bounds (seconds); a stage ranges from ~50us (cached search) to seconds (cold PDF parse)
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_NAME = "stratabid_stage_seconds"
+RFP_METRIC_NAME = "stratabid_rfp_stage_seconds"
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (Prometheus semantics: bucket i counts values <= bounds[i])."""
+
+    def __init__(self, bounds: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # Last slot = +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        i = bisect.bisect_left(self.bounds, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimated like Prometheus' histogram_quantile: linear within the bucket."""
+        with self._lock:
+            counts, total, top = list(self.counts), self.count, self.max
+        if not total:
+            return None
+        rank, seen = q * total, 0
+        for i, c in enumerate(counts):
+            if c and seen + c >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else top
+                return min(lower + (upper - lower) * (rank - seen) / c, top)
+            seen += c
+        return top
+
+    def summary(self) -> Dict[str, Any]:
+        ms = lambda s: round(1000.0 * s, 3) if s is not None else None
+        return {
+            "count": self.count,
+            "total_ms": ms(self.sum),
+            "mean_ms": ms(self.sum / self.count) if self.count else None,
+            "p50_ms": ms(self.quantile(0.50)),
+            "p95_ms": ms(self.quantile(0.95)),
+            "p99_ms": ms(self.quantile(0.99)),
+            "max_ms": ms(self.max),
+        }
+
+
+class Trace:
+    """Per-bid stage breakdown for the thread that opened it: {stage: seconds}."""
+
+    def __init__(self, telemetry: "Telemetry"):
+        self._telemetry = telemetry
+        self.stages: Dict[str, float] = {}
+        self.started = None
+        self.elapsed = None
+
+    def start(self) -> "Trace":
+        self.started = time.perf_counter()
+        self._telemetry._local.trace = self
+        return self
+
+    def stop(self) -> "Trace":
+        if getattr(self._telemetry._local, "trace", None) is self:
+            self._telemetry._local.trace = None
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def as_ms(self) -> Dict[str, float]:
+        return {stage: round(1000.0 * s, 3) for stage, s in self.stages.items()}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class Telemetry:
+    def __init__(self, enabled: bool = True, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self._histograms: Dict[str, Histogram] = {}      # One observation per span
+        self._rfp_histograms: Dict[str, Histogram] = {}  # One observation per RFP (merge)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Thread ident -> innermost open span (what the profiler attributes samples to)
+        self._active: Dict[int, str] = {}
+        self.profiler: Optional["SamplingProfiler"] = None
+
+    def histogram(self, stage: str) -> Histogram:
+        return self._get(self._histograms, stage)
+
+    def rfp_histogram(self, stage: str) -> Histogram:
+        return self._get(self._rfp_histograms, stage)
+
+    def _get(self, histograms: Dict[str, Histogram], stage: str) -> Histogram:
+        h = histograms.get(stage)
+        if h is None:
+            with self._lock:
+                h = histograms.setdefault(stage, Histogram(self.buckets))
+        return h
+
+    def observe(self, stage: str, seconds: float):
+        self.histogram(stage).observe(seconds)
+        trace = getattr(self._local, "trace", None)
+        if trace is not None:
+            trace.add(stage, seconds)
+
+    def merge(self, stages_ms: Dict[str, float]):
+        """Folds one RFP's stage breakdown (Trace.as_ms(), e.g. from a worker process) into the per-RFP histograms."""
+        for stage, ms in stages_ms.items():
+            self.rfp_histogram(stage).observe(ms / 1000.0)
+
+    @contextmanager
+    def _span(self, stage: str):
+        ident = threading.get_ident()
+        outer = self._active.get(ident)
+        self._active[ident] = stage
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+            if outer is None:
+                self._active.pop(ident, None)
+            else:
+                self._active[ident] = outer
+
+    def span(self, stage: str):
+        """Times the enclosed block as `stage` (no-op when telemetry is disabled)."""
+        return self._span(stage) if self.enabled else _NULL_SPAN
+
+    def trace(self) -> Trace:
+        """Collects this thread's stage timings for one bid: `with telemetry.trace() as t: ...; t.as_ms()`."""
+        return Trace(self)
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+            self._rfp_histograms = {}
+
+    # --- EXPORT ---
+    def _snapshot(self, histograms: Dict[str, Histogram]) -> List[Tuple[str, Histogram]]:
+        # Spans in other threads may add stages while we export
+        with self._lock:
+            return sorted(histograms.items())
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        return {stage: h.summary() for stage, h in self._snapshot(self._histograms)}
+
+    def rfp_summary(self) -> Dict[str, Dict[str, Any]]:
+        """Per-RFP stage totals folded in by merge()."""
+        return {stage: h.summary() for stage, h in self._snapshot(self._rfp_histograms)}
+
+    def to_json(self) -> str:
+        return json.dumps({"unit": "ms", "stages": self.summary(), "per_rfp": self.rfp_summary()}, indent=2)
+
+    def to_prometheus(self) -> str:
+        lines = self._prometheus(METRIC_NAME, "Wall time of each agent pipeline stage call.", self._histograms)
+        if self._rfp_histograms:
+            lines += self._prometheus(RFP_METRIC_NAME, "Wall time each RFP spent in a stage (all its calls).",
+                                      self._rfp_histograms)
+        return "\n".join(lines) + "\n"
+
+    def _prometheus(self, name: str, help_text: str, histograms: Dict[str, Histogram]) -> List[str]:
+        lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for stage, h in self._snapshot(histograms):
+            with h._lock:
+                counts, total, count = list(h.counts), h.sum, h.count
+            cumulative = 0
+            for bound, c in zip(h.bounds + (float("inf"),), counts):
+                cumulative += c
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total!r}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+        return lines
+
+    def write(self, path: str):
+        """Writes the histograms to path: Prometheus text for .prom/.txt, JSON otherwise."""
+        text = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    # --- PROFILER TOGGLE ---
+    def start_profiler(self, interval: float = 0.005, spans_only: bool = True) -> "SamplingProfiler":
+        if self.profiler is None or not self.profiler.running:
+            self.profiler = SamplingProfiler(self, interval=interval, spans_only=spans_only).start()
+        return self.profiler
+
+    def stop_profiler(self) -> Optional["SamplingProfiler"]:
+        if self.profiler is not None:
+            self.profiler.stop()
+        return self.profiler
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+# ==========================================
+# SAMPLING PROFILER
+# ==========================================
+# A background thread snapshots every thread's Python stack each `interval`
+# seconds (sys._current_frames), so the profiled code runs at full speed -
+# unlike cProfile, which hooks every call. With spans_only, only threads
+# inside a span are sampled and the span name becomes the root frame, so the
+# flame graph splits by stage. Output is the "folded" format read by
+# flamegraph.pl and speedscope.
+
+class SamplingProfiler:
+    def __init__(self, telemetry: Telemetry, interval: float = 0.005, spans_only: bool = True):
+        self.telemetry = telemetry
+        self.interval = interval
+        self.spans_only = spans_only
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> "SamplingProfiler":
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stratabid-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "SamplingProfiler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            active = dict(self.telemetry._active)
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (self.spans_only and ident not in active):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if ident in active:
+                    stack.append(f"[{active[ident]}]")
+                self.samples[";".join(reversed(stack))] += 1
+
+    def top(self, n: int = 15) -> List[Tuple[str, int, int]]:
+        """(frame, self samples, total samples), hottest self time first."""
+        own, total = Counter(), Counter()
+        for stack, count in self.samples.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        return [(frame, c, total[frame]) for frame, c in own.most_common(n)]
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+    def write_folded(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.folded())
+
+
+# --- PROCESS-WIDE SINGLETON ---
+_TELEMETRY = None
+_TELEMETRY_LOCK = threading.Lock()
+
+
+def get_telemetry() -> Telemetry:
+    """Returns the process-wide telemetry registry (starts the profiler if STRATABID_PROFILE is set)."""
+    global _TELEMETRY
+    if _TELEMETRY is None:
+        with _TELEMETRY_LOCK:
+            if _TELEMETRY is None:
+                telemetry = Telemetry(enabled=os.environ.get("STRATABID_TELEMETRY", "1") != "0")
+                profile_path = os.environ.get("STRATABID_PROFILE")
+                if profile_path:
+                    telemetry.start_profiler()
+                    atexit.register(lambda: telemetry.stop_profiler().write_folded(profile_path))
+                _TELEMETRY = telemetry
+    return _TELEMETRY
+
+
+def span(stage: str):
+    """Shorthand for get_telemetry().span(stage)."""
+    return get_telemetry().span(stage)
+
+
+def timed(stage: str):
+    """Decorator: runs the whole function inside span(stage)."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with get_telemetry().span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,78 @@
+from allocation import allocate, demand
+
+
+def candidates(*rows):
+    return [{"SKU_ID": sku, "Spec_Match_%": score} for sku, score in rows]
+
+
+def test_rank1_kept_when_in_stock_even_if_an_equal_match_exists():
+    c = candidates(("MV-3.3", 100.0), ("HT-33", 100.0), ("MV-6.6", 100.0))
+    plan = allocate([{"qty": 100, "candidates": c}], {"MV-3.3": 4000, "HT-33": 2000, "MV-6.6": 3000})
+    assert plan.choice == [0]
+    assert plan.rank1_short == [False]
+    assert plan.stats["on_rank1"] == 1
+
+
+def test_price_plays_no_part():
+    # demand() used to carry Material_Price into the value; a dearer rank-2 must not win
+    matches = [{"Spec_Match_%": 100.0}, {"Spec_Match_%": 100.0}]
+    per_product = [{"SKU_ID": "CHEAP", "Material_Price": 35_000.0}, {"SKU_ID": "DEAR", "Material_Price": 250_000.0}]
+    plan = allocate([demand(100, matches, per_product)], {"CHEAP": 1000, "DEAR": 1000})
+    assert plan.choice == [0]
+
+
+def test_falls_back_only_on_shortfall():
+    c = candidates(("A", 100.0), ("B", 100.0), ("C", 95.0))
+    plan = allocate([{"qty": 3000, "candidates": c}, {"qty": 3000, "candidates": c}],
+                    {"A": 4000, "B": 2000, "C": 3000})
+    assert plan.choice == [0, 2]
+    assert plan.rank1_short == [False, True]
+    assert plan.remaining == {"A": 1000, "B": 2000, "C": 0}
+
+
+def test_short_rank1_with_nothing_else_in_spec_is_unallocated():
+    c = candidates(("A", 100.0), ("B", 60.0))
+    plan = allocate([{"qty": 500, "candidates": c}], {"A": 100, "B": 10_000})
+    assert plan.choice == [None]
+    assert plan.rank1_short == [True]
+    assert plan.stats["unallocated"] == 1
+
+
+def test_out_of_spec_rank1_is_not_a_shortfall():
+    c = candidates(("A", 50.0), ("B", 95.0))
+    plan = allocate([{"qty": 10, "candidates": c}], {"A": 10_000, "B": 10_000})
+    assert plan.choice == [1]
+    assert plan.rank1_short == [False]
+
+
+def test_repair_moves_a_flexible_item_off_the_sku_another_item_needs():
+    flexible = candidates(("A", 100.0), ("B", 100.0))
+    only_a = candidates(("A", 100.0))
+    # Greedy would hand A to either; the item with no alternative must end up on A
+    plan = allocate([{"qty": 600, "candidates": flexible}, {"qty": 600, "candidates": only_a}],
+                    {"A": 1000, "B": 1000})
+    assert plan.choice == [1, 0]
+    assert plan.rank1_short == [True, False]
+    assert plan.stats["allocated"] == 2
+
+
+def test_items_never_share_the_same_metres():
+    c = candidates(("A", 100.0))
+    plan = allocate([{"qty": 400, "candidates": c} for _ in range(5)], {"A": 1000})
+    assert sum(choice == 0 for choice in plan.choice) == 2
+    assert plan.remaining["A"] == 200
+
+
+def test_decision_falls_back_when_another_bid_took_rank1_and_says_so():
+    from agents import DecisionAgent
+    from inventory import InventoryLedger
+    ledger = InventoryLedger({"A": 1000, "B": 1000})
+    agent = DecisionAgent(ledger=ledger)
+    matches = [{"Spec_Match_%": 100.0, "record": {"SKU_ID": "A"}}, {"Spec_Match_%": 100.0, "record": {"SKU_ID": "B"}}]
+
+    planned = agent.decide_allocated(matches, 0, 800)
+    assert (planned["sku_id"], planned["rank"], planned["rank1_short"]) == ("A", 1, False)
+
+    raced = agent.decide_allocated(matches, 0, 800)  # Planned on A, but A's stock is now held
+    assert (raced["sku_id"], raced["rank"], raced["rank1_short"]) == ("B", 2, True)
+    assert raced["reservation_id"]
@@ -0,0 +1,71 @@
+import pytest
+
+from dedup import TenderDeduper, reusable_items
+
+TENDER = ("Tender {n}: supply and laying of {q} m of {v} kV {c} core {m} XLPE armoured cable for the "
+          "substation feeder at site {n}, delivery within {w} weeks, routine and type tests required.\n"
+          "1. {v} kV {c} core {m} XLPE {q} m\n"
+          "2. 1.1 kV 4 core copper XLPE {q2} m")
+
+
+def tender(n: int) -> str:
+    v, c, m = [(1.1, 4, "copper"), (3.3, 3, "aluminium"), (11, 3, "copper"), (6.6, 3, "aluminium"),
+               (33, 3, "aluminium"), (1.1, 2, "copper"), (3.3, 3, "copper"), (11, 3, "aluminium")][n % 8]
+    return TENDER.format(n=n, q=100 + 37 * n, v=v, c=c, m=m, w=n + 3, q2=50 + n)
+
+
+def test_lookup_finds_reissue_and_ignores_unrelated():
+    d = TenderDeduper()
+    items = {"fp": {"spec": {"Voltage": 1.1}, "matches": []}}
+    d.add("T0", tender(0), items)
+    d.add("T1", tender(1), {})
+
+    dup = d.lookup(tender(0).replace("routine and type tests", "routine tests"))
+    assert dup is not None and dup.rfp_id == "T0" and dup.items == items
+    assert dup.similarity >= d.threshold
+    assert d.lookup("Completely different text about transformers and switchgear panels.") is None
+    assert d.stats() == {"tenders": 2, "lookups": 2, "near_duplicates": 1}
+
+
+def test_readding_an_id_replaces_it():
+    d = TenderDeduper()
+    d.add("T0", tender(0), {"old": {}})
+    d.add("T0", tender(0), {"new": {}})
+    assert len(d) == 1
+    assert d.lookup(tender(0)).items == {"new": {}}
+
+
+def test_save_and_load_keep_only_the_same_catalog(tmp_path):
+    path = str(tmp_path / "tenders.jsonl")
+    d = TenderDeduper(catalog="v1")
+    d.add("T0", tender(0), {"fp": {"spec": {}, "matches": []}})
+    d.save(path)
+    assert TenderDeduper(catalog="v1").load(path) == 1
+    assert TenderDeduper(catalog="v2").load(path) == 0
+
+
+def test_reusable_items_skip_errors():
+    ok = {"status": "AUTO-APPROVED", "line_items": [{"fingerprint": "a", "spec": {}, "matches": []},
+                                                    {"fingerprint": None, "spec": {}, "matches": []}]}
+    assert list(reusable_items(ok)) == ["a"]
+    assert reusable_items({"status": "ERROR", "line_items": ok["line_items"]}) == {}
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_batch_reuses_reissues_submitted_while_the_original_runs(workers):
+    pytest.importorskip("faiss")
+    pytest.importorskip("sentence_transformers")
+    from batch_runner import run_batch
+
+    rfps = [{"id": f"T{n}", "text": tender(n)} for n in range(8)]
+    rfps += [{"id": f"T0-R{j}", "text": tender(0)} for j in range(4)]  # All in flight with T0
+    results = []
+    summary = run_batch(rfps, workers=workers, dedup=True, search_socket=None, progress_every=0,
+                        on_result=lambda rfp, result: results.append(result))
+
+    reused = sorted(r["id"] for r in results if "reused_from" in r)
+    assert reused == ["T0-R0", "T0-R1", "T0-R2", "T0-R3"]
+    # T0 or an earlier copy of it (same text), never an unrelated tender
+    assert all(r["reused_from"]["rfp_id"].startswith("T0") for r in results if "reused_from" in r)
+    assert summary["dedup"]["near_duplicates"] == 4
+    assert summary["processed"] == 12
@@ -0,0 +1,123 @@
+import threading
+
+import pytest
+
+from inventory import InventoryLedger, SQLiteInventoryLedger
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_ledger(request, tmp_path):
+    def make(stock, **kwargs):
+        if request.param == "memory":
+            return InventoryLedger(stock, **kwargs)
+        return SQLiteInventoryLedger(str(tmp_path / "ledger.sqlite"), stock, **kwargs)
+    return make
+
+
+def test_reserve_holds_stock_until_confirm_or_release(make_ledger):
+    ledger = make_ledger({"A": 1000})
+    hold = ledger.reserve("A", 300, holder="RFP-1")
+    assert hold is not None and hold.qty == 300
+    assert ledger.available("A") == 700
+    assert ledger.on_hand("A") == 1000
+
+    assert ledger.confirm(hold.id)
+    assert ledger.available("A") == 700
+    assert ledger.on_hand("A") == 700
+    assert not ledger.confirm(hold.id)  # Already taken
+    assert not ledger.release(hold.id)
+
+    other = ledger.reserve("A", 200)
+    assert ledger.release(other.id)
+    assert ledger.available("A") == 700
+    assert ledger.on_hand("A") == 700
+
+
+def test_reserve_more_than_free_holds_nothing(make_ledger):
+    ledger = make_ledger({"A": 100})
+    assert ledger.reserve("A", 101) is None
+    assert ledger.available("A") == 100
+
+
+def test_unconfirmed_hold_expires(make_ledger):
+    clock = Clock()
+    ledger = make_ledger({"A": 100}, hold_ttl=60.0, clock=clock)
+    hold = ledger.reserve("A", 80)
+    assert ledger.reserve("A", 80) is None
+    clock.now += 61.0
+    assert ledger.available("A") == 100
+    assert not ledger.confirm(hold.id)
+    assert ledger.reserve("A", 80) is not None
+
+
+def test_concurrent_reserves_never_oversell(make_ledger):
+    ledger = make_ledger({"A": 1000, "B": 50})
+    results, lock = [], threading.Lock()
+    barrier = threading.Barrier(16)
+
+    def bid(n):
+        barrier.wait()
+        for _ in range(n):
+            hold = ledger.reserve("A", 30)
+            with lock:
+                results.append(hold)
+
+    threads = [threading.Thread(target=bid, args=(5,)) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    granted = [h for h in results if h is not None]
+    assert len(granted) == 1000 // 30
+    assert ledger.available("A") == 1000 - 30 * len(granted)
+    assert ledger.available("B") == 50  # Other SKUs untouched
+
+
+def test_concurrent_confirm_and_release_take_each_hold_once(make_ledger):
+    ledger = make_ledger({"A": 1000})
+    holds = [ledger.reserve("A", 10) for _ in range(40)]
+    outcomes, lock = [], threading.Lock()
+    barrier = threading.Barrier(8)
+
+    def settle(i):
+        barrier.wait()
+        for hold in holds:
+            ok = ledger.confirm(hold.id) if i % 2 else ledger.release(hold.id)
+            with lock:
+                outcomes.append((hold.id, i % 2, ok))
+
+    threads = [threading.Thread(target=settle, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    wins = [(res_id, confirmed) for res_id, confirmed, ok in outcomes if ok]
+    assert sorted(res_id for res_id, _ in wins) == sorted(h.id for h in holds)
+    confirmed = sum(c for _, c in wins)
+    assert ledger.on_hand("A") == 1000 - 10 * confirmed
+    assert ledger.available("A") == ledger.on_hand("A")
+
+
+def test_auto_approved_bids_commit_so_a_second_bid_cannot_reuse_the_metres():
+    from agents import DecisionAgent
+    ledger = InventoryLedger({"A": 1000})
+    matches = [{"Spec_Match_%": 100.0, "record": {"SKU_ID": "A", "Stock_Available": 1000}}]
+    priced = {"per_product": [{"SKU_ID": "A", "Material_Price": 1.0}]}
+
+    statuses = []
+    for _ in range(2):
+        agent = DecisionAgent(ledger=ledger)
+        decisions = agent.decide_line_items([matches], [800], [priced])
+        statuses.append(agent.settle(decisions))
+    assert statuses == ["AUTO-APPROVED", "MANUAL REVIEW (Out of Stock)"]
+    assert ledger.on_hand("A") == 200
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from lexical_index import (best_rows, reciprocal_rank_fusion, settled_top_k, sku_tokens, spec_query, tokens,
+                           top_rows)
+
+
+def arr(*values):
+    return np.array(values, dtype=np.float64)
+
+
+# --- settled_top_k ---
+def test_settled_when_scores_alone_decide():
+    assert settled_top_k(arr(90, 100, 50, 70), arr(0, 0, 0, 0), 2).tolist() == [1, 0]
+
+
+def test_bm25_breaks_a_spec_match_tie():
+    scores, lexical = arr(100, 100, 50), arr(1.0, 3.0, 0.0)
+    assert settled_top_k(scores, lexical, 2).tolist() == [1, 0]
+
+
+def test_tie_on_both_inside_the_top_k_is_not_settled():
+    # Rows 0 and 1 tie on spec match AND BM25: only vector distance can order them
+    assert settled_top_k(arr(100, 100, 50), arr(2.0, 2.0, 0.0), 2) is None
+
+
+def test_tie_on_both_at_the_cut_off_is_not_settled():
+    # Rows 1 and 2 compete for the last slot with identical scores
+    assert settled_top_k(arr(100, 90, 90, 10), arr(0.0, 1.0, 1.0, 0.0), 2) is None
+
+
+def test_tie_below_the_cut_off_does_not_matter():
+    assert settled_top_k(arr(100, 90, 50, 50), arr(0, 0, 1.0, 1.0), 2).tolist() == [0, 1]
+
+
+def test_non_finite_kth_score_is_not_settled():
+    # Deleted rows score -inf; a top-k that reaches them isn't a real answer
+    assert settled_top_k(arr(100, -np.inf, -np.inf), arr(0, 0, 0), 2) is None
+
+
+def test_k_larger_than_catalog():
+    assert settled_top_k(arr(80, 90), arr(0, 0), 5).tolist() == [1, 0]
+    assert settled_top_k(arr(), arr(), 3) is None
+
+
+def test_best_rows_orders_by_score_then_bm25_then_row():
+    scores, lexical = arr(90, 100, 100, 100), arr(5.0, 1.0, 2.0, 1.0)
+    assert best_rows(scores, lexical, 3).tolist() == [2, 1, 3]
+    assert best_rows(scores, lexical, 0).tolist() == []
+
+
+def test_top_rows_only_positive_scores_best_first():
+    assert top_rows(arr(0.0, 2.0, 0.5, 2.0, 0.0), 10) == [1, 3, 2]
+    assert top_rows(arr(0.0, 2.0, 0.5, 2.0), 1) == [1]
+
+
+# --- Tokens ---
+def test_units_and_synonyms_normalize_to_one_token():
+    assert tokens("33 kV") == tokens("33kV") == ["33kv"]
+    assert tokens("4-Core") == tokens("4C") == ["4c"]
+    assert tokens("Aluminium") == tokens("AL") == ["aluminum"]
+    assert "fr" in tokens("FRLS sheath") and "fr" in tokens("Fire Retardant")
+
+
+def test_sku_tokens_index_the_whole_code_and_its_grade():
+    toks = sku_tokens("LT-AL-XLPE-3.5C-1.1-FR")
+    assert toks[0] == "lt-al-xlpe-3.5c-1.1-fr"
+    assert {"aluminum", "xlpe", "3.5c", "1.1kv", "fr"} <= set(toks)
+
+
+def test_spec_query_uses_index_vocabulary():
+    q = spec_query({"SKU_ID": "LT-AL-XLPE-3.5C-1.1-FR", "Voltage": 1.1, "Cores": 3.5,
+                    "Conductor_Material": "Aluminium", "Insulation_Type": "XLPE", "Fire_Retardant": True})
+    assert q == ["lt-al-xlpe-3.5c-1.1-fr", "1.1kv", "3.5c", "aluminum", "xlpe", "fr"]
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([[1, 2], [2, 3]], k=60)
+    assert fused[2] == pytest.approx(1 / 62 + 1 / 61)
+    assert max(fused, key=fused.get) == 2
+
+
+# --- Fast path gating (needs the encoder stack) ---
+def test_fast_path_only_for_specs_quoting_a_catalog_code():
+    pytest.importorskip("faiss")
+    pytest.importorskip("sentence_transformers")
+    from agents import TechnicalAgent
+    from engine import MatchingEngine
+
+    engine = MatchingEngine(index_dir=None)
+    tech = TechnicalAgent(engine)
+    plain = {"Voltage": 1.1, "Cores": 4.0, "Conductor_Material": "Copper", "Insulation_Type": "XLPE",
+             "Fire_Retardant": True, "Quantity_m": 100}
+    assert all(m["distance"] is not None for m in tech.search(plain))
+    assert engine.lexical_stats()["fast_path"] == 0
+
+    quoted = dict(plain, SKU_ID="LT-CU-XLPE-4C-1.1-FR")
+    matches = tech.search(quoted)
+    assert matches[0]["record"]["SKU_ID"] == "LT-CU-XLPE-4C-1.1-FR"
+    assert engine.lexical_stats()["fast_path"] == 1
+
+    everything = TechnicalAgent(engine, fast_path_all=True)
+    assert [m["distance"] for m in everything.search(dict(plain, Quantity_m=200))] == [None] * 3
@@ -0,0 +1,102 @@
+from scheduler import TenderScheduler, to_epoch
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def ids(scheduler):
+    return [rfp["id"] for rfp in scheduler.drain()]
+
+
+# --- ORDERING ---
+def test_earliest_deadline_first():
+    s = TenderScheduler(clock=Clock())
+    for rfp_id, due in [("c", 5000), ("a", 2000), ("none", None), ("b", 3000)]:
+        s.submit({"id": rfp_id, "due_date": due})
+    assert ids(s) == ["a", "b", "c", "none"]
+
+
+def test_same_deadline_prefers_value_per_second():
+    s = TenderScheduler(clock=Clock())
+    s.submit({"id": "cheap", "due_date": 5000, "value": 1.0})
+    s.submit({"id": "rich", "due_date": 5000, "value": 10.0})
+    s.submit({"id": "rich-but-long", "due_date": 5000, "value": 10.0, "text": "x" * 100_000})
+    assert ids(s) == ["rich", "cheap", "rich-but-long"]  # 10/0.05, 1/0.05, 10/5 per second
+
+
+def test_tender_that_cannot_make_its_deadline_waits_behind_on_time_ones():
+    s = TenderScheduler(clock=Clock(1000.0))
+    s.submit({"id": "missed", "due_date": 1000.0, "value": 100.0})
+    s.submit({"id": "later", "due_date": 9000.0})
+    assert ids(s) == ["later", "missed"]
+
+
+def test_queued_tender_is_demoted_when_its_slack_runs_out():
+    clock = Clock(1000.0)
+    s = TenderScheduler(clock=clock)
+    s.submit({"id": "tight", "due_date": 1010.0})
+    s.submit({"id": "loose", "due_date": 9000.0})
+    clock.now = 1020.0
+    assert ids(s) == ["loose", "tight"]
+    assert s.demoted == 1
+
+
+def test_below_min_value_goes_to_late_lane():
+    s = TenderScheduler(clock=Clock(), min_value=5.0)
+    s.submit({"id": "small", "due_date": 2000, "value": 1.0})
+    s.submit({"id": "big", "due_date": 3000, "value": 50.0})
+    assert ids(s) == ["big", "small"]
+
+
+# --- BAD INPUT (a CSV row must never stop the batch) ---
+def test_explicit_zero_value_stays_zero():
+    s = TenderScheduler(clock=Clock())
+    assert s._value({"value": 0}) == 0.0
+    assert s._value({"value": "0"}) == 0.0
+
+
+def test_blank_or_missing_value_is_default():
+    s = TenderScheduler(clock=Clock())
+    assert s._value({}) == 1.0
+    assert s._value({"value": ""}) == 1.0
+    assert s._value({"value": "  "}) == 1.0
+    assert s._value({"value": float("nan")}) == 1.0
+    assert s._value({"value": " 12.5 "}) == 12.5
+
+
+def test_unparseable_value_is_logged_and_defaulted(capsys):
+    s = TenderScheduler(clock=Clock())
+    s.submit({"id": "R1", "value": "n/a"})
+    assert ids(s) == ["R1"]
+    assert "R1" in capsys.readouterr().err
+
+
+def test_unparseable_due_date_means_no_deadline(capsys):
+    s = TenderScheduler(clock=Clock())
+    s.submit({"id": "bad", "due_date": "not a date"})
+    s.submit({"id": "bad-month", "due_date": "2030-13-45"})
+    s.submit({"id": "dated", "due_date": 5000})
+    assert ids(s) == ["dated", "bad", "bad-month"]
+    err = capsys.readouterr().err
+    assert "bad" in err and "bad-month" in err
+
+
+def test_to_epoch_blank_values():
+    assert to_epoch(None) is None
+    assert to_epoch("") is None
+    assert to_epoch(float("nan")) is None
+    assert to_epoch(1234.5) == 1234.5
+    assert to_epoch("1970-01-01T00:00:10Z") == 10.0
+
+
+def test_complete_moves_cost_estimate_towards_observed_rate():
+    s = TenderScheduler(clock=Clock(), ewma_alpha=0.5)
+    before = s.seconds_per_kchar
+    s.complete({"text": "x" * 2000}, elapsed_seconds=2.0)  # 1 s per 1k chars
+    assert s.seconds_per_kchar == before + 0.5 * (1.0 - before)
+    assert s.completed == 1